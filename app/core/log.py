@@ -0,0 +1,225 @@
+import os
+import re
+import sys
+import json
+import hmac
+import uuid
+import queue
+import atexit
+import random
+import logging
+import reprlib
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+from app.services.metrics import LOG_RECORDS_DROPPED
+
+load_dotenv()
+
+# Records below this level are dropped, unless verbose logging is on for the request
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" (one readable line per record) or "json" (one object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Payloads logged through preview() (tool arguments and results, model parts) are cut to this length
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+# Hard limit for one rendered message
+LOG_MESSAGE_MAX_CHARS = int(os.getenv("LOG_MESSAGE_MAX_CHARS", "4000"))
+# Share of requests logged verbosely (DEBUG) without asking for it, e.g. 0.01
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0"))
+# Set to "true" to let a request turn on DEBUG logging with the X-Debug-Log header.
+# Off by default: DEBUG records carry payloads and profile data, and the header
+# comes from the client. With LOG_DEBUG_TOKEN set, the header must carry that
+# token instead of "true", so only callers who know it can use it.
+LOG_DEBUG_HEADER_ENABLED = os.getenv("LOG_DEBUG_HEADER_ENABLED", "false").lower() == "true"
+LOG_DEBUG_TOKEN = os.getenv("LOG_DEBUG_TOKEN", "")
+# Records waiting to be written; when it is full new records are dropped instead of blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+DEBUG_HEADER = "X-Debug-Log"
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+# Per request (set by RequestContextMiddleware) and per agent session; copied
+# into worker threads by asyncio.to_thread / run_in_threadpool and the job queue
+correlation_id: ContextVar = ContextVar("correlation_id", default=None)
+agent_session_id: ContextVar = ContextVar("agent_session_id", default=None)
+verbose_logging: ContextVar = ContextVar("verbose_logging", default=False)
+
+_level = logging.getLevelName(LOG_LEVEL)
+if not isinstance(_level, int):
+    _level = logging.INFO
+_repr = reprlib.Repr()
+_repr.maxstring = LOG_PAYLOAD_MAX_CHARS
+_repr.maxother = LOG_PAYLOAD_MAX_CHARS
+_repr.maxlevel = 4
+
+
+def _cut(text: str, limit: int) -> str:
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
+class _Preview:
+    """Rendered (and truncated) only if the record is actually written"""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        value = self.value
+        text = value if isinstance(value, str) else _repr.repr(value)
+        return _cut(text, self.limit)
+
+
+def preview(value, limit: int = None):
+    """Lazy, truncated rendering of a payload, to pass as a logging argument"""
+    return _Preview(value, limit or LOG_PAYLOAD_MAX_CHARS)
+
+
+def debug_enabled() -> bool:
+    """Whether DEBUG records are written for the current request; guard expensive debug output with it"""
+    return _level <= logging.DEBUG or verbose_logging.get()
+
+
+class _ContextFilter(logging.Filter):
+    """Applies the level (per request) and stamps the correlation and session ids, in the caller's context"""
+
+    def filter(self, record):
+        if record.levelno < _level and not verbose_logging.get():
+            return False
+        record.correlation_id = correlation_id.get()
+        record.session_id = agent_session_id.get()
+        return True
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread. The message is rendered here (so
+    mutable payloads are captured as they were), but formatting and the
+    write to stdout happen on the listener thread. A full queue drops the
+    record rather than blocking the caller.
+    """
+
+    def prepare(self, record):
+        record.message = _cut(record.getMessage(), LOG_MESSAGE_MAX_CHARS)
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+            "session_id": getattr(record, "session_id", None),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        ids = "/".join(filter(None, [getattr(record, "correlation_id", None), getattr(record, "session_id", None)]))
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}{f' [{ids}]' if ids else ''} {record.getMessage()}"
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+def _configure() -> QueueListener:
+    """Route the app's loggers through one queue to a stdout writer thread"""
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = _NonBlockingQueueHandler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+
+    root = logging.getLogger("app")
+    root.handlers = [handler]
+    # Level checks happen in _ContextFilter, so verbose requests can log DEBUG
+    root.setLevel(logging.DEBUG)
+    root.propagate = False
+
+    listener = QueueListener(log_queue, stream, respect_handler_level=False)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+_listener = _configure()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a module of the app (pass __name__)"""
+    return logging.getLogger(name)
+
+
+def new_session_id():
+    """Start an agent session: its records carry a new session id (returns the token to reset)"""
+    return agent_session_id.set(uuid.uuid4().hex[:8])
+
+
+def _debug_requested(value: str) -> bool:
+    if LOG_DEBUG_TOKEN:
+        return hmac.compare_digest(value.encode("latin-1"), LOG_DEBUG_TOKEN.encode("utf-8"))
+    return value.lower() in ("1", "true", "yes")
+
+
+class RequestContextMiddleware:
+    """
+    Gives each HTTP request a correlation id (the client's X-Request-ID if it
+    is a plain token, else a new one), echoed in the response headers.
+
+    Verbose (DEBUG) logging is turned on for a random LOG_DEBUG_SAMPLE_RATE
+    share of requests, and for requests sending X-Debug-Log: true (or the
+    LOG_DEBUG_TOKEN) if LOG_DEBUG_HEADER_ENABLED allows it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        if not _REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex[:16]
+        requested = LOG_DEBUG_HEADER_ENABLED and \
+            _debug_requested(headers.get(DEBUG_HEADER.lower().encode(), b"").decode("latin-1"))
+        verbose = requested or (LOG_DEBUG_SAMPLE_RATE > 0 and random.random() < LOG_DEBUG_SAMPLE_RATE)
+
+        id_token = correlation_id.set(request_id)
+        verbose_token = verbose_logging.set(verbose)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (REQUEST_ID_HEADER.lower().encode(), request_id.encode())],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            correlation_id.reset(id_token)
+            verbose_logging.reset(verbose_token)
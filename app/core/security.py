@@ -1,14 +1,196 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from app.services.supabase_client import supabase # We need this to talk to Supabase
-from gotrue.errors import AuthApiError
-from gotrue.types import User
+from supabase_auth.errors import AuthApiError # the error type the supabase client raises
+from gotrue.types import User, UserResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+# Legacy shared secret (Project Settings -> API -> JWT Secret); verifies HS256 tokens locally
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET") or None
+# Set to "false" to always ask the Supabase auth server, as before
+AUTH_LOCAL_VERIFY = os.getenv("AUTH_LOCAL_VERIFY", "true").lower() == "true"
+# Verified tokens remembered per worker (each one only until it expires)
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_TOKEN_CACHE_MAX_ENTRIES", "4096"))
+# How long the project's public signing keys are reused before being fetched again
+AUTH_JWKS_CACHE_SECONDS = int(os.getenv("AUTH_JWKS_CACHE_SECONDS", "600"))
+# Supabase issues user access tokens for this audience
+AUTH_JWT_AUDIENCE = "authenticated"
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
 
 # Part 1: Define HOW to find the token in a request.
 # We're telling FastAPI: "The token (our key) will be in an 'Authorization' header.
 # If a client wants to know HOW to log in to GET a token, the login endpoint is at '/token'."
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+
+class LocalVerificationUnavailable(Exception):
+    """The token can't be checked locally (no key for it); ask the auth server instead"""
+
+
+def _user_from_claims(claims: dict) -> UserResponse:
+    """Same shape supabase.auth.get_user() returns, built from verified access token claims"""
+    # The token doesn't carry the account creation time; its issue time stands in
+    issued_at = datetime.fromtimestamp(claims.get("iat", time.time()), tz=timezone.utc)
+    return UserResponse(user=User(
+        id=claims["sub"],
+        aud=claims.get("aud") or AUTH_JWT_AUDIENCE,
+        role=claims.get("role"),
+        email=claims.get("email") or None,
+        phone=claims.get("phone") or None,
+        app_metadata=claims.get("app_metadata") or {},
+        user_metadata=claims.get("user_metadata") or {},
+        is_anonymous=bool(claims.get("is_anonymous", False)),
+        created_at=issued_at,
+    ))
+
+
+class TokenVerifier:
+    """
+    Checks Supabase access tokens without a round-trip to the auth server.
+
+    Tokens signed with the project's asymmetric keys are verified against its
+    published JWKS (fetched once and reused); HS256 tokens against
+    SUPABASE_JWT_SECRET. Signature, expiry and audience are checked. When
+    neither applies, the auth server is asked, as before.
+
+    Verified users are kept in an LRU keyed by the token's hash until the
+    token expires, so a client reusing its token costs a dictionary lookup.
+    A revoked session stays accepted here until its token expires; routes
+    where that matters use get_current_user_strict.
+    """
+
+    def __init__(self, jwt_secret: str = SUPABASE_JWT_SECRET, supabase_url: str = SUPABASE_URL,
+                 enabled: bool = AUTH_LOCAL_VERIFY, max_entries: int = AUTH_TOKEN_CACHE_MAX_ENTRIES,
+                 jwks_cache_seconds: int = AUTH_JWKS_CACHE_SECONDS):
+        self.jwt_secret = jwt_secret
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sha256(token) -> (expires_at, UserResponse)
+        self._lock = threading.Lock()
+        self._jwks = None
+        if supabase_url:
+            self._jwks = jwt.PyJWKClient(
+                f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+                cache_keys=True,
+                lifespan=jwks_cache_seconds,
+                timeout=10,
+            )
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key, last=True)
+            return user
+
+    def _remember(self, key: str, expires_at, user: UserResponse):
+        if not expires_at or time.time() >= expires_at:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key, last=True)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _signing_key(self, token: str, algorithm: str):
+        if algorithm == "HS256":
+            if not self.jwt_secret:
+                raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not set")
+            return self.jwt_secret
+        if algorithm in ASYMMETRIC_ALGORITHMS and self._jwks is not None:
+            try:
+                return self._jwks.get_signing_key_from_jwt(token).key
+            except jwt.PyJWKClientError as e:
+                # JWKS unreachable, or no key with this kid (e.g. a legacy-secret project)
+                raise LocalVerificationUnavailable(str(e))
+        raise LocalVerificationUnavailable(f"no local key for {algorithm} tokens")
+
+    def verify_locally(self, token: str):
+        """
+        (expiry, user) for a valid token. Raises jwt.InvalidTokenError if the token is
+        bad or expired, LocalVerificationUnavailable if it can't be checked here.
+        """
+        algorithm = jwt.get_unverified_header(token).get("alg")
+        claims = jwt.decode(
+            token,
+            self._signing_key(token, algorithm),
+            algorithms=[algorithm],
+            audience=AUTH_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]},
+        )
+        return claims["exp"], _user_from_claims(claims)
+
+    def verify_remotely(self, token: str):
+        """Ask the Supabase auth server (also catches revoked sessions and deleted users)"""
+        try:
+            return supabase.auth.get_user(token)
+        except AuthApiError:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    def verify(self, token: str):
+        key = self._key(token)
+        user = self._cached(key)
+        if user is not None:
+            return user
+
+        if self.enabled:
+            try:
+                expires_at, user = self.verify_locally(token)
+                self._remember(key, expires_at, user)
+                return user
+            except LocalVerificationUnavailable:
+                pass
+            except jwt.InvalidTokenError:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+
+        user = self.verify_remotely(token)
+        if user is not None and self.enabled:
+            # The auth server vouched for it; reuse the answer until the token expires
+            try:
+                expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+            except jwt.InvalidTokenError:
+                expires_at = None
+            self._remember(key, expires_at, user)
+        return user
+
+    def __len__(self):
+        return len(self._entries)
+
+    def forget(self, token: str):
+        with self._lock:
+            self._entries.pop(self._key(token), None)
+
+
+token_verifier = TokenVerifier()
+
+
 # Part 2: Define the logic to VALIDATE the token.
 # This is our reusable "lock checker" function.
 def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
@@ -17,23 +199,23 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     1. Look for an 'Authorization: Bearer <token>' header (thanks to oauth2_scheme).
     2. Pass the <token> string into this function as the 'token' argument.
     3. Run our validation logic.
+
+    The token's signature and expiration are checked locally when possible
+    (see TokenVerifier), otherwise by Supabase. If the token is invalid
+    (expired, fake, etc.) we send back a 401 Unauthorized error.
+    """
+    return token_verifier.verify(token)
+
+
+def get_current_user_strict(token: str = Depends(oauth2_scheme)) -> User:
+    """
+    Like get_current_user, but always asks the Supabase auth server, so a
+    signed-out session or deleted user is rejected right away. Use it on
+    routes that change account data.
     """
     try:
-        # Step 2a: We ask Supabase to validate the token.
-        # This is the most important line. It checks the signature and expiration.
-        user = supabase.auth.get_user(token)
-        
-        # Step 2b: If the token is valid, Supabase returns the user's data.
-        # We return this user object, and the dependency succeeds.
-        return user
-        
-    except AuthApiError:
-        # Step 2c: If the token is invalid (expired, fake, etc.), Supabase
-        # throws an error. We catch it.
-        # We then tell FastAPI to immediately stop everything and send back a
-        # 401 Unauthorized error. This is the standard, secure way to deny access.
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        return token_verifier.verify_remotely(token)
+    except HTTPException:
+        # Rejected here, so stop accepting it on the other routes as well
+        token_verifier.forget(token)
+        raise
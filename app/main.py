@@ -1,8 +1,38 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import meal_plans, auth,public # We will add 'auth' router here later
+from app.services.recipe_cache import recipe_cache
+from app.services.job_queue import job_queue
+from app.services.gemini_client import gemini_clients
+from app.services.supabase_async import async_supabase
+from app.services import metrics
+from app.core.log import get_logger, RequestContextMiddleware
 
-app = FastAPI(title="NutriWise AI API")
+logger = get_logger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the recipe catalog before serving, so the first search doesn't pay for it
+    try:
+        await asyncio.to_thread(recipe_cache.warm_up)
+    except Exception as e:
+        logger.warning(f"⚠️ Recipe cache warm-up failed, it will load on first use: {str(e)}")
+    # Fail jobs (and their weekly plans) left behind by workers that died
+    await asyncio.to_thread(job_queue.start)
+    yield
+    # Generations take minutes, so don't hold shutdown for them: in-flight jobs are marked failed
+    await asyncio.to_thread(job_queue.shutdown)
+    await gemini_clients.aclose()
+    await async_supabase.aclose()
+
+
+app = FastAPI(title="NutriWise AI API", lifespan=lifespan)
+
+# Correlation id and per-request debug logging (X-Request-ID / X-Debug-Log headers)
+app.add_middleware(RequestContextMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,4 +52,12 @@ app.include_router(public.router)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to NutriWise AI"}
\ No newline at end of file
+    return {"message": "Welcome to NutriWise AI"}
+
+
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        """Prometheus metrics: agent, LLM, tool and Supabase latencies, token counts, cache sizes"""
+        body, content_type = metrics.render()
+        return Response(content=body, media_type=content_type)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, Any
 
 # Your existing model, moved here
@@ -14,6 +14,9 @@ class MealPlanRequest(BaseModel):
     weight_goal: float  # desired weight in kg
     planned_weekly_weight_loss: float  # number of weeks to achieve the goal
 
+class BatchTargetsRequest(BaseModel):
+    profiles: list[MealPlanRequest]  # one entry per person, same fields as /public/calculate-targets
+
 # New models for Authentication (from the next task, but good to add now)
 class UserCreate(BaseModel):
     email: EmailStr
@@ -34,4 +37,45 @@ class ProfileCreate(BaseModel):
     workouts_per_week: int  # 0-7
     goal: str  # "lose", "build", "maintain"
     weight_goal: float  # kg
-    planned_weekly_weight_loss: Optional[float] = 0.5
\ No newline at end of file
+    planned_weekly_weight_loss: Optional[float] = 0.5
+
+# Structured output of the weekly day agent (same keys as meal_plan_json_template
+# in the weekly prompt); passed to Gemini as the response schema of its final turn
+class MealNutrition(BaseModel):
+    calories: float
+    protein: float
+    fat: float
+    carbohydrates: float
+
+class PlannedMeal(BaseModel):
+    target_calories: float
+    recipe_name: str
+    recipe_id: int
+    servings: float
+    nutritional_info_per_serving: MealNutrition
+    total_nutrition: MealNutrition
+
+class MealDistribution(BaseModel):
+    breakfast_percent: str
+    lunch_percent: str
+    dinner_percent: str
+    snacks_percent: str
+
+class DailyTotals(BaseModel):
+    total_calories: float
+    total_protein: float
+    total_fat: float
+    total_carbohydrates: float
+
+# Dump with by_alias=True to get the template keys ("Snack 1", "Daily Totals")
+class DayMealPlan(BaseModel):
+    distribution: Optional[MealDistribution] = None
+    breakfast: PlannedMeal = Field(alias="Breakfast")
+    lunch: PlannedMeal = Field(alias="Lunch")
+    dinner: PlannedMeal = Field(alias="Dinner")
+    snack_1: Optional[PlannedMeal] = Field(default=None, alias="Snack 1")
+    snack_2: Optional[PlannedMeal] = Field(default=None, alias="Snack 2")
+    daily_totals: Optional[DailyTotals] = Field(default=None, alias="Daily Totals")
+
+class DayMealPlanResponse(BaseModel):
+    meal_plan: DayMealPlan
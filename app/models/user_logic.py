@@ -1,3 +1,15 @@
+import numpy as np
+
+ACTIVITY_MULTIPLIERS = {
+    "sedentary": 1.2,
+    "lightly active": 1.375,
+    "moderately active": 1.55,
+    "very active": 1.725,
+    "extra active": 1.9
+}
+VALID_GOALS = ["Fat Loss", "General Health / Maintenance", "Build Muscle"]
+
+
 class user:
     def __init__(self, sex, height, age, weight, activity_level, planned_weekly_weight_loss=None,desired_weight=None):
         if sex not in ["male", "female"]:
@@ -21,14 +33,7 @@ class user:
         elif self.sex == "female":
             base_bmr = 10 * self.weight + 6.25 * self.height - 5 * self.age - 161
         
-        activity_multipliers = {
-            "sedentary": 1.2,
-            "lightly active": 1.375,
-            "moderately active": 1.55,
-            "very active": 1.725,
-            "extra active": 1.9
-        }
-        return base_bmr * activity_multipliers[self.activity_level]
+        return base_bmr * ACTIVITY_MULTIPLIERS[self.activity_level]
 
     def get_planned_weekly_weight_loss(self):
         """Return planned weekly weight loss in kg (must be provided at initialization)"""
@@ -92,4 +97,65 @@ class user:
         
         remaining_calories = total_calories - protein_calories - fat_calories
         
-        return max(0, remaining_calories / 4)  # avoid negative carbs
\ No newline at end of file
+        return max(0, remaining_calories / 4)  # avoid negative carbs
+
+
+def compute_targets_batch(sex, height, age, weight, activity_level, goal, planned_weekly_weight_loss=None) -> dict:
+    """
+    Nutritional targets for many people at once, with the same formulas as the
+    user class, computed as NumPy array operations in a single pass.
+
+    Every argument is a sequence with one entry per person
+    (planned_weekly_weight_loss entries may be None unless the goal is "Fat Loss").
+
+    Returns a dict of arrays: tdee, calories, protein, fat, carbs, plus
+    "errors", a list holding None for valid entries or the same message the
+    user class would raise. Targets of invalid entries are NaN.
+    """
+    sex = np.asarray(sex, dtype=object)
+    activity_level = np.asarray(activity_level, dtype=object)
+    goal = np.asarray(goal, dtype=object)
+    height = np.asarray(height, dtype=float)
+    age = np.asarray(age, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    count = len(sex)
+    if planned_weekly_weight_loss is None:
+        planned_weekly_weight_loss = [None] * count
+    weekly_loss = np.array([np.nan if value is None else value for value in planned_weekly_weight_loss], dtype=float)
+
+    is_male = sex == "male"
+    is_fat_loss = goal == "Fat Loss"
+    is_maintenance = goal == "General Health / Maintenance"
+    is_build = goal == "Build Muscle"
+
+    errors = [None] * count
+    valid_activity = np.isin(activity_level, list(ACTIVITY_MULTIPLIERS))
+    for idx in np.flatnonzero(~(is_male | (sex == "female"))):
+        errors[idx] = "Sex must be 'male' or 'female'."
+    for idx in np.flatnonzero(~valid_activity):
+        errors[idx] = errors[idx] or f"Activity level must be one of: {', '.join(ACTIVITY_MULTIPLIERS)}."
+    for idx in np.flatnonzero(~(is_fat_loss | is_maintenance | is_build)):
+        errors[idx] = errors[idx] or f"Goal must be one of: {', '.join(VALID_GOALS)}."
+    for idx in np.flatnonzero(is_fat_loss & np.isnan(weekly_loss)):
+        errors[idx] = errors[idx] or "planned_weekly_weight_loss must be provided for weight loss calculations."
+
+    multipliers = np.array([ACTIVITY_MULTIPLIERS.get(level, np.nan) for level in activity_level], dtype=float)
+    base_bmr = 10 * weight + 6.25 * height - 5 * age + np.where(is_male, 5, -161)
+    tdee = base_bmr * multipliers
+
+    # 7700 kcal ≈ 1 kg fat; divide by 7 for daily deficit
+    calories = np.select(
+        [is_fat_loss, is_maintenance, is_build],
+        [tdee - weekly_loss * 7700 / 7, tdee, tdee * 1.10],
+        default=np.nan
+    )
+    protein = weight * np.select([is_fat_loss, is_maintenance, is_build], [1.8, 2.0, 2.2], default=np.nan)
+    fat = calories * np.where(is_build, 0.30, 0.25) / 9
+    carbs = np.maximum(0, (calories - protein * 4 - fat * 9) / 4)
+
+    invalid = np.array([error is not None for error in errors], dtype=bool)
+    results = {"tdee": tdee, "calories": calories, "protein": protein, "fat": fat, "carbs": carbs}
+    for values in results.values():
+        values[invalid] = np.nan
+    results["errors"] = errors
+    return results
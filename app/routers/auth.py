@@ -1,12 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models.schemas import UserCreate, Token, ProfileCreate
-from app.services.supabase_client import supabase # We need our Supabase client
+from app.services.supabase_async import async_supabase # We need our Supabase client
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import os
-from app.core.security import get_current_user 
+from app.core.security import get_current_user, get_current_user_strict
 from gotrue.types import User
+from app.core.log import get_logger, preview
+
+logger = get_logger(__name__)
 
 # Create the router for authentication endpoints
 router = APIRouter(
@@ -14,7 +17,7 @@ router = APIRouter(
 )
 
 @router.post("/signup", status_code=201, response_model=dict)
-def sign_up(user_credentials: UserCreate):
+async def sign_up(user_credentials: UserCreate):
     """
     Handles new user registration by creating a user in Supabase Auth.
     Stores questionnaire data in user metadata.
@@ -38,9 +41,9 @@ def sign_up(user_credentials: UserCreate):
         # Add questionnaire data if provided
         if user_credentials.questionnaire_data:
             user_metadata["questionnaire"] = user_credentials.questionnaire_data
-            print(f"📋 Storing questionnaire data in user metadata for: {user_credentials.email}")
+            logger.info(f"📋 Storing questionnaire data in user metadata for: {user_credentials.email}")
         
-        response = supabase.auth.sign_up({
+        response = await async_supabase.auth.sign_up({
             "email": user_credentials.email,
             "password": user_credentials.password,
             "options": {
@@ -50,22 +53,22 @@ def sign_up(user_credentials: UserCreate):
         })
         
         if response.user:
-            print(f"✅ User created with metadata: {user_credentials.email}")
+            logger.info(f"✅ User created with metadata: {user_credentials.email}")
             return {"message": "User created successfully. Please check your email for verification."}
         else:
             raise HTTPException(status_code=400, detail="Could not create user for an unknown reason.")
             
     except Exception as e:
-        print(f"❌ Signup failed: {str(e)}")
+        logger.error(f"❌ Signup failed: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Handles user login. It takes form data (not JSON) and returns a JWT access token.
     """
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await async_supabase.auth.sign_in_with_password({
             "email": form_data.username, # Note: OAuth2 form uses 'username' for the email field
             "password": form_data.password
         })
@@ -83,9 +86,9 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
 
 
 @router.post("/profile", response_class=JSONResponse)
-def create_or_update_profile(
+async def create_or_update_profile(
     profile_data: ProfileCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_strict)
 ):
     """
     Create or update user profile after onboarding.
@@ -95,7 +98,7 @@ def create_or_update_profile(
     """
     try:
         user_id = str(current_user.user.id)
-        print(f"📝 Creating/updating profile for user: {user_id}")
+        logger.info(f"📝 Creating/updating profile for user: {user_id}")
         
         # Map frontend goal to backend goal
         goal_map = {
@@ -131,42 +134,45 @@ def create_or_update_profile(
         
         # Check if profile exists
         try:
-            existing_profile = supabase.table('profiles')\
-                .select('id')\
-                .eq('id', user_id)\
-                .execute()
+            existing_profile = await async_supabase.execute(
+                async_supabase.table('profiles')
+                .select('id')
+                .eq('id', user_id)
+            )
 
-            print(f"🔍 Existing profile check result: {existing_profile.data}")
+            logger.debug("🔍 Existing profile check result: %s", preview(existing_profile.data))
         except Exception as check_error:
-            print(f"⚠️ Error checking existing profile: {str(check_error)}")
+            logger.warning(f"⚠️ Error checking existing profile: {str(check_error)}")
             existing_profile = None
 
         if existing_profile and existing_profile.data and len(existing_profile.data) > 0:
             # Update existing profile
-            print(f"🔄 Updating existing profile for user {user_id}")
-            response = supabase.table('profiles')\
-                .update(profile_record)\
-                .eq('id', user_id)\
-                .execute()
-            print(f"📤 Update response: {response}")
+            logger.info(f"🔄 Updating existing profile for user {user_id}")
+            response = await async_supabase.execute(
+                async_supabase.table('profiles')
+                .update(profile_record)
+                .eq('id', user_id)
+            )
+            logger.debug("📤 Update response: %s", preview(response))
         else:
             # Insert new profile
-            print(f"✨ Creating new profile for user {user_id}")
-            response = supabase.table('profiles')\
-                .insert(profile_record)\
-                .execute()
-            print(f"📤 Insert response: {response}")
+            logger.info(f"✨ Creating new profile for user {user_id}")
+            response = await async_supabase.execute(
+                async_supabase.table('profiles')
+                .insert(profile_record)
+            )
+            logger.debug("📤 Insert response: %s", preview(response))
 
         # Check for errors in the response
         if hasattr(response, 'error') and response.error:
-            print(f"❌ Supabase error: {response.error}")
+            logger.error(f"❌ Supabase error: {response.error}")
             raise HTTPException(status_code=500, detail=f"Database error: {response.error}")
 
         if not response.data:
-            print(f"⚠️ Empty response data. Full response: {response}")
+            logger.warning("⚠️ Empty response data. Full response: %s", preview(response))
             raise HTTPException(status_code=500, detail="Failed to save profile - empty response")
         
-        print(f"✅ Profile saved successfully for user {user_id}")
+        logger.info(f"✅ Profile saved successfully for user {user_id}")
         
         return {
             "status": "success",
@@ -177,9 +183,7 @@ def create_or_update_profile(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error saving profile: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Error saving profile: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Error saving profile: {str(e)}"
@@ -187,18 +191,19 @@ def create_or_update_profile(
 
 
 @router.get("/profile", response_class=JSONResponse)
-def get_profile(current_user: User = Depends(get_current_user)):
+async def get_profile(current_user: User = Depends(get_current_user)):
     """
     Get the current user's profile.
     """
     try:
         user_id = str(current_user.user.id)
         
-        response = supabase.table('profiles')\
-            .select('*')\
-            .eq('id', user_id)\
-            .single()\
-            .execute()
+        response = await async_supabase.execute(
+            async_supabase.table('profiles')
+            .select('*')
+            .eq('id', user_id)
+            .single()
+        )
         
         if not response.data:
             raise HTTPException(
@@ -214,19 +219,19 @@ def get_profile(current_user: User = Depends(get_current_user)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving profile: {str(e)}")
+        logger.error(f"❌ Error retrieving profile: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving profile: {str(e)}"
         )
     
 @router.put("/profile", response_class=JSONResponse)
-def update_profile(
+async def update_profile(
     profile_data: ProfileCreate,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_strict)
 ):
     """
     Update user profile.
     This is the same as create_or_update_profile but semantically clearer for updates.
     """
-    return create_or_update_profile(profile_data, current_user)
\ No newline at end of file
+    return await create_or_update_profile(profile_data, current_user)
\ No newline at end of file
@@ -1,20 +1,29 @@
 import os
 import json
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 
 # --- UPDATED IMPORTS ---
 from app.models.schemas import MealPlanRequest
 from app.models.user_logic import user
-from app.services.agent_service import generate_meal_plan_with_agent, map_workouts_to_activity_level,convert_questionnaire_to_meal_plan_request,generate_weekly_meal_plan
+from app.services.agent_service import generate_meal_plan_with_agent_async, stream_meal_plan_with_agent, map_workouts_to_activity_level,convert_questionnaire_to_meal_plan_request,generate_weekly_meal_plan
 
 from fastapi import Depends       # We need 'Depends' to use our dependency
 from gotrue.types import User     # This is the data type for the user object Supabase returns
 from app.core.security import get_current_user # Import our lock checker!
-from app.tools.database_tools import get_current_meal_plan
+from app.tools.database_tools import store_meal_plan, saved_meal_plan
+from app.tools.meal_solver import plan_meals, supports_diet
 from app.services.supabase_client import supabase
+from app.services.supabase_async import async_supabase
+from app.services.job_queue import job_queue
+from app.services.weekly_plan_cache import weekly_plan_cache
+from app.services.metrics import PLAN_STAGE_SECONDS
+from app.core.log import get_logger, preview
 from app.models.user_logic import user 
 
+logger = get_logger(__name__)
+
 # Create an APIRouter
 router = APIRouter(
     prefix="/plans",  # Optional: adds /plans before each endpoint path
@@ -24,90 +33,66 @@ router = APIRouter(
 # NOTE: The endpoint path is now just "/", because the prefix is added automatically.
 # Full path will be /plans/generate_meal_plan
 @router.post("/generate_meal_plan", response_class=JSONResponse)
-def generate_meal_plan(current_user: User = Depends(get_current_user)):
+async def generate_meal_plan(fast: bool = False, current_user: User = Depends(get_current_user)):
     """
     Generate a personalized meal plan based on user's questionnaire data 
     stored in their Supabase auth metadata.
+
+    With ?fast=true the meal solver builds and saves the plan directly,
+    without the AI agent (diets the solver can't honour still use the agent).
     """
     try:
-        print(f"📋 Generating meal plan for user: {str(current_user.user.id)}")
-
-        # Get questionnaire data from user metadata
-        questionnaire_data = get_user_questionnaire(current_user)
-        
-        # Convert to MealPlanRequest format
-        request = convert_questionnaire_to_meal_plan_request(questionnaire_data)
-        
-        print(f"📊 Meal plan request: {request.dict()}")
-        
-        # Map workouts per week to activity level
-        activity_level = map_workouts_to_activity_level(request.workouts_per_week)
-        user_id = str(current_user.user.id)
-        
-        # Create user instance
-        user_instance = user(
-            sex=request.gender,
-            height=request.height,
-            age=request.age,
-            weight=request.weight,
-            activity_level=activity_level,
-            planned_weekly_weight_loss=request.planned_weekly_weight_loss,
-            desired_weight=request.weight_goal
+        logger.info(f"📋 Generating meal plan for user: {str(current_user.user.id)}")
+
+        with PLAN_STAGE_SECONDS.labels("targets").time():
+            plan_request = prepare_agent_meal_plan(current_user)
+        user_id = plan_request["user_id"]
+        questionnaire_data = plan_request["questionnaire_data"]
+        request = plan_request["request"]
+        activity_level = plan_request["activity_level"]
+        user_targets = plan_request["user_targets"]
+        goal_calories, protein_grams, fat_grams, carbs_grams = (
+            user_targets["calories"], user_targets["protein"], user_targets["fat"], user_targets["carbs"]
         )
+        prompt = plan_request["prompt"]
         
-        # Calculate nutritional targets
-        goal_calories = round(user_instance.goal_based_bmr(request.goal))
-        protein_grams = round(user_instance.protein_intake(request.goal), 1)
-        fat_grams = round(user_instance.fat_intake(request.goal), 1)
-        carbs_grams = round(user_instance.carbs_intake(request.goal), 1)
-        
-        print(f"🎯 Nutritional targets - Calories: {goal_calories}, Protein: {protein_grams}g, Fat: {fat_grams}g, Carbs: {carbs_grams}g")
-        
-        # Create prompt for the AI agent
-        prompt = f"""
-Hi NutriWise AI, I need a personalized daily meal plan.
-
-**CRITICAL: My user ID is: {user_id}**
-
-**My Daily Targets:**
-- Calories: {goal_calories}
-- Protein: {protein_grams}g
-- Fat: {fat_grams}g
-- Carbs: {carbs_grams}g
-
-**Dietary Preference:** {request.diet}
-**Additional Preferences:** {request.additional_considerations}
-
-**YOUR TASK (complete ALL steps):**
-1. Calculate meal targets (20% breakfast, 32.5% lunch, 32.5% dinner, 15% snacks)
-2. Search for appropriate recipes
-3. Create and display the complete meal plan
-4. **MANDATORY: Call save_meal_plan() with:**
-   - user_id: "{user_id}"
-   - plan_data: your complete meal_plan object
-   - user_targets: {{"calories": {goal_calories}, "protein": {protein_grams}, "fat": {fat_grams}, "carbs": {carbs_grams}}}
-5. Confirm the save was successful
-
-Do NOT end your response until save_meal_plan has been called.
-"""
-        
-        # Generate meal plan using the agent
-        print(f"🤖 Calling AI agent to generate meal plan...")
-        agent_response = generate_meal_plan_with_agent(prompt)
-        
-        print(f"📥 Fetching saved meal plan from database...")
-        meal_plan_json_string = get_current_meal_plan(user_id=user_id)
-        
-        # The tool returns a JSON string, so we need to parse it
-        meal_plan_response = json.loads(meal_plan_json_string)
-
-        meal_plan_data = None
-        if meal_plan_response.get("success"):
-            # Extract just the plan data to return in the response
-            meal_plan_data = meal_plan_response.get("plan")
-            print(f"✅ Meal plan generated and saved successfully!")
+        # save_meal_plan reports the plan it stores through this channel, so it isn't read back
+        saved = {}
+        channel_token = saved_meal_plan.set(saved)
+        try:
+            if fast and not supports_diet(request.diet):
+                logger.info(f"⚡ The meal solver can't honour the '{request.diet}' diet, using the agent")
+                fast = False
+            if fast:
+                # The meal solver builds the plan directly, no agent round-trips
+                logger.info(f"⚡ Fast mode: solving the meal plan without the agent...")
+                with PLAN_STAGE_SECONDS.labels("solver").time():
+                    solved = await run_in_threadpool(
+                        plan_meals,
+                        user_targets,
+                        diet=request.diet,
+                        foods_to_avoid=questionnaire_data.get('foodsToAvoid', [])
+                    )
+                with PLAN_STAGE_SECONDS.labels("save").time():
+                    save_result = await run_in_threadpool(
+                        store_meal_plan, user_id, {"meal_plan": solved["meal_plan"]}, user_targets
+                    )
+                if not save_result.get("success"):
+                    raise HTTPException(status_code=500, detail=f"Error saving meal plan: {save_result.get('error')}")
+                agent_response = f"Meal plan built by the meal solver (% off target: {solved['fit']['percent_off_target']})"
+            else:
+                # Generate meal plan using the agent
+                logger.info(f"🤖 Calling AI agent to generate meal plan...")
+                with PLAN_STAGE_SECONDS.labels("agent").time():
+                    agent_response = await generate_meal_plan_with_agent_async(prompt)
+        finally:
+            saved_meal_plan.reset(channel_token)
+
+        meal_plan_data = saved.get("plan")
+        if meal_plan_data is not None:
+            logger.info(f"✅ Meal plan generated and saved successfully!")
         else:
-            print(f"⚠️ Meal plan response: {meal_plan_response}")
+            logger.warning(f"⚠️ The agent finished without saving a meal plan")
 
         return {
             "status": "success",
@@ -135,11 +120,60 @@ Do NOT end your response until save_meal_plan has been called.
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error generating meal plan: {str(e)}")
+        logger.error(f"❌ Error generating meal plan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating meal plan: {str(e)}")
 
+def _sse(event: str, data) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/generate_meal_plan/stream")
+async def generate_meal_plan_stream(current_user: User = Depends(get_current_user)):
+    """
+    Same as /generate_meal_plan, but streams the agent's progress as
+    Server-Sent Events instead of answering once it has finished.
+
+    Events (each data field is JSON):
+        targets        nutritional targets, sent right away
+        iteration      the agent started another model turn
+        text_delta     model text as it is generated
+        tool_call      a tool is being called (name and arguments)
+        meal_selected  recipe, servings and totals chosen for one meal
+        final_plan     the saved plan (plan_id and meal_plan)
+        done           the agent's final message
+        error          generation failed (status_code and detail)
+    """
+    try:
+        logger.info(f"📋 Streaming meal plan generation for user: {str(current_user.user.id)}")
+        with PLAN_STAGE_SECONDS.labels("targets").time():
+            plan_request = prepare_agent_meal_plan(current_user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error generating meal plan: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating meal plan: {str(e)}")
+
+    async def events():
+        yield _sse("targets", plan_request["user_targets"])
+        try:
+            async for event, data in stream_meal_plan_with_agent(plan_request["prompt"]):
+                yield _sse(event, data)
+        except HTTPException as he:
+            yield _sse("error", {"status_code": he.status_code, "detail": he.detail})
+        except Exception as e:
+            logger.error(f"❌ Error streaming meal plan: {str(e)}", exc_info=True)
+            yield _sse("error", {"status_code": 500, "detail": f"Error generating meal plan: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/current", response_class=JSONResponse)
-def read_current_meal_plan(current_user: User = Depends(get_current_user)):
+async def read_current_meal_plan(current_user: User = Depends(get_current_user)):
     """
     Retrieves the most recent meal plan for the authenticated user.
     """
@@ -149,12 +183,13 @@ def read_current_meal_plan(current_user: User = Depends(get_current_user)):
         user_id = str(current_user.user.id)
 
         # Query the database for the most recent plan for this user
-        response = supabase.table('meal_plans')\
-            .select('id, plan_data, user_targets, created_at')\
-            .eq('user_id', user_id)\
-            .order('created_at', desc=True)\
-            .limit(1)\
-            .execute()
+        response = await async_supabase.execute(
+            async_supabase.table('meal_plans')
+            .select('id, plan_data, user_targets, created_at')
+            .eq('user_id', user_id)
+            .order('created_at', desc=True)
+            .limit(1)
+        )
         
         # Check if any data was returned
         if response.data and len(response.data) > 0:
@@ -178,79 +213,61 @@ def read_current_meal_plan(current_user: User = Depends(get_current_user)):
             detail=f"An error occurred while retrieving the meal plan: {str(e)}"
         )
 
-@router.post("/generate_weekly_plan", response_class=JSONResponse)
-def generate_weekly_plan_endpoint(current_user: User = Depends(get_current_user)):
+@router.post("/generate_weekly_plan", status_code=202, response_class=JSONResponse)
+async def generate_weekly_plan_endpoint(fast: bool = False, current_user: User = Depends(get_current_user)):
     """
-    Generate a complete 7-day weekly meal plan.
-    Called after user completes payment.
+    Queue generation of a complete 7-day weekly meal plan.
+    Called after user completes payment. With ?fast=true each day is built
+    by the meal solver instead of the AI agent (unless it can't honour the diet).
+
+    Generation runs in the background job queue; poll GET /plans/jobs/{job_id}
+    for per-day progress and the final result.
     
     Returns:
         {
-            "status": "success",
-            "weekly_plan_id": 123,
-            "week_start_date": "2025-10-20",
-            "days_generated": 7,
-            "message": "Weekly meal plan generated successfully"
+            "status": "queued",
+            "job_id": "3f2a...",
+            "status_url": "/plans/jobs/3f2a...",
+            "message": "Weekly meal plan generation started"
         }
     """
     try:
-        print("\n" + "="*80)
-        print("🚀 STARTING WEEKLY PLAN GENERATION")
-        print("="*80)
-
         user_id = str(current_user.user.id)
-        print(f"📅 Step 1: User ID extracted: {user_id}")
+        logger.info(f"🚀 STARTING WEEKLY PLAN GENERATION for user: {user_id}")
 
         # 1. Get user's questionnaire data
-        print(f"\n📋 Step 2: Fetching questionnaire data from user metadata...")
+        logger.debug("📋 Step 2: Fetching questionnaire data from user metadata...")
         try:
             questionnaire_data = get_user_questionnaire(current_user)
-            print(f"✅ Questionnaire data retrieved successfully")
-            print(f"   Type: {type(questionnaire_data)}")
-            print(f"   Keys: {list(questionnaire_data.keys()) if isinstance(questionnaire_data, dict) else 'N/A'}")
-            print(f"   Content preview: {str(questionnaire_data)[:200]}...")
+            logger.debug("✅ Questionnaire data retrieved: %s", preview(questionnaire_data, 200))
         except Exception as qe:
-            print(f"❌ ERROR in get_user_questionnaire: {str(qe)}")
-            print(f"   Error type: {type(qe).__name__}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ ERROR in get_user_questionnaire ({type(qe).__name__}): {str(qe)}", exc_info=True)
             raise
 
         # 2. Get user profile from database (for additional data)
-        print(f"\n👤 Step 3: Fetching profile from database...")
+        logger.debug("👤 Step 3: Fetching profile from database...")
         try:
-            profile_response = supabase.table('profiles')\
-                .select('*')\
-                .eq('id', user_id)\
-                .single()\
-                .execute()
-
-            print(f"   Response received: {hasattr(profile_response, 'data')}")
-            print(f"   Data type: {type(profile_response.data)}")
-            print(f"   Data is None: {profile_response.data is None}")
-
-            if profile_response.data:
-                print(f"   Profile keys: {list(profile_response.data.keys()) if isinstance(profile_response.data, dict) else 'N/A'}")
-                print(f"   Profile content: {profile_response.data}")
+            profile_response = await async_supabase.execute(
+                async_supabase.table('profiles')
+                .select('*')
+                .eq('id', user_id)
+                .single()
+            )
 
             if not profile_response.data:
-                print(f"❌ No profile data returned from database")
+                logger.error(f"❌ No profile data returned from database")
                 raise HTTPException(status_code=404, detail="User profile not found")
 
             profile = profile_response.data
-            print(f"✅ Profile retrieved successfully")
+            logger.debug("✅ Profile retrieved: %s", preview(profile))
 
         except HTTPException:
             raise
         except Exception as pe:
-            print(f"❌ ERROR fetching profile: {str(pe)}")
-            print(f"   Error type: {type(pe).__name__}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ ERROR fetching profile ({type(pe).__name__}): {str(pe)}", exc_info=True)
             raise
 
         # 3. Merge questionnaire and profile data
-        print(f"\n🔧 Step 4: Building profile_data dict...")
         try:
             profile_data = {
                 'gender': profile['gender'],
@@ -262,35 +279,19 @@ def generate_weekly_plan_endpoint(current_user: User = Depends(get_current_user)
                 'weight_goal': profile['weight_goal'],
                 'planned_weekly_weight_loss': profile['planned_weekly_weight_loss'],
             }
-            print(f"✅ Profile data assembled: {profile_data}")
         except KeyError as ke:
-            print(f"❌ ERROR: Missing key in profile: {str(ke)}")
-            print(f"   Available keys: {list(profile.keys()) if isinstance(profile, dict) else 'N/A'}")
+            logger.error(f"❌ ERROR: Missing key in profile: {str(ke)}")
             raise HTTPException(status_code=500, detail=f"Profile missing required field: {str(ke)}")
         except Exception as pde:
-            print(f"❌ ERROR building profile_data: {str(pde)}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ ERROR building profile_data: {str(pde)}", exc_info=True)
             raise
 
         # 4. Build preferences
-        print(f"\n🍽️ Step 5: Building preferences dict...")
         try:
-            print(f"   Extracting diet from questionnaire...")
             diet = questionnaire_data.get('specificDiet', 'balanced')
-            print(f"   Diet: {diet}")
-
-            print(f"   Extracting foodsToAvoid...")
             foods_to_avoid = questionnaire_data.get('foodsToAvoid', [])
-            print(f"   Foods to avoid: {foods_to_avoid}")
-
-            print(f"   Extracting cuisinePreferences...")
             cuisine_prefs = questionnaire_data.get('cuisinePreferences', [])
-            print(f"   Cuisine preferences: {cuisine_prefs}")
-
-            print(f"   Calling build_additional_considerations...")
             additional = build_additional_considerations(questionnaire_data)
-            print(f"   Additional considerations: {additional[:100] if additional else 'None'}...")
 
             preferences = {
                 'diet': diet,
@@ -298,68 +299,147 @@ def generate_weekly_plan_endpoint(current_user: User = Depends(get_current_user)
                 'cuisinePreferences': cuisine_prefs,
                 'additional_considerations': additional
             }
-            print(f"✅ Preferences assembled successfully")
-            print(f"   Preferences: {preferences}")
         except AttributeError as ae:
-            print(f"❌ ERROR: AttributeError in preferences building: {str(ae)}")
-            print(f"   questionnaire_data type: {type(questionnaire_data)}")
-            print(f"   questionnaire_data value: {questionnaire_data}")
-            import traceback
-            traceback.print_exc()
+            logger.error(
+                f"❌ ERROR: AttributeError in preferences building: {str(ae)} "
+                f"(questionnaire_data: {type(questionnaire_data).__name__})", exc_info=True
+            )
             raise HTTPException(status_code=500, detail=f"Error building preferences: {str(ae)}")
         except Exception as pre:
-            print(f"❌ ERROR building preferences: {str(pre)}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"❌ ERROR building preferences: {str(pre)}", exc_info=True)
             raise
 
-        print(f"\n📊 Summary - Profile data: {profile_data}")
-        print(f"🍽️ Summary - Preferences: {preferences}")
+        logger.debug("📊 Summary - Profile data: %s", preview(profile_data))
+        logger.debug("🍽️ Summary - Preferences: %s", preview(preferences))
         
-        # 5. Generate weekly meal plan (this calls the agent 7 times)
-        weekly_plan_id = generate_weekly_meal_plan(
+        # 5. Queue the weekly meal plan generation (this calls the agent 7 times)
+        job_id = await run_in_threadpool(
+            job_queue.submit,
+            "weekly_plan",
+            user_id,
+            run_weekly_plan_job,
             user_id=user_id,
             profile_data=profile_data,
-            preferences=preferences
+            preferences=preferences,
+            fast=fast
         )
         
-        # 6. Get the created plan details
-        weekly_plan = supabase.table('weekly_plans')\
-            .select('*')\
-            .eq('id', weekly_plan_id)\
-            .single()\
-            .execute()
-        
-        print(f"✅ Weekly meal plan {weekly_plan_id} generated successfully!")
-        
         return {
-            "status": "success",
-            "weekly_plan_id": weekly_plan_id,
-            "week_start_date": str(weekly_plan.data['week_start_date']),
-            "days_generated": 7,
-            "weekly_targets": {
-                "calories": weekly_plan.data['weekly_target_calories'],
-                "protein": weekly_plan.data['weekly_target_protein'],
-                "carbs": weekly_plan.data['weekly_target_carbs'],
-                "fat": weekly_plan.data['weekly_target_fat']
-            },
-            "message": "Weekly meal plan generated successfully!"
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/plans/jobs/{job_id}",
+            "message": "Weekly meal plan generation started"
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error generating weekly meal plan: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Error generating weekly meal plan: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Error generating weekly meal plan: {str(e)}"
         )
 
 
+def run_weekly_plan_job(user_id: str, profile_data: dict, preferences: dict, report_progress, fast: bool = False) -> dict:
+    """
+    Job-queue worker for weekly plan generation. Returns the summary that
+    GET /plans/jobs/{job_id} reports once the job has completed.
+    """
+    weekly_plan_id = generate_weekly_meal_plan(
+        user_id=user_id,
+        profile_data=profile_data,
+        preferences=preferences,
+        on_progress=report_progress,
+        fast=fast
+    )
+    
+    # Get the created plan details
+    weekly_plan = supabase.table('weekly_plans')\
+        .select('*')\
+        .eq('id', weekly_plan_id)\
+        .single()\
+        .execute()
+    
+    logger.info(f"✅ Weekly meal plan {weekly_plan_id} generated successfully!")
+    
+    return {
+        "weekly_plan_id": weekly_plan_id,
+        "week_start_date": str(weekly_plan.data['week_start_date']),
+        "days_generated": 7,
+        "weekly_targets": {
+            "calories": weekly_plan.data['weekly_target_calories'],
+            "protein": weekly_plan.data['weekly_target_protein'],
+            "carbs": weekly_plan.data['weekly_target_carbs'],
+            "fat": weekly_plan.data['weekly_target_fat']
+        },
+        "message": "Weekly meal plan generated successfully!"
+    }
+
+
+def fail_abandoned_weekly_plan(job: dict):
+    """
+    Cleanup for a weekly plan job whose worker went away: without it the
+    plan row would stay 'generating' forever.
+    """
+    weekly_plan_id = job['progress'].get('weekly_plan_id')
+    if weekly_plan_id is None:
+        return
+    supabase.table('weekly_plans').update({
+        'status': 'failed'
+    }).eq('id', weekly_plan_id).eq('status', 'generating').execute()
+    weekly_plan_cache.invalidate(weekly_plan_id)
+    logger.warning(f"⚠️ Weekly plan {weekly_plan_id} marked failed (job {job['id']} was abandoned)")
+
+
+job_queue.on_abandoned("weekly_plan", fail_abandoned_weekly_plan)
+
+
+@router.get("/jobs/{job_id}", response_class=JSONResponse)
+def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Report the status of a background generation job.
+    
+    Returns:
+        {
+            "job_id": "3f2a...",
+            "status": "running",          // queued | running | completed | failed
+            "progress": {
+                "weekly_plan_id": 123,
+                "days": {"1": "completed", "2": "running", "3": "pending", ...},
+                "days_completed": 1,
+                "total_days": 7
+            },
+            "result": null,               // set once completed
+            "error": null                 // set if failed
+        }
+    """
+    job = job_queue.get(job_id)
+    
+    if not job or job['user_id'] != str(current_user.user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    progress = job['progress']
+    days = progress.get('days', {})
+    
+    return {
+        "job_id": job['id'],
+        "job_type": job['job_type'],
+        "status": job['status'],
+        "progress": {
+            **progress,
+            "days_completed": sum(1 for status in days.values() if status == 'completed'),
+            "total_days": len(days)
+        },
+        "result": job['result'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at']
+    }
+
+
 @router.get("/weekly/current", response_class=JSONResponse)
-def get_current_weekly_plan(current_user: User = Depends(get_current_user)):
+async def get_current_weekly_plan(current_user: User = Depends(get_current_user)):
     """
     Get the user's most recent active weekly plan.
     Useful for showing "Your Current Plan" in the UI.
@@ -368,13 +448,14 @@ def get_current_weekly_plan(current_user: User = Depends(get_current_user)):
         user_id = str(current_user.user.id)
 
         # Get most recent active weekly plan
-        weekly_plan_response = supabase.table('weekly_plans')\
-            .select('id, week_start_date, status, created_at')\
-            .eq('user_id', user_id)\
-            .eq('status', 'active')\
-            .order('created_at', desc=True)\
-            .limit(1)\
-            .execute()
+        weekly_plan_response = await async_supabase.execute(
+            async_supabase.table('weekly_plans')
+            .select('id, week_start_date, status, created_at')
+            .eq('user_id', user_id)
+            .eq('status', 'active')
+            .order('created_at', desc=True)
+            .limit(1)
+        )
 
         if not weekly_plan_response.data or len(weekly_plan_response.data) == 0:
             raise HTTPException(
@@ -395,7 +476,7 @@ def get_current_weekly_plan(current_user: User = Depends(get_current_user)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving current weekly plan: {str(e)}")
+        logger.error(f"❌ Error retrieving current weekly plan: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving current weekly plan: {str(e)}"
@@ -403,7 +484,7 @@ def get_current_weekly_plan(current_user: User = Depends(get_current_user)):
 
 
 @router.get("/weekly/{weekly_plan_id}", response_class=JSONResponse)
-def get_weekly_plan(
+async def get_weekly_plan(
     weekly_plan_id: int,
     current_user: User = Depends(get_current_user)
 ):
@@ -427,14 +508,22 @@ def get_weekly_plan(
     """
     try:
         user_id = str(current_user.user.id)
-        
-        # 1. Get weekly plan
-        weekly_plan_response = supabase.table('weekly_plans')\
-            .select('*')\
-            .eq('id', weekly_plan_id)\
-            .eq('user_id', user_id)\
-            .single()\
-            .execute()
+
+        # The cache checks its version counter in SQLite, so keep it off the event loop
+        cached = await run_in_threadpool(weekly_plan_cache.get, weekly_plan_id, user_id)
+        if cached is not None:
+            return cached
+        version = await run_in_threadpool(weekly_plan_cache.version, weekly_plan_id)
+        
+        # Weekly plan, its days and their meal previews in one round-trip (embedded select)
+        weekly_plan_response = await async_supabase.execute(
+            async_supabase.table('weekly_plans')
+            .select('*, daily_plans(*, meals(id, meal_type, recipe_id))')
+            .eq('id', weekly_plan_id)
+            .eq('user_id', user_id)
+            .order('date', foreign_table='daily_plans')
+            .single()
+        )
         
         if not weekly_plan_response.data:
             raise HTTPException(
@@ -442,37 +531,30 @@ def get_weekly_plan(
                 detail="Weekly plan not found or you don't have access"
             )
         
-        # 2. Get all daily plans for this week
-        daily_plans_response = supabase.table('daily_plans')\
-            .select('*')\
-            .eq('weekly_plan_id', weekly_plan_id)\
-            .order('date')\
-            .execute()
+        weekly_plan = dict(weekly_plan_response.data)
+        daily_plans = weekly_plan.pop('daily_plans', None) or []
         
-        # 3. For each daily plan, get meal count
         daily_plans_with_meals = []
-        for daily_plan in daily_plans_response.data:
-            meals_response = supabase.table('meals')\
-                .select('id, meal_type, recipe_id')\
-                .eq('daily_plan_id', daily_plan['id'])\
-                .execute()
-            
+        for daily_plan in daily_plans:
+            meals = daily_plan.pop('meals', None) or []
             daily_plans_with_meals.append({
                 **daily_plan,
-                'meal_count': len(meals_response.data),
-                'meals_preview': meals_response.data  # Just IDs and types
+                'meal_count': len(meals),
+                'meals_preview': meals  # Just IDs and types
             })
         
-        return {
-            "weekly_plan": weekly_plan_response.data,
+        response = {
+            "weekly_plan": weekly_plan,
             "daily_plans": daily_plans_with_meals,
             "total_days": len(daily_plans_with_meals)
         }
+        weekly_plan_cache.put(weekly_plan_id, user_id, version, response)
+        return response
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving weekly plan: {str(e)}")
+        logger.error(f"❌ Error retrieving weekly plan: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving weekly plan: {str(e)}"
@@ -480,7 +562,7 @@ def get_weekly_plan(
 
 
 @router.get("/daily/{daily_plan_id}/meals", response_class=JSONResponse)
-def get_daily_meals(
+async def get_daily_meals(
     daily_plan_id: int,
     current_user: User = Depends(get_current_user)
 ):
@@ -511,11 +593,12 @@ def get_daily_meals(
         user_id = str(current_user.user.id)
         
         # 1. Verify access - check if daily plan belongs to user
-        daily_plan_response = supabase.table('daily_plans')\
-            .select('*, weekly_plans!inner(user_id)')\
-            .eq('id', daily_plan_id)\
-            .single()\
-            .execute()
+        daily_plan_response = await async_supabase.execute(
+            async_supabase.table('daily_plans')
+            .select('*, weekly_plans!inner(user_id)')
+            .eq('id', daily_plan_id)
+            .single()
+        )
         
         if not daily_plan_response.data:
             raise HTTPException(status_code=404, detail="Daily plan not found")
@@ -524,11 +607,12 @@ def get_daily_meals(
             raise HTTPException(status_code=403, detail="Access denied")
         
         # 2. Get all meals with recipe details
-        meals_response = supabase.table('meals')\
-            .select('*, recipes(*)')\
-            .eq('daily_plan_id', daily_plan_id)\
-            .order('meal_type')\
-            .execute()
+        meals_response = await async_supabase.execute(
+            async_supabase.table('meals')
+            .select('*, recipes(*)')
+            .eq('daily_plan_id', daily_plan_id)
+            .order('meal_type')
+        )
         
         # 3. Sort meals by meal type order
         meal_order = {'breakfast': 1, 'lunch': 2, 'dinner': 3, 'snack': 4}
@@ -555,7 +639,7 @@ def get_daily_meals(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving daily meals: {str(e)}")
+        logger.error(f"❌ Error retrieving daily meals: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving daily meals: {str(e)}"
@@ -563,7 +647,7 @@ def get_daily_meals(
 
 
 @router.get("/meals/{meal_id}", response_class=JSONResponse)
-def get_meal_detail(
+async def get_meal_detail(
     meal_id: int,
     current_user: User = Depends(get_current_user)
 ):
@@ -596,11 +680,12 @@ def get_meal_detail(
         user_id = str(current_user.user.id)
         
         # 1. Get meal with recipe and verify access
-        meal_response = supabase.table('meals')\
-            .select('*, recipes(*), daily_plans!inner(weekly_plans!inner(user_id))')\
-            .eq('id', meal_id)\
-            .single()\
-            .execute()
+        meal_response = await async_supabase.execute(
+            async_supabase.table('meals')
+            .select('*, recipes(*), daily_plans!inner(weekly_plans!inner(user_id))')
+            .eq('id', meal_id)
+            .single()
+        )
         
         if not meal_response.data:
             raise HTTPException(status_code=404, detail="Meal not found")
@@ -627,13 +712,87 @@ def get_meal_detail(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving meal detail: {str(e)}")
+        logger.error(f"❌ Error retrieving meal detail: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving meal detail: {str(e)}"
         )
 
 
+def prepare_agent_meal_plan(current_user: User) -> dict:
+    """
+    Targets and agent prompt for a user's daily meal plan, from the
+    questionnaire in their auth metadata. Shared by the regular and the
+    streaming generate endpoints.
+    """
+    # Get questionnaire data from user metadata
+    questionnaire_data = get_user_questionnaire(current_user)
+    
+    # Convert to MealPlanRequest format
+    request = convert_questionnaire_to_meal_plan_request(questionnaire_data)
+    
+    logger.debug("📊 Meal plan request: %s", preview(request))
+    
+    # Map workouts per week to activity level
+    activity_level = map_workouts_to_activity_level(request.workouts_per_week)
+    user_id = str(current_user.user.id)
+    
+    # Create user instance
+    user_instance = user(
+        sex=request.gender,
+        height=request.height,
+        age=request.age,
+        weight=request.weight,
+        activity_level=activity_level,
+        planned_weekly_weight_loss=request.planned_weekly_weight_loss,
+        desired_weight=request.weight_goal
+    )
+    
+    # Calculate nutritional targets
+    goal_calories = round(user_instance.goal_based_bmr(request.goal))
+    protein_grams = round(user_instance.protein_intake(request.goal), 1)
+    fat_grams = round(user_instance.fat_intake(request.goal), 1)
+    carbs_grams = round(user_instance.carbs_intake(request.goal), 1)
+    
+    logger.info(f"🎯 Nutritional targets - Calories: {goal_calories}, Protein: {protein_grams}g, Fat: {fat_grams}g, Carbs: {carbs_grams}g")
+    
+    # Create prompt for the AI agent
+    prompt = f"""
+Hi NutriWise AI, I need a personalized daily meal plan.
+
+**CRITICAL: My user ID is: {user_id}**
+
+**My Daily Targets:**
+- Calories: {goal_calories}
+- Protein: {protein_grams}g
+- Fat: {fat_grams}g
+- Carbs: {carbs_grams}g
+
+**Dietary Preference:** {request.diet}
+**Additional Preferences:** {request.additional_considerations}
+
+**YOUR TASK (complete ALL steps):**
+1. Calculate meal targets (20% breakfast, 32.5% lunch, 32.5% dinner, 15% snacks)
+2. Search for appropriate recipes
+3. Create and display the complete meal plan
+4. **MANDATORY: Call save_meal_plan() with:**
+   - user_id: "{user_id}"
+   - plan_data: your complete meal_plan object
+   - user_targets: {{"calories": {goal_calories}, "protein": {protein_grams}, "fat": {fat_grams}, "carbs": {carbs_grams}}}
+5. Confirm the save was successful
+
+Do NOT end your response until save_meal_plan has been called.
+"""
+    return {
+        "user_id": user_id,
+        "questionnaire_data": questionnaire_data,
+        "request": request,
+        "activity_level": activity_level,
+        "user_targets": {"calories": goal_calories, "protein": protein_grams, "fat": fat_grams, "carbs": carbs_grams},
+        "prompt": prompt,
+    }
+
+
 def get_user_questionnaire(current_user: User) -> dict:
     """
     Retrieve questionnaire data from the authenticated user's metadata.
@@ -650,13 +809,13 @@ def get_user_questionnaire(current_user: User) -> dict:
                 detail="No questionnaire data found. Please complete the onboarding process."
             )
 
-        print(f"✅ Retrieved questionnaire data for user: {current_user.user.id}")
+        logger.debug(f"✅ Retrieved questionnaire data for user: {current_user.user.id}")
         return questionnaire_data
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error retrieving questionnaire: {str(e)}")
+        logger.error(f"❌ Error retrieving questionnaire: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve questionnaire: {str(e)}"
@@ -4,8 +4,11 @@ from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi import Depends
 from app.services.agent_service import map_workouts_to_activity_level
-from app.models.schemas import MealPlanRequest
-from app.models.user_logic import user
+from app.models.schemas import MealPlanRequest, BatchTargetsRequest
+from app.models.user_logic import user, compute_targets_batch
+
+# Largest batch accepted by /public/calculate-targets/batch
+MAX_BATCH_PROFILES = int(os.getenv("MAX_BATCH_PROFILES", "10000"))
 
 router = APIRouter(
     prefix="/public",
@@ -64,4 +67,73 @@ def calculate_nutritional_targets(request: MealPlanRequest):
     except NameError as ne:
         raise HTTPException(status_code=400, detail=str(ne))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@router.post("/calculate-targets/batch", response_class=JSONResponse)
+def calculate_nutritional_targets_batch(request: BatchTargetsRequest):
+    """
+    Nutritional targets for many profiles in one call (marketing calculator,
+    nightly re-targeting). All targets are computed together as array
+    operations; each result has the same "data" as /public/calculate-targets,
+    or success False with the validation error for that profile.
+    """
+    profiles = request.profiles
+    if len(profiles) > MAX_BATCH_PROFILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PROFILES} profiles per request")
+
+    try:
+        activity_levels = [map_workouts_to_activity_level(p.workouts_per_week) for p in profiles]
+        targets = compute_targets_batch(
+            sex=[p.gender for p in profiles],
+            height=[p.height for p in profiles],
+            age=[p.age for p in profiles],
+            weight=[p.weight for p in profiles],
+            activity_level=activity_levels,
+            goal=[p.goal for p in profiles],
+            planned_weekly_weight_loss=[p.planned_weekly_weight_loss for p in profiles],
+        )
+
+        columns = zip(
+            profiles,
+            activity_levels,
+            targets["errors"],
+            targets["tdee"].tolist(),
+            targets["calories"].tolist(),
+            targets["protein"].tolist(),
+            targets["fat"].tolist(),
+            targets["carbs"].tolist(),
+        )
+        results = []
+        for profile, activity_level, error, tdee, calories, protein, fat, carbs in columns:
+            if error:
+                results.append({"success": False, "error": error})
+                continue
+            results.append({
+                "success": True,
+                "data": {
+                    "nutritional_targets": {
+                        "calories": round(calories),
+                        "protein_grams": round(protein, 1),
+                        "fat_grams": round(fat, 1),
+                        "carbs_grams": round(carbs, 1)
+                    },
+                    "user_metrics": {
+                        "tdee": round(tdee),
+                        "activity_level": activity_level,
+                        "goal": profile.goal,
+                        "diet": profile.diet
+                    },
+                    "weight_goal_info": {
+                        "current_weight": profile.weight,
+                        "goal_weight": profile.weight_goal,
+                        "total_weight_change_kg": round(profile.weight - profile.weight_goal, 2),
+                        "planned_weekly_change_kg": round(profile.planned_weekly_weight_loss, 2),
+                    }
+                }
+            })
+
+        return JSONResponse(content={"success": True, "count": len(results), "results": results}, status_code=200)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
@@ -1,20 +1,36 @@
 import os
+import time
+import asyncio
 from fastapi import HTTPException
-from google import genai
 from google.genai import types
-from dotenv import load_dotenv
+from google.genai import errors as genai_errors
 import json
+from pydantic import ValidationError
 
 from app.core.prompts import system_prompt,weekly_day_system_prompt
-from app.tools.call_function import call_function
+from app.tools.call_function import call_functions_concurrently
+from app.services.prompt_cache import prompt_cache
+from app.services.gemini_client import gemini_clients, GEMINI_MODEL
+from app.services.weekly_plan_cache import weekly_plan_cache
+from app.services.conversation_history import ConversationHistory
+from app.services.meal_plan_extractor import extract_meal_plan
+from app.services.metrics import record_llm_turn, AGENT_ITERATIONS, PLAN_STAGE_SECONDS
+from app.core.log import get_logger, preview, debug_enabled, new_session_id, agent_session_id
 
 # Import the actual functions we will be describing and calling
-from app.tools.database_tools import search_recipes, save_meal_plan, get_current_meal_plan
+from app.tools.database_tools import search_recipes, save_meal_plan, get_current_meal_plan, get_previous_recipes_in_week, recipe_partition, saved_meal_plan
 from app.tools.calculator import calculate
-from app.models.schemas import MealPlanRequest
+from app.tools.meal_solver import plan_meals, solve_meal_plan, supports_diet
+from app.models.schemas import MealPlanRequest, DayMealPlanResponse
 from app.services.supabase_client import supabase
+from app.services.job_queue import check_cancelled
 from app.models.user_logic import user 
 
+# How many days of a weekly plan are generated at once (1 = one after another)
+WEEKLY_PLAN_CONCURRENCY = int(os.getenv("WEEKLY_PLAN_CONCURRENCY", "1"))
+
+logger = get_logger(__name__)
+
 # --- THIS IS THE CORRECTED TOOL DEFINITION BLOCK ---
 # We manually define the schema for each function the model can call.
 
@@ -79,16 +95,21 @@ tools = [
                 )
             ),
 
-            # Schema for calculate(expression: str)
+            # Schema for calculate(expression: str = None, expressions: list = None)
             types.FunctionDeclaration(
                 name="calculate",
                 description=calculate.__doc__,
                 parameters=types.Schema(
                     type=types.Type.OBJECT,
                     properties={
-                        "expression": types.Schema(type=types.Type.STRING, description="The mathematical expression to evaluate, e.g., '2000 * 0.2'.")
+                        "expression": types.Schema(type=types.Type.STRING, description="The mathematical expression to evaluate, e.g., '2000 * 0.2'."),
+                        "expressions": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.STRING),
+                            description="Several expressions evaluated in one call, e.g. ['2000 * 0.20', '2000 * 0.325', '2000 * 0.325', '2000 * 0.15']. Prefer this over separate calls."
+                        )
                     },
-                    required=["expression"]
+                    # Either expression or expressions must be given
                 )
             ),
             types.FunctionDeclaration(
@@ -101,6 +122,11 @@ tools = [
                             type=types.Type.STRING, 
                             description="The search term to match against recipe names (e.g., 'chicken curry', 'salmon bowl', 'omelette')."
                         ),
+                        "queries": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.STRING),
+                            description="Several search terms searched together in one call, e.g. ['omelette', 'chicken', 'salmon', 'smoothie']. Returns one result set per term. Prefer this over separate calls when searching for several meals."
+                        ),
                         "column_name": types.Schema(
                             type=types.Type.STRING, 
                             description="The column to search in. Default is 'name'. Other options might include 'ingredients' if available."
@@ -110,7 +136,35 @@ tools = [
                             description="Minimum similarity score from 0 to 100. Default is 85. Lower values (e.g., 70) return more results."
                         )
                     },
-                    required=["query"]
+                    # Either query or queries must be given
+                )
+            ),
+            types.FunctionDeclaration(
+                name="solve_meal_plan",
+                description=solve_meal_plan.__doc__,
+                parameters=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "calories": types.Schema(type=types.Type.NUMBER, description="Daily calorie target."),
+                        "protein": types.Schema(type=types.Type.NUMBER, description="Daily protein target in grams."),
+                        "fat": types.Schema(type=types.Type.NUMBER, description="Daily fat target in grams."),
+                        "carbs": types.Schema(type=types.Type.NUMBER, description="Daily carbohydrate target in grams."),
+                        "diet": types.Schema(
+                            type=types.Type.STRING,
+                            description="Diet preference, e.g. 'balanced', 'vegetarian', 'vegan', 'pescatarian'."
+                        ),
+                        "foods_to_avoid": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.STRING),
+                            description="Foods that must not appear in the chosen recipes."
+                        ),
+                        "exclude_recipe_names": types.Schema(
+                            type=types.Type.ARRAY,
+                            items=types.Schema(type=types.Type.STRING),
+                            description="Recipe names not to use, e.g. the ones from get_previous_recipes_in_week."
+                        )
+                    },
+                    required=["calories", "protein", "fat", "carbs"]
                 )
             ),
             types.FunctionDeclaration(
@@ -141,141 +195,383 @@ def map_workouts_to_activity_level(workouts_per_week: int) -> str:
     else:
         return "extra active"
 
-def generate_meal_plan_with_agent(prompt: str, use_weekly_prompt: bool = False) -> str:
+async def _generate_content(client, messages: list, system_instruction: str, label: str):
     """
-    Generate meal plan using the AI agent with detailed logging.
-    
+    One model turn. The system prompt and tools go through the prompt cache;
+    if the API rejects the cached content, the turn is retried inline.
+    """
+    config = await prompt_cache.content_config(client, GEMINI_MODEL, system_instruction, tools, label=label)
+    started = time.perf_counter()
+    try:
+        response = await client.aio.models.generate_content(model=GEMINI_MODEL, contents=messages, config=config)
+    except genai_errors.ClientError as e:
+        if not config.cached_content:
+            raise
+        logger.warning(f"⚠️ Cached content {config.cached_content} rejected ({e.code}), retrying inline")
+        prompt_cache.invalidate(config.cached_content)
+        response = await client.aio.models.generate_content(
+            model=GEMINI_MODEL,
+            contents=messages,
+            config=types.GenerateContentConfig(tools=tools, system_instruction=system_instruction),
+        )
+    record_llm_turn(label, "turn", started, response.usage_metadata)
+    return response
+
+async def _generate_content_stream(client, messages: list, system_instruction: str, label: str):
+    """
+    One model turn as a stream of response chunks, with the same prompt cache
+    handling as _generate_content (the inline retry only happens if the cached
+    content is rejected before anything was streamed).
+    """
+    config = await prompt_cache.content_config(client, GEMINI_MODEL, system_instruction, tools, label=label)
+    started_at = time.perf_counter()
+    usage_metadata = None  # the last chunk carries the totals for the turn
+    started = False
+    try:
+        async for chunk in await client.aio.models.generate_content_stream(
+            model=GEMINI_MODEL, contents=messages, config=config
+        ):
+            started = True
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            yield chunk
+    except genai_errors.ClientError as e:
+        if not config.cached_content or started:
+            raise
+        logger.warning(f"⚠️ Cached content {config.cached_content} rejected ({e.code}), retrying inline")
+        prompt_cache.invalidate(config.cached_content)
+        async for chunk in await client.aio.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=messages,
+            config=types.GenerateContentConfig(tools=tools, system_instruction=system_instruction),
+        ):
+            usage_metadata = chunk.usage_metadata or usage_metadata
+            yield chunk
+    record_llm_turn(label, "stream", started_at, usage_metadata)
+
+async def _generate_structured(client, history: ConversationHistory, system_instruction: str, response_model,
+                               final_text: str = None, label: str = "weekly"):
+    """
+    Final turn in JSON mode: the model restates its answer as JSON matching
+    response_model (a Pydantic model), which is validated in one pass. If the
+    text the agent ended with already contains that JSON, it is used as is.
+
+    Gemini can't combine tools with a response schema, so this turn is sent
+    without them, and without the cached prefix that carries them.
+    """
+    if final_text:
+        meal_plan_json = extract_meal_plan(final_text)
+        if meal_plan_json is not None:
+            try:
+                return response_model.model_validate(meal_plan_json)
+            except ValidationError:
+                pass
+
+    logger.info("🧾 Requesting the final answer as structured JSON...")
+    history.append(types.Content(
+        role="user",
+        parts=[types.Part(text="Return the final meal_plan now, as JSON only.")]
+    ))
+    started = time.perf_counter()
+    response = await client.aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=history.messages,
+        config=types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            response_mime_type="application/json",
+            response_schema=response_model,
+        ),
+    )
+    record_llm_turn(label, "structured", started, response.usage_metadata)
+    try:
+        return response_model.model_validate_json(response.text or "")
+    except ValidationError as e:
+        raise ValueError(f"Structured response did not match {response_model.__name__}: {str(e)}")
+
+def generate_meal_plan_with_agent(prompt: str, use_weekly_prompt: bool = False, response_model=None):
+    """
+    Synchronous entry point for the agent. Runs the async agent loop on this
+    thread's event loop, so it must not be called from inside a running loop.
+
     Args:
         prompt: The user prompt
         use_weekly_prompt: If True, use weekly_day_system_prompt instead of system_prompt
+        response_model: Optional Pydantic model the final answer is returned as
     """
-    load_dotenv()
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="GEMINI_API_KEY not found")
+    return gemini_clients.run(generate_meal_plan_with_agent_async(
+        prompt, use_weekly_prompt=use_weekly_prompt, response_model=response_model
+    ))
+
+
+async def generate_meal_plan_with_agent_async(prompt: str, use_weekly_prompt: bool = False, response_model=None):
+    """
+    Generate meal plan using the AI agent with detailed logging.
 
+    Uses the async Gemini client, and all function calls returned in a single
+    model turn are executed concurrently. Their responses are appended to the
+    history in the original call order.
+
+    Args:
+        prompt: The user prompt
+        use_weekly_prompt: If True, use weekly_day_system_prompt instead of system_prompt
+        response_model: Optional Pydantic model. When given, the final turn runs in
+            JSON mode (see _generate_structured) and an instance of it is returned
+            instead of the agent's text
+    """
     # Choose which system prompt to use
     selected_system_prompt = weekly_day_system_prompt if use_weekly_prompt else system_prompt
+    prompt_label = "weekly" if use_weekly_prompt else "preview"
 
-    client = genai.Client(api_key=api_key)
-    messages = [types.Content(role="user", parts=[types.Part(text=prompt)])]
+    client = gemini_clients.get()  # shared, pooled client for this event loop
+    history = ConversationHistory(prompt)
     
     max_iters = 40
     iters = 0
 
-    print("\n--- STARTING NEW AGENT SESSION ---")
-    print(f"Using: {'WEEKLY' if use_weekly_prompt else 'PREVIEW'} system prompt")
-    print(f"Initial Prompt: {prompt[:200]}...")
+    session_token = new_session_id()
+    logger.info("--- STARTING NEW AGENT SESSION (%s prompt) ---", prompt_label)
+    logger.debug("Initial Prompt: %s", preview(prompt, 200))
 
-    while iters < max_iters:
-        iters += 1
-        print(f"\n--- AGENT ITERATION {iters} ---")
+    try:
+        while iters < max_iters:
+            # Inside a background job, stop between turns once the job is cancelled
+            check_cancelled()
+            iters += 1
+            logger.debug("--- AGENT ITERATION %d ---", iters)
 
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=messages,
-                config=types.GenerateContentConfig(
-                    tools=tools,
-                    system_instruction=selected_system_prompt
-                ),
-            )
+            try:
+                history.compact()
+                response = await _generate_content(client, history.messages, selected_system_prompt, prompt_label)
+
+                candidate = response.candidates[0]
+
+                # ADD DIAGNOSTIC LOGGING
+                if debug_enabled():
+                    logger.debug("Finish reason: %s", candidate.finish_reason)
+                    logger.debug("Safety ratings: %s", preview(getattr(candidate, 'safety_ratings', None)))
+                    logger.debug("Parts present: %s", preview(candidate.content.parts if candidate.content else None))
+                    logger.debug("Message history length: %d (~%d tokens)", len(history), history.estimated_tokens())
+                    logger.debug("Grounding metadata: %s", preview(getattr(candidate, 'grounding_metadata', None)))
+                    logger.debug("Prompt feedback: %s", preview(getattr(response, 'prompt_feedback', None)))
+
+                if not candidate.content or not candidate.content.parts:
+                    logger.warning(f"!!! Model returned an empty response (finish reason: {candidate.finish_reason}, iteration {iters}) !!!")
+
+                    if str(candidate.finish_reason) == "FinishReason.MALFORMED_FUNCTION_CALL":
+                        logger.warning("⚠️ Model generated a malformed function call. Attempting recovery...")
+
+                        if iters >= max_iters - 5:
+                            logger.error("❌ Too many malformed calls near max iterations. Stopping.")
+                            raise HTTPException(status_code=500, detail="Agent repeatedly generated malformed function calls")
+
+                        history.append(types.Content(
+                            role="user",
+                            parts=[types.Part(text="Error: Your last function call was malformed. Please retry with valid JSON arguments. For save_meal_plan, ensure plan_data is a properly formatted dict with all required fields. Double-check all quotes, commas, and brackets.")]
+                        ))
+                        continue
+
+                    # If we get STOP with empty content on first iteration, it might be a rate limit or safety issue
+                    if iters == 1:
+                        logger.error("❌ Empty response on first iteration - possible rate limit or prompt issue")
+                        raise HTTPException(
+                            status_code=429,
+                            detail="AI service returned empty response. This may be due to rate limiting or prompt safety filters. Please try again in a moment."
+                        )
 
-            candidate = response.candidates[0]
+                    if response_model is not None:
+                        # The tool results are in the history; ask for the answer instead of starting over
+                        logger.warning(f"⚠️ Empty response after {iters} iterations, requesting structured answer")
+                        return await _generate_structured(client, history, selected_system_prompt, response_model, label=prompt_label)
 
-            # ADD DIAGNOSTIC LOGGING
-            print(f"Finish reason: {candidate.finish_reason}")
-            print(f"Safety ratings: {candidate.safety_ratings if hasattr(candidate, 'safety_ratings') else 'N/A'}")
-            print(f"Content present: {candidate.content is not None}")
-            print(f"Parts present: {candidate.content.parts if candidate.content else 'No content'}")
-            print(f"Message history length: {len(messages)}")
+                    logger.warning(f"⚠️ Returning empty response after {iters} iterations")
+                    return "Agent returned an empty response."
 
-            if hasattr(candidate, 'grounding_metadata'):
-                print(f"Grounding metadata: {candidate.grounding_metadata}")
-            if hasattr(response, 'prompt_feedback'):
-                print(f"Prompt feedback: {response.prompt_feedback}")
+                history.append(candidate.content)
 
-            if not candidate.content or not candidate.content.parts:
-                print("!!! Model returned an empty response. Stopping. !!!")
-                print(f"Finish reason was: {candidate.finish_reason}")
-                print(f"Iteration: {iters}")
+                # --- PROCESS ALL PARTS ---
+                parts = candidate.content.parts
+                logger.debug("📦 Response has %d part(s)", len(parts))
 
-                if str(candidate.finish_reason) == "FinishReason.MALFORMED_FUNCTION_CALL":
-                    print("⚠️ Model generated a malformed function call. Attempting recovery...")
-                    print(f"   Iteration {iters}: This might be a save_meal_plan call with invalid JSON structure.")
+                function_calls = []  # Executed together once all parts are collected
+                all_text_parts = []  # ⭐ Collect ALL text parts
 
-                    if iters >= max_iters - 5:
-                        print("❌ Too many malformed calls near max iterations. Stopping.")
-                        raise HTTPException(status_code=500, detail="Agent repeatedly generated malformed function calls")
+                for idx, part in enumerate(parts):
+                    if hasattr(part, 'function_call') and part.function_call and part.function_call.name:
+                        function_call = part.function_call
+                        logger.debug("  Part %d: function call '%s' with %s", idx, function_call.name, preview(function_call.args, 100))
+                        function_calls.append(function_call)
 
-                    messages.append(types.Content(
-                        role="user",
-                        parts=[types.Part(text="Error: Your last function call was malformed. Please retry with valid JSON arguments. For save_meal_plan, ensure plan_data is a properly formatted dict with all required fields. Double-check all quotes, commas, and brackets.")]
-                    ))
+                    elif hasattr(part, 'text') and part.text:
+                        logger.debug("  Part %d: text %s", idx, preview(part.text, 100))
+                        all_text_parts.append(part.text)  # ⭐ Collect this text
+                    else:
+                        logger.debug("  Part %d: unknown part type %s", idx, type(part))
+
+                # If there were function calls, run them concurrently and continue the loop
+                if function_calls:
+                    tool_responses = await call_functions_concurrently(function_calls, verbose=True)
+                    history.extend(tool_responses)
+                    logger.debug("✅ Processed %d function call(s), continuing...", len(function_calls))
                     continue
 
-                # If we get STOP with empty content on first iteration, it might be a rate limit or safety issue
-                if iters == 1:
-                    print("❌ Empty response on first iteration - possible rate limit or prompt issue")
-                    raise HTTPException(
-                        status_code=429,
-                        detail="AI service returned empty response. This may be due to rate limiting or prompt safety filters. Please try again in a moment."
-                    )
+                # ⭐ If we only got text and no function calls, concatenate ALL text parts
+                if all_text_parts:
+                    final_text = "\n".join(all_text_parts)  # ⭐ Combine all text parts
+                    logger.info(f"✅ Agent finished after {iters} iteration(s)")
+                    logger.debug("Final response: %s", preview(final_text, 200))
+                    if response_model is not None:
+                        return await _generate_structured(client, history, selected_system_prompt, response_model, final_text, prompt_label)
+                    return final_text
+
+                logger.warning("⚠️ Response had no function calls and no text. Continuing...")
+                continue
 
-                print(f"⚠️ Returning empty response after {iters} iterations")
-                return "Agent returned an empty response."
+            except Exception as e:
+                logger.error(f"!!! ERROR in agent loop: {e} !!!", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Error in agent processing: {str(e)}")
 
-            messages.append(candidate.content)
+        logger.warning("!!! Maximum iterations reached. Stopping. !!!")
+        raise HTTPException(status_code=508, detail="Maximum iterations")
+    finally:
+        AGENT_ITERATIONS.labels(prompt_label).observe(iters)
+        agent_session_id.reset(session_token)
 
-            # --- PROCESS ALL PARTS ---
-            parts = candidate.content.parts
-            print(f"📦 Response has {len(parts)} part(s)")
+def _selected_meals(plan_data) -> list:
+    """One entry per meal of a meal plan object (recipe, servings, totals), for progress events"""
+    if isinstance(plan_data, str):
+        try:
+            plan_data = json.loads(plan_data)
+        except json.JSONDecodeError:
+            return []
+    if not isinstance(plan_data, dict):
+        return []
+    meal_plan = plan_data.get('meal_plan', plan_data)
+    if not isinstance(meal_plan, dict):
+        return []
+    return [
+        {
+            "meal": meal_name,
+            "recipe_name": meal.get('recipe_name'),
+            "recipe_id": meal.get('recipe_id'),
+            "servings": meal.get('servings'),
+            "total_nutrition": meal.get('total_nutrition'),
+        }
+        for meal_name, meal in meal_plan.items()
+        if isinstance(meal, dict) and meal.get('recipe_name')
+    ]
 
-            has_function_calls = False
-            all_text_parts = []  # ⭐ Collect ALL text parts
 
-            for idx, part in enumerate(parts):
-                print(f"\n  Part {idx}: ", end="")
+async def stream_meal_plan_with_agent(prompt: str, use_weekly_prompt: bool = False):
+    """
+    Same agent loop as generate_meal_plan_with_agent_async, using the
+    streaming Gemini API and reporting progress as it goes.
+
+    Yields (event, data) tuples:
+        ("iteration", {"iteration": 1})                 a model turn started
+        ("text_delta", {"text": "..."})                 model text as it arrives
+        ("tool_call", {"name": "...", "args": {...}})   a tool is about to run
+        ("meal_selected", {"meal": "Breakfast", "recipe_name": ..., "recipe_id": ..., "servings": ...})
+        ("final_plan", {"plan_id": 123, "meal_plan": {...}, "created_at": ...})   the plan was saved
+        ("done", {"response": "..."})                   the agent finished
+
+    Errors are raised as HTTPException, like the non-streaming loop.
+    """
+    selected_system_prompt = weekly_day_system_prompt if use_weekly_prompt else system_prompt
+    prompt_label = "weekly" if use_weekly_prompt else "preview"
 
-                if hasattr(part, 'function_call') and part.function_call and part.function_call.name:
-                    has_function_calls = True
-                    function_call = part.function_call
+    client = gemini_clients.get()
+    history = ConversationHistory(prompt)
+    # Filled by save_meal_plan; reset when the generator finishes, like the session id
+    saved = {}
+    channel_token = saved_meal_plan.set(saved)
 
-                    print(f"Function call: '{function_call.name}'")
-                    args_dict = dict(function_call.args)
-                    print(f"    Arguments: {json.dumps(args_dict, indent=2)[:100]}...")
+    max_iters = 40
+    iters = 0
 
-                    tool_response = call_function(function_call, verbose=True)
-                    messages.append(tool_response)
+    session_token = new_session_id()
+    logger.info("--- STARTING NEW STREAMING AGENT SESSION (%s prompt) ---", prompt_label)
 
-                elif hasattr(part, 'text') and part.text:
-                    print(f"Text: {part.text[:100]}...")
-                    all_text_parts.append(part.text)  # ⭐ Collect this text
-                else:
-                    print(f"Unknown part type: {type(part)}")
+    try:
+        while iters < max_iters:
+            iters += 1
+            yield "iteration", {"iteration": iters}
 
-            # If there were function calls, continue the loop
-            if has_function_calls:
-                print("✅ Processed function call(s), continuing...")
+            try:
+                history.compact()
+                parts = []
+                finish_reason = None
+                async for chunk in _generate_content_stream(client, history.messages, selected_system_prompt, prompt_label):
+                    if not chunk.candidates:
+                        continue
+                    candidate = chunk.candidates[0]
+                    finish_reason = candidate.finish_reason or finish_reason
+                    for part in (candidate.content.parts or []) if candidate.content else []:
+                        parts.append(part)
+                        if part.text and not part.thought:
+                            yield "text_delta", {"text": part.text}
+            except Exception as e:
+                logger.error(f"!!! ERROR in streaming agent loop: {e} !!!", exc_info=True)
+                raise HTTPException(status_code=500, detail=f"Error in agent processing: {str(e)}")
+
+            if not parts:
+                logger.warning(f"!!! Model returned an empty response (finish reason: {finish_reason}) !!!")
+                if str(finish_reason) == "FinishReason.MALFORMED_FUNCTION_CALL" and iters < max_iters - 5:
+                    history.append(types.Content(
+                        role="user",
+                        parts=[types.Part(text="Error: Your last function call was malformed. Please retry with valid JSON arguments. For save_meal_plan, ensure plan_data is a properly formatted dict with all required fields. Double-check all quotes, commas, and brackets.")]
+                    ))
+                    continue
+                if iters == 1:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="AI service returned empty response. This may be due to rate limiting or prompt safety filters. Please try again in a moment."
+                    )
+                yield "done", {"response": "Agent returned an empty response."}
+                return
+
+            # Streamed chunks together make up the model turn
+            history.append(types.Content(role="model", parts=parts))
+
+            function_calls = [part.function_call for part in parts if part.function_call and part.function_call.name]
+            if function_calls:
+                for function_call in function_calls:
+                    args = dict(function_call.args or {})
+                    if function_call.name == "save_meal_plan":
+                        for meal in _selected_meals(args.get('plan_data')):
+                            yield "meal_selected", meal
+                        args.pop('plan_data', None)  # sent as meal_selected / final_plan instead
+                    yield "tool_call", {"name": function_call.name, "args": args}
+
+                tool_responses = await call_functions_concurrently(function_calls, verbose=True)
+                history.extend(tool_responses)
+
+                plan = saved.pop("plan", None)
+                if plan is not None:
+                    plan_data = plan["plan_data"]
+                    yield "final_plan", {
+                        "plan_id": plan["id"],
+                        "meal_plan": plan_data.get('meal_plan', plan_data),
+                        "created_at": plan["created_at"]
+                    }
                 continue
 
-            # ⭐ If we only got text and no function calls, concatenate ALL text parts
-            if all_text_parts:
-                final_text = "\n".join(all_text_parts)  # ⭐ Combine all text parts
-                print(f"✅ Agent finished. Final response: {final_text[:200]}...")
-                return final_text
-
-            print("⚠️ Response had no function calls and no text. Continuing...")
-            continue
+            final_text = "".join(part.text for part in parts if part.text and not part.thought)
+            if final_text:
+                logger.info(f"✅ Streaming agent finished after {iters} iteration(s)")
+                yield "done", {"response": final_text}
+                return
 
-        except Exception as e:
-            print(f"!!! ERROR in agent loop: {e} !!!")
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(status_code=500, detail=f"Error in agent processing: {str(e)}")
+        logger.warning("!!! Maximum iterations reached. Stopping. !!!")
+        raise HTTPException(status_code=508, detail="Maximum iterations")
+    finally:
+        AGENT_ITERATIONS.labels(prompt_label).observe(iters)
+        try:
+            agent_session_id.reset(session_token)
+            saved_meal_plan.reset(channel_token)
+        except ValueError:
+            # Closed from another context (an abandoned generator finalized by the
+            # event loop): the task that set the variables is gone, nothing to restore
+            pass
 
-    print("!!! Maximum iterations reached. Stopping. !!!")
-    raise HTTPException(status_code=508, detail="Maximum iterations")
 
 def convert_questionnaire_to_meal_plan_request(questionnaire: dict) -> MealPlanRequest:
     """
@@ -328,10 +624,11 @@ def convert_questionnaire_to_meal_plan_request(questionnaire: dict) -> MealPlanR
         planned_weekly_weight_loss=float(questionnaire.get('weeklyWeightLoss', 0.5)),
     )
     
-    print(f"✅ Converted questionnaire to MealPlanRequest")
+    logger.info(f"✅ Converted questionnaire to MealPlanRequest")
     return meal_plan_request
 
-def generate_weekly_meal_plan(user_id: str, profile_data: dict, preferences: dict):
+def generate_weekly_meal_plan(user_id: str, profile_data: dict, preferences: dict, max_concurrency: int = None, on_progress=None,
+                              fast: bool = False):
     """
     Generate a complete 7-day meal plan for a user.
     
@@ -339,6 +636,12 @@ def generate_weekly_meal_plan(user_id: str, profile_data: dict, preferences: dic
         user_id: User's UUID
         profile_data: User profile info (height, weight, age, etc.)
         preferences: Diet preferences and restrictions
+        max_concurrency: How many days to generate at once. Defaults to
+            WEEKLY_PLAN_CONCURRENCY; 1 generates the days one after another.
+        on_progress: Optional callback, called as on_progress(weekly_plan_id=...)
+            once the plan exists and on_progress(days={"<n>": status}) as each
+            day moves through 'pending', 'running', 'completed' and 'failed'.
+        fast: If True, each day is built by the meal solver instead of the agent.
     
     Returns:
         weekly_plan_id: ID of the created weekly plan
@@ -380,122 +683,235 @@ def generate_weekly_meal_plan(user_id: str, profile_data: dict, preferences: dic
     
     weekly_plan_id = weekly_plan.data[0]['id']
     
-    print(f"📅 Created weekly plan {weekly_plan_id} starting {week_start}")
+    logger.info(f"📅 Created weekly plan {weekly_plan_id} starting {week_start}")
+
+    report_day = _day_progress_reporter(on_progress)
+    if on_progress:
+        on_progress(weekly_plan_id=weekly_plan_id, days={str(day): 'pending' for day in range(1, 8)})
     
     # 3. Generate all 7 days
     try:
-        print(f"\n🔄 Starting 7-day generation loop...")
-        print(f"   Preferences type: {type(preferences)}")
-        print(f"   Preferences content: {preferences}")
-
-        for day_num in range(7):
-            day_date = week_start + timedelta(days=day_num)
-
-            print(f"\n{'='*60}")
-            print(f"🗓️ Generating Day {day_num + 1} of 7 ({day_date.strftime('%A, %B %d')})")
-            print(f"{'='*60}")
+        logger.info(f"🔄 Starting 7-day generation loop...")
+        logger.debug("   Preferences: %s", preview(preferences))
+
+        daily_targets = {
+            'calories': daily_calories,
+            'protein': daily_protein,
+            'carbs': daily_carbs,
+            'fat': daily_fat
+        }
+        concurrency = max_concurrency or WEEKLY_PLAN_CONCURRENCY
 
-            try:
-                print(f"   Calling generate_single_day_for_weekly_plan...")
-                print(f"   Parameters:")
-                print(f"     - weekly_plan_id: {weekly_plan_id}")
-                print(f"     - day_number: {day_num + 1}")
-                print(f"     - day_date: {day_date}")
-                print(f"     - user_id: {user_id}")
-                print(f"     - daily_targets: {{'calories': {daily_calories}, 'protein': {daily_protein}, 'carbs': {daily_carbs}, 'fat': {daily_fat}}}")
-                print(f"     - preferences type: {type(preferences)}")
-
-                generate_single_day_for_weekly_plan(
+        with PLAN_STAGE_SECONDS.labels("weekly_days").time():
+            if concurrency > 1:
+                logger.info(f"   Generating days concurrently (max {concurrency} at a time)")
+                gemini_clients.run(generate_days_concurrently(
                     weekly_plan_id=weekly_plan_id,
-                    day_number=day_num + 1,
-                    day_date=day_date,
+                    week_start=week_start,
                     user_id=user_id,
-                    daily_targets={
-                        'calories': daily_calories,
-                        'protein': daily_protein,
-                        'carbs': daily_carbs,
-                        'fat': daily_fat
-                    },
-                    preferences=preferences
-                )
-                print(f"✅ Day {day_num + 1} completed successfully!")
+                    daily_targets=daily_targets,
+                    preferences=preferences,
+                    max_concurrency=concurrency,
+                    report_day=report_day,
+                    fast=fast
+                ))
+            else:
+                for day_num in range(7):
+                    check_cancelled()
+                    day_date = week_start + timedelta(days=day_num)
+
+                    logger.info(f"🗓️ Generating Day {day_num + 1} of 7 ({day_date.strftime('%A, %B %d')})")
+
+                    try:
+                        logger.debug(
+                            "   Calling generate_single_day_for_weekly_plan(weekly_plan_id=%s, day_number=%d, day_date=%s, daily_targets=%s)",
+                            weekly_plan_id, day_num + 1, day_date, daily_targets
+                        )
 
-            except Exception as day_error:
-                print(f"❌ ERROR generating day {day_num + 1}: {str(day_error)}")
-                print(f"   Error type: {type(day_error).__name__}")
-                import traceback
-                traceback.print_exc()
-                raise
+                        report_day(day_num + 1, 'running')
+                        generate_single_day_for_weekly_plan(
+                            weekly_plan_id=weekly_plan_id,
+                            day_number=day_num + 1,
+                            day_date=day_date,
+                            user_id=user_id,
+                            daily_targets=daily_targets,
+                            preferences=preferences,
+                            fast=fast
+                        )
+                        report_day(day_num + 1, 'completed')
+                        logger.info(f"✅ Day {day_num + 1} completed successfully!")
+
+                    except Exception as day_error:
+                        report_day(day_num + 1, 'failed')
+                        logger.error(f"❌ ERROR generating day {day_num + 1} ({type(day_error).__name__}): {str(day_error)}", exc_info=True)
+                        raise
         
-        # 4. Mark as active
+        # 4. Mark as active, unless the job was abandoned and the plan already marked failed
+        check_cancelled()
         supabase.table('weekly_plans').update({
             'status': 'active'
-        }).eq('id', weekly_plan_id).execute()
+        }).eq('id', weekly_plan_id).eq('status', 'generating').execute()
+        weekly_plan_cache.invalidate(weekly_plan_id)
         
-        print(f"✅ Weekly plan {weekly_plan_id} completed successfully!")
+        logger.info(f"✅ Weekly plan {weekly_plan_id} completed successfully!")
         
         return weekly_plan_id
         
     except Exception as e:
-        print(f"❌ Error generating weekly plan: {e}")
+        logger.error(f"❌ Error generating weekly plan: {e}")
         
         # Mark as failed
         supabase.table('weekly_plans').update({
             'status': 'failed'
         }).eq('id', weekly_plan_id).execute()
+        weekly_plan_cache.invalidate(weekly_plan_id)
         
         raise e
 
 
+def _day_progress_reporter(on_progress):
+    """Wrap an on_progress callback as report_day(day_number, status); progress errors never fail a day"""
+    def report_day(day_number: int, status: str):
+        if not on_progress:
+            return
+        try:
+            on_progress(days={str(day_number): status})
+        except Exception as progress_error:
+            logger.warning(f"⚠️ Could not record progress for day {day_number}: {str(progress_error)}")
+    return report_day
+
+
+async def generate_days_concurrently(
+    weekly_plan_id: int,
+    week_start,
+    user_id: str,
+    daily_targets: dict,
+    preferences: dict,
+    max_concurrency: int,
+    report_day=None,
+    fast: bool = False
+):
+    """
+    Generate all 7 days of a weekly plan concurrently, at most max_concurrency
+    at a time. Each day is assigned its own partition of the recipe catalog
+    (see database_tools.recipe_partition) so the days stay varied without
+    having to wait for each other's results.
+    """
+    from datetime import timedelta
+
+    report_day = report_day or _day_progress_reporter(None)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_day(day_num: int):
+        async with semaphore:
+            check_cancelled()
+            day_date = week_start + timedelta(days=day_num)
+            logger.info(f"🗓️ Generating Day {day_num + 1} of 7 ({day_date.strftime('%A, %B %d')})")
+            partition_token = recipe_partition.set((day_num, 7))
+            report_day(day_num + 1, 'running')
+            try:
+                await generate_single_day_for_weekly_plan_async(
+                    weekly_plan_id=weekly_plan_id,
+                    day_number=day_num + 1,
+                    day_date=day_date,
+                    user_id=user_id,
+                    daily_targets=daily_targets,
+                    preferences=preferences,
+                    fast=fast
+                )
+                report_day(day_num + 1, 'completed')
+                logger.info(f"✅ Day {day_num + 1} completed successfully!")
+            except Exception as day_error:
+                report_day(day_num + 1, 'failed')
+                logger.error(f"❌ ERROR generating day {day_num + 1}: {str(day_error)}")
+                raise
+            finally:
+                recipe_partition.reset(partition_token)
+
+    tasks = [asyncio.create_task(run_day(day_num)) for day_num in range(7)]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        # One failed day fails the whole week, so stop the others early
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
 def generate_single_day_for_weekly_plan(
     weekly_plan_id: int,
     day_number: int,
     day_date,
     user_id: str,
     daily_targets: dict,
-    preferences: dict
+    preferences: dict,
+    fast: bool = False
 ):
     """
     Generate meals for a single day within a weekly plan.
-    Uses the SAME agent but with different prompt context.
+    Synchronous wrapper around generate_single_day_for_weekly_plan_async.
+    """
+    return gemini_clients.run(generate_single_day_for_weekly_plan_async(
+        weekly_plan_id=weekly_plan_id,
+        day_number=day_number,
+        day_date=day_date,
+        user_id=user_id,
+        daily_targets=daily_targets,
+        preferences=preferences,
+        fast=fast
+    ))
+
+
+async def generate_single_day_for_weekly_plan_async(
+    weekly_plan_id: int,
+    day_number: int,
+    day_date,
+    user_id: str,
+    daily_targets: dict,
+    preferences: dict,
+    fast: bool = False
+):
+    """
+    Generate meals for a single day within a weekly plan.
+    Uses the SAME agent but with different prompt context, or the meal
+    solver alone when fast is True.
     """
 
-    print(f"🔧 generate_single_day_for_weekly_plan called")
-    print(f"   Received preferences type: {type(preferences)}")
-    print(f"   Received preferences value: {preferences}")
+    logger.debug("🔧 generate_single_day_for_weekly_plan called with preferences %s", preview(preferences))
 
     # 1. Create daily plan
     try:
-        print(f"   Creating daily plan in database...")
-        daily_plan = supabase.table('daily_plans').insert({
-            'weekly_plan_id': weekly_plan_id,
-            'date': str(day_date),
-            'day_of_week': day_number,
-            'daily_target_calories': daily_targets['calories'],
-            'daily_target_protein': daily_targets['protein'],
-            'daily_target_carbs': daily_targets['carbs'],
-            'daily_target_fat': daily_targets['fat'],
-        }).execute()
+        logger.debug("   Creating daily plan in database...")
+        daily_plan = await asyncio.to_thread(
+            supabase.table('daily_plans').insert({
+                'weekly_plan_id': weekly_plan_id,
+                'date': str(day_date),
+                'day_of_week': day_number,
+                'daily_target_calories': daily_targets['calories'],
+                'daily_target_protein': daily_targets['protein'],
+                'daily_target_carbs': daily_targets['carbs'],
+                'daily_target_fat': daily_targets['fat'],
+            }).execute
+        )
 
         daily_plan_id = daily_plan.data[0]['id']
-        print(f"   ✅ Daily plan created with ID: {daily_plan_id}")
+        weekly_plan_cache.invalidate(weekly_plan_id)
+        logger.info(f"   ✅ Daily plan created with ID: {daily_plan_id}")
     except Exception as dp_error:
-        print(f"   ❌ ERROR creating daily plan: {str(dp_error)}")
+        logger.error(f"   ❌ ERROR creating daily plan: {str(dp_error)}")
         raise
 
     # 2. Create prompt for THIS day (includes weekly_plan_id for context)
     try:
-        print(f"   Building prompt with preferences...")
-        print(f"   Extracting diet preference...")
-
         # Defensive checks
         if preferences is None:
-            print(f"   ⚠️ WARNING: preferences is None!")
+            logger.warning(f"   ⚠️ WARNING: preferences is None!")
             diet = 'balanced'
             foods_to_avoid = []
             additional = ''
         elif not isinstance(preferences, dict):
-            print(f"   ⚠️ WARNING: preferences is not a dict, it's {type(preferences)}")
+            logger.warning(f"   ⚠️ WARNING: preferences is not a dict, it's {type(preferences)}")
             diet = 'balanced'
             foods_to_avoid = []
             additional = ''
@@ -504,17 +920,40 @@ def generate_single_day_for_weekly_plan(
             foods_to_avoid = preferences.get('foodsToAvoid', [])
             additional = preferences.get('additional_considerations', '')
 
-        print(f"   Diet: {diet}")
-        print(f"   Foods to avoid: {foods_to_avoid}")
-        print(f"   Additional: {additional[:50] if additional else 'None'}...")
+        logger.debug("   Diet: %s, foods to avoid: %s, additional: %s", diet, preview(foods_to_avoid), preview(additional, 50))
+
+        if recipe_partition.get() is not None:
+            # The other days are being planned at the same time, so there's nothing
+            # to look up yet: recipe searches only return this day's share of the catalog
+            week_variety = (
+                "- The other days of this week are being planned at the same time, so do NOT call "
+                "get_previous_recipes_in_week: it can't see their recipes yet\n"
+                "- Recipe searches only return recipes reserved for this day, so picking from them "
+                "already keeps the week varied"
+            )
+            week_task = (
+                "1. Calculate meal targets (20% breakfast, 32.5% lunch, 32.5% dinner, 15% snacks)\n"
+                "2. Search for recipes (the results are already reserved for this day)\n"
+                "3. Return the meal_plan JSON with recipe_id included"
+            )
+        else:
+            week_variety = (
+                f"- **CRITICAL:** Call get_previous_recipes_in_week({weekly_plan_id}) FIRST to see what recipes I've already had\n"
+                "- Avoid repeating any recipes from previous days"
+            )
+            week_task = (
+                f"1. **FIRST:** Call get_previous_recipes_in_week({weekly_plan_id}) to check what recipes were used\n"
+                "2. Calculate meal targets (20% breakfast, 32.5% lunch, 32.5% dinner, 15% snacks)\n"
+                "3. Search for recipes that are DIFFERENT from previous days\n"
+                "4. Return the meal_plan JSON with recipe_id included"
+            )
 
         prompt = f"""
 Hi NutriWise AI, I need a meal plan for Day {day_number} of my 7-day weekly plan.
 
 **CONTEXT:**
 - This is day {day_number}/7 of weekly_plan_id: {weekly_plan_id}
-- **CRITICAL:** Call get_previous_recipes_in_week({weekly_plan_id}) FIRST to see what recipes I've already had
-- Avoid repeating any recipes from previous days
+{week_variety}
 
 **My Daily Targets:**
 - Calories: {daily_targets['calories']}
@@ -527,112 +966,73 @@ Hi NutriWise AI, I need a meal plan for Day {day_number} of my 7-day weekly plan
 **Additional Preferences:** {additional}
 
 **YOUR TASK:**
-1. **FIRST:** Call get_previous_recipes_in_week({weekly_plan_id}) to check what recipes were used
-2. Calculate meal targets (20% breakfast, 32.5% lunch, 32.5% dinner, 15% snacks)
-3. Search for recipes that are DIFFERENT from previous days
-4. Return the meal_plan JSON with recipe_id included
+{week_task}
 
 **IMPORTANT:**
 - Do NOT call save_meal_plan (this is a weekly plan, not a preview)
 - Return ONLY the meal_plan JSON structure
 - Include recipe_id for each meal
 """
-        print(f"   ✅ Prompt built successfully")
+        logger.debug("   ✅ Prompt built successfully")
     except AttributeError as prompt_error:
-        print(f"   ❌ AttributeError building prompt: {str(prompt_error)}")
-        print(f"   preferences type: {type(preferences)}")
-        print(f"   preferences value: {preferences}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"   ❌ AttributeError building prompt: {str(prompt_error)} (preferences: {type(preferences).__name__})", exc_info=True)
         raise
     except Exception as prompt_error:
-        print(f"   ❌ ERROR building prompt: {str(prompt_error)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"   ❌ ERROR building prompt: {str(prompt_error)}", exc_info=True)
         raise
     
-    # 3. Call your EXISTING agent function with weekly prompt
-    print(f"🤖 Calling agent for day {day_number}...")
-    print(f"   Using weekly_day_system_prompt (use_weekly_prompt=True)")
-
-    try:
-        agent_response = generate_meal_plan_with_agent(prompt, use_weekly_prompt=True)
-
-        # Check if we got an empty response
-        if agent_response == "Agent returned an empty response.":
-            print(f"⚠️ Agent returned empty response, retrying with simplified prompt...")
-
-            # Retry with simpler prompt
-            simplified_prompt = f"""
-Create a meal plan for Day {day_number}.
-
-Daily Targets: {daily_targets['calories']} calories, {daily_targets['protein']}g protein, {daily_targets['fat']}g fat, {daily_targets['carbs']}g carbs
-Diet: {diet}
-
-Return ONLY the meal_plan JSON with recipe_id for each meal.
-"""
-            agent_response = generate_meal_plan_with_agent(simplified_prompt, use_weekly_prompt=True)
-
-            if agent_response == "Agent returned an empty response.":
-                raise ValueError(f"Agent failed to generate meal plan for day {day_number} after retry")
-
-    except Exception as agent_error:
-        print(f"❌ Agent error for day {day_number}: {str(agent_error)}")
-        raise
-
-    # 4. Parse response and insert meals
-    print(f"   Parsing agent response...")
-    try:
-        meal_plan_json = extract_meal_plan_from_response(agent_response)
-        print(f"   ✅ Meal plan JSON extracted successfully")
-    except ValueError as parse_error:
-        print(f"   ❌ Failed to parse agent response: {str(parse_error)}")
-        print(f"   Response preview: {agent_response[:300]}...")
-        raise
-
-    print(f"   Inserting meals into database...")
-    insert_meals_from_json(daily_plan_id, meal_plan_json)
-
-    print(f"✅ Day {day_number} completed with {len(meal_plan_json.get('meal_plan', {}))} meals")
+    if fast and not supports_diet(diet):
+        logger.info(f"⚡ The meal solver can't honour the '{diet}' diet, day {day_number} goes to the agent")
+        fast = False
+    if fast:
+        # 3. Fast mode: the solver picks recipes and servings, no agent round-trips
+        logger.info(f"⚡ Solving day {day_number} with the meal solver...")
+        with PLAN_STAGE_SECONDS.labels("day_solver").time():
+            meal_plan_json = await asyncio.to_thread(
+                solve_day_for_weekly_plan, weekly_plan_id, daily_targets, diet, foods_to_avoid
+            )
+    else:
+        # 3. Call your EXISTING agent function with weekly prompt
+        logger.info(f"🤖 Calling agent for day {day_number}...")
 
+        try:
+            # The final turn is JSON mode with the DayMealPlanResponse schema, so
+            # the plan comes back validated; no text to fish the JSON out of
+            with PLAN_STAGE_SECONDS.labels("day_agent").time():
+                day_plan = await generate_meal_plan_with_agent_async(
+                    prompt, use_weekly_prompt=True, response_model=DayMealPlanResponse
+                )
+            meal_plan_json = day_plan.model_dump(by_alias=True, exclude_none=True)
+            logger.info(f"   ✅ Structured meal plan received")
+        except Exception as agent_error:
+            logger.error(f"❌ Agent error for day {day_number}: {str(agent_error)}")
+            raise
 
-def extract_meal_plan_from_response(agent_response: str) -> dict:
-    """
-    Extract JSON meal plan from agent's response.
-    Agent might return text + JSON, so we need to parse it.
-    """
-    import re
+    logger.info(f"   Inserting meals into database...")
+    with PLAN_STAGE_SECONDS.labels("insert_meals").time():
+        await asyncio.to_thread(insert_meals_from_json, daily_plan_id, meal_plan_json)
+    weekly_plan_cache.invalidate(weekly_plan_id)
 
-    print(f"📋 Extracting meal plan from response...")
-    print(f"   Response length: {len(agent_response)} characters")
-    print(f"   Response preview: {agent_response[:200]}...")
+    logger.info(f"✅ Day {day_number} completed with {len(meal_plan_json.get('meal_plan', {}))} meals")
 
-    # Try to find JSON in code blocks (use greedy matching to capture full JSON)
-    json_match = re.search(r'```json\s*(\{.*\})\s*```', agent_response, re.DOTALL)
-    if json_match:
-        print(f"   ✅ Found JSON in code block")
-        json_str = json_match.group(1)
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"   ❌ JSON decode error: {str(e)}")
-            print(f"   Problematic JSON preview: {json_str[:300]}...")
-            raise ValueError(f"Invalid JSON in code block: {str(e)}")
-
-    # Try to find raw JSON (greedy match for nested structures)
-    json_match = re.search(r'\{[^{}]*"meal_plan"[^{}]*\{.*\}\s*\}', agent_response, re.DOTALL)
-    if json_match:
-        print(f"   ✅ Found raw JSON")
-        json_str = json_match.group(0)
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            print(f"   ❌ JSON decode error: {str(e)}")
-            raise ValueError(f"Invalid raw JSON: {str(e)}")
 
-    # If we can't find JSON, raise error with more context
-    print(f"   ❌ No valid JSON found in response")
-    raise ValueError(f"Could not extract meal plan JSON from agent response: {agent_response[:500]}")
+def solve_day_for_weekly_plan(weekly_plan_id: int, daily_targets: dict, diet: str, foods_to_avoid: list) -> dict:
+    """Build one day's meal_plan JSON with the meal solver, avoiding recipes used earlier in the week"""
+    if recipe_partition.get() is not None:
+        # Concurrent days: the sibling days aren't saved yet, the partition keeps them apart
+        previous = {"success": True, "recipes_used": []}
+    else:
+        previous = json.loads(get_previous_recipes_in_week(weekly_plan_id))
+    if not previous.get("success"):
+        logger.warning(f"   ⚠️ Could not read previous recipes, repeats are possible: {previous.get('error')}")
+    result = plan_meals(
+        daily_targets,
+        diet=diet,
+        foods_to_avoid=foods_to_avoid,
+        exclude_recipe_names=previous.get("recipes_used", []),
+    )
+    logger.info(f"   ✅ Solver fit (% off target): {result['fit']['percent_off_target']}")
+    return result
 
 
 def insert_meals_from_json(daily_plan_id: int, meal_plan_json: dict):
@@ -665,27 +1065,27 @@ def insert_meals_from_json(daily_plan_id: int, meal_plan_json: dict):
         # This prevents the 'NoneType' object has no attribute 'get' error
         # ===================================================
         if not isinstance(meal_data, dict):
-            print(f"❌ Skipping {meal_name}: Expected dictionary for meal data, but received {type(meal_data)}. LLM likely returned 'null' or a string.")
+            logger.error(f"❌ Skipping {meal_name}: Expected dictionary for meal data, but received {type(meal_data)}. LLM likely returned 'null' or a string.")
             continue
         # ===================================================
         
         meal_type = meal_type_map.get(meal_name)
         if not meal_type:
-            print(f"⚠️ Unknown meal type: {meal_name}, skipping")
+            logger.warning(f"⚠️ Unknown meal type: {meal_name}, skipping")
             continue
         
         # Extract data from agent response
         # This line (which was line 666) is now safe
         recipe_id = meal_data.get('recipe_id')
         if not recipe_id:
-            print(f"❌ Missing recipe_id for {meal_name}, skipping")
+            logger.error(f"❌ Missing recipe_id for {meal_name}, skipping")
             continue
         
         # Ensure robust type conversion for servings and nutrition
         try:
             servings = float(meal_data.get('servings', 1.0))
         except (TypeError, ValueError):
-            print(f"⚠️ Invalid servings value for {meal_name}: {meal_data.get('servings')}. Defaulting to 1.0.")
+            logger.warning(f"⚠️ Invalid servings value for {meal_name}: {meal_data.get('servings')}. Defaulting to 1.0.")
             servings = 1.0
             
         total_nutrition = meal_data.get('total_nutrition', {})
@@ -710,7 +1110,7 @@ def insert_meals_from_json(daily_plan_id: int, meal_plan_json: dict):
     # Bulk insert all meals
     if meals_to_insert:
         supabase.table('meals').insert(meals_to_insert).execute()
-        print(f"✅ Inserted {len(meals_to_insert)} meals")
+        logger.info(f"✅ Inserted {len(meals_to_insert)} meals")
     else:
         # If the LLM failed to generate any valid meals, we should raise an error
         # to prevent the daily plan from being marked as complete but empty.
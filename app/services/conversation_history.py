@@ -0,0 +1,202 @@
+import os
+import re
+import json
+from google.genai import types
+from dotenv import load_dotenv
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Rough size limit for the conversation sent on each agent turn (system prompt and tools not included)
+AGENT_HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", "16000"))
+# Model turns after a tool result before it counts as consumed
+CONSUMED_AFTER_TURNS = 2
+# Recipes kept from a search result when the model never mentioned any of them
+RECIPES_KEPT_PER_SEARCH = 3
+# Characters per token used to estimate history size
+CHARS_PER_TOKEN = 4
+# Tool results that list recipes; the ones the model did not use are dropped once consumed
+RECIPE_SEARCH_TOOLS = {"fuzzy_search_rows", "search_recipes"}
+
+
+def _part_text(part: types.Part) -> str:
+    if part.text:
+        return part.text
+    # ensure_ascii=False keeps accented recipe names as typed, so they can be matched in this text
+    if part.function_call:
+        return json.dumps(part.function_call.args or {}, default=str, ensure_ascii=False)
+    if part.function_response:
+        return json.dumps(part.function_response.response or {}, default=str, ensure_ascii=False)
+    return ""
+
+
+def _content_size(content: types.Content) -> int:
+    return sum(len(_part_text(part)) for part in content.parts or [])
+
+
+def _is_referenced(recipe, later_text: str) -> bool:
+    """Whether the model mentioned a recipe (by name, or by id as recipe_id) after seeing it"""
+    name = recipe.get("name")
+    if name and str(name).lower() in later_text:
+        return True
+    recipe_id = recipe.get("id")
+    return recipe_id is not None and re.search(rf'"?recipe_id"?\s*[:=]\s*{re.escape(str(recipe_id))}\b', later_text) is not None
+
+
+def _compact_results(results, later_text: str):
+    """Keep only referenced recipes (or the first few); returns (results, omitted count)"""
+    if isinstance(results, dict) and "rows" in results:
+        # Table encoding: {"columns": [...], "rows": [[...], ...]}
+        columns = results.get("columns", [])
+        rows = results.get("rows", [])
+        recipes = [dict(zip(columns, row)) for row in rows]
+        kept = [row for row, recipe in zip(rows, recipes) if _is_referenced(recipe, later_text)]
+        kept = kept or rows[:RECIPES_KEPT_PER_SEARCH]
+        return {"columns": columns, "rows": kept}, len(rows) - len(kept)
+    if isinstance(results, list):
+        kept = [recipe for recipe in results if isinstance(recipe, dict) and _is_referenced(recipe, later_text)]
+        kept = kept or results[:RECIPES_KEPT_PER_SEARCH]
+        return kept, len(results) - len(kept)
+    return results, 0
+
+
+def _compact_search_result(result, later_text: str):
+    """Compacted copy of a recipe search tool result, or None if there is nothing to drop"""
+    as_string = isinstance(result, str)
+    try:
+        data = json.loads(result) if as_string else result
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if not isinstance(data, (dict, list)):
+        return None
+
+    omitted = 0
+    if isinstance(data, list):
+        data, omitted = _compact_results(data, later_text)
+    else:
+        data = dict(data)
+        if "results" in data:
+            data["results"], omitted = _compact_results(data["results"], later_text)
+        if "results_by_query" in data:
+            compacted = []
+            for item in data["results_by_query"]:
+                item = dict(item)
+                item["results"], item_omitted = _compact_results(item.get("results"), later_text)
+                omitted += item_omitted
+                compacted.append(item)
+            data["results_by_query"] = compacted
+        if omitted:
+            data["omitted"] = f"{omitted} unused match(es) removed after they were reviewed"
+
+    if not omitted:
+        return None
+    return json.dumps(data) if as_string else data
+
+
+class ConversationHistory:
+    """
+    Message list for one agent session that keeps its size in check.
+
+    compact() runs before every model turn. Tool results the model has
+    consumed (CONSUMED_AFTER_TURNS model turns follow them) are reduced:
+
+    - recipe search results keep only the recipes the model mentioned later
+      (or the first few, if it mentioned none);
+    - if the history is still over the token budget, the oldest consumed tool
+      results are replaced by a short stub.
+
+    Every function_response part stays in place, under the same name, right
+    after the model turn that called it, so call/response pairing is intact.
+    The initial prompt and model turns are never changed.
+    """
+
+    def __init__(self, prompt: str, token_budget: int = AGENT_HISTORY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.messages = []
+        self._sizes = []  # characters per message, kept in step with messages
+        self._compacted = set()  # message indices whose search results were reduced
+        self._stubbed = set()  # message indices replaced by a stub
+        self.append(types.Content(role="user", parts=[types.Part(text=prompt)]))
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, content: types.Content):
+        self.messages.append(content)
+        self._sizes.append(_content_size(content))
+
+    def extend(self, contents: list):
+        for content in contents:
+            self.append(content)
+
+    def estimated_tokens(self) -> int:
+        return sum(self._sizes) // CHARS_PER_TOKEN
+
+    def _is_tool_message(self, idx: int) -> bool:
+        parts = self.messages[idx].parts or []
+        return bool(parts) and all(part.function_response for part in parts)
+
+    def _replace_responses(self, idx: int, make_response):
+        """Rebuild a tool message with new response payloads, keeping names and order"""
+        content = self.messages[idx]
+        parts = []
+        for part in content.parts:
+            response = part.function_response
+            parts.append(types.Part(function_response=types.FunctionResponse(
+                id=response.id,
+                name=response.name,
+                response=make_response(response),
+            )))
+        self.messages[idx] = types.Content(role=content.role, parts=parts)
+        self._sizes[idx] = _content_size(self.messages[idx])
+
+    def compact(self):
+        """Reduce consumed tool results; call before sending the history to the model"""
+        before = self.estimated_tokens()
+
+        model_turns = [idx for idx, content in enumerate(self.messages) if content.role == "model"]
+
+        def later_model_text(idx: int) -> str:
+            return " ".join(
+                " ".join(_part_text(part) for part in self.messages[turn].parts or [])
+                for turn in model_turns if turn > idx
+            ).lower()
+
+        consumed = [
+            idx for idx in range(len(self.messages))
+            if self._is_tool_message(idx)
+            and sum(1 for turn in model_turns if turn > idx) >= CONSUMED_AFTER_TURNS
+        ]
+
+        for idx in consumed:
+            if idx in self._compacted:
+                continue
+            self._compacted.add(idx)
+            later_text = later_model_text(idx)
+
+            def compact_search(response):
+                payload = dict(response.response or {})
+                if response.name in RECIPE_SEARCH_TOOLS and "result" in payload:
+                    compacted = _compact_search_result(payload["result"], later_text)
+                    if compacted is not None:
+                        payload["result"] = compacted
+                return payload
+
+            self._replace_responses(idx, compact_search)
+
+        # Over budget: stub out the oldest consumed results first
+        for idx in consumed:
+            if self.estimated_tokens() <= self.token_budget:
+                break
+            if idx in self._stubbed:
+                continue
+            self._stubbed.add(idx)
+            self._replace_responses(idx, lambda response: {
+                "result": f"[{response.name} result omitted from history: already used in an earlier step]"
+            })
+
+        after = self.estimated_tokens()
+        if after < before:
+            logger.info(f"🗜️ Compacted history: ~{before} -> ~{after} tokens")
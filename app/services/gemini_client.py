@@ -0,0 +1,143 @@
+import os
+import asyncio
+import threading
+import httpx
+from fastapi import HTTPException
+from google import genai
+from google.genai import types
+from dotenv import load_dotenv
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Point the client at another endpoint, e.g. a local fake LLM server for load tests
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+# Connections kept open to the Gemini API, per event loop
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "20"))
+GEMINI_KEEPALIVE_SECONDS = float(os.getenv("GEMINI_KEEPALIVE_SECONDS", "60"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
+# "auto" uses HTTP/2 when the h2 package is installed
+GEMINI_HTTP2 = os.getenv("GEMINI_HTTP2", "auto").lower()
+
+
+def _http2_enabled() -> bool:
+    if GEMINI_HTTP2 in ("false", "0", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        if GEMINI_HTTP2 != "auto":
+            logger.warning("⚠️ GEMINI_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+
+
+class GeminiClientProvider:
+    """
+    Process-wide source of Gemini clients.
+
+    The API key and settings are read once. Async connections belong to the
+    event loop that opened them, so each loop gets one client with its own
+    keep-alive pool, created on first use and reused by every later session
+    on that loop. The sync side shares one thread-safe pool.
+
+    Sync entry points run their coroutines with run(), which keeps one event
+    loop per thread, so worker threads (weekly days, background jobs) reuse
+    their client and connections instead of opening new ones per call.
+    """
+
+    def __init__(self, base_url: str = GEMINI_BASE_URL, pool_size: int = GEMINI_POOL_SIZE,
+                 keepalive_seconds: float = GEMINI_KEEPALIVE_SECONDS,
+                 timeout_seconds: float = GEMINI_TIMEOUT_SECONDS):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout_seconds = timeout_seconds
+        self.http2 = _http2_enabled()
+        self._api_key = os.environ.get("GEMINI_API_KEY")
+        self._lock = threading.Lock()
+        self._sync_http = None
+        self._clients = {}  # event loop -> (genai.Client, httpx.AsyncClient)
+        self._local = threading.local()
+        self._thread_loops = set()
+
+    def _http_settings(self) -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_seconds,
+            ),
+            "timeout": httpx.Timeout(self.timeout_seconds),
+            "http2": self.http2,
+        }
+
+    def get(self) -> genai.Client:
+        """Client for the running event loop"""
+        if not self._api_key:
+            raise HTTPException(status_code=500, detail="GEMINI_API_KEY not found")
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                # Forget loops that have gone away (their sockets went with them)
+                for stale in [known for known in self._clients if known.is_closed()]:
+                    del self._clients[stale]
+                if self._sync_http is None:
+                    self._sync_http = httpx.Client(**self._http_settings())
+                async_http = httpx.AsyncClient(**self._http_settings())
+                client = genai.Client(
+                    api_key=self._api_key,
+                    http_options=types.HttpOptions(
+                        base_url=self.base_url,
+                        timeout=int(self.timeout_seconds * 1000),
+                        httpx_client=self._sync_http,
+                        httpx_async_client=async_http,
+                    )
+                )
+                entry = (client, async_http)
+                self._clients[loop] = entry
+        return entry[0]
+
+    def run(self, coro):
+        """
+        Run a coroutine to completion on this thread's event loop. Like
+        asyncio.run(), it must not be called from a running loop.
+        """
+        loop = getattr(self._local, "loop", None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self._local.loop = loop
+            with self._lock:
+                self._thread_loops.add(loop)
+        return loop.run_until_complete(coro)
+
+    async def aclose(self):
+        """Close every connection pool; called on application shutdown"""
+        current = asyncio.get_running_loop()
+        with self._lock:
+            clients = dict(self._clients)
+            thread_loops = list(self._thread_loops)
+            sync_http = self._sync_http
+            self._clients.clear()
+            self._thread_loops.clear()
+            self._sync_http = None
+
+        for loop, (client, async_http) in clients.items():
+            if loop is current:
+                await async_http.aclose()
+            elif not loop.is_closed() and not loop.is_running():
+                # Idle worker-thread loop: close its pool on that loop
+                await asyncio.to_thread(loop.run_until_complete, async_http.aclose())
+        for loop in thread_loops:
+            if not loop.is_closed() and not loop.is_running():
+                loop.close()
+        if sync_http is not None:
+            sync_http.close()
+        logger.info(f"🔌 Closed {len(clients)} Gemini client pool(s)")
+
+
+gemini_clients = GeminiClientProvider()
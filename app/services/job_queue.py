@@ -0,0 +1,391 @@
+import os
+import json
+import uuid
+import sqlite3
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Backend for job state: "sqlite" (shared by all workers on the host) or
+# "memory" (single process only - status polls must hit the same worker)
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+JOB_QUEUE_SQLITE_PATH = os.getenv(
+    "JOB_QUEUE_SQLITE_PATH",
+    os.path.join(tempfile.gettempdir(), "nutriwise_jobs.sqlite3")
+)
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "2"))
+# Workers touch updated_at of their queued/running jobs this often. Jobs not
+# touched for JOB_STALE_SECONDS belong to a worker that died or restarted
+# and are marked failed by whichever worker sweeps next.
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+
+UNFINISHED_STATUSES = ("queued", "running")
+
+
+# Cancellation flag of the job running in the current context (None outside
+# jobs). Set by JobQueue._run; long jobs call check_cancelled() between steps.
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar("job_cancel_event", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by check_cancelled() once the queue has abandoned it"""
+
+
+def check_cancelled():
+    """Raise JobCancelled if the job running this code has been cancelled; no-op outside jobs"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise JobCancelled("The job was cancelled")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ago(seconds: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+def _merge(target: dict, updates: dict) -> dict:
+    """Recursively merge updates into target (nested dicts are merged, not replaced)"""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+class InMemoryJobStore:
+    """Keeps job records in a dict. Only visible to the current process."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_type: str, user_id: str) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "job_type": job_type,
+                "user_id": user_id,
+                "status": "queued",
+                "progress": {},
+                "result": None,
+                "error": None,
+                "created_at": _now(),
+                "updated_at": _now(),
+            }
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=_now())
+
+    def update_progress(self, job_id: str, progress: dict):
+        with self._lock:
+            job = self._jobs[job_id]
+            _merge(job["progress"], progress)
+            job["updated_at"] = _now()
+
+    def touch(self, job_ids):
+        now = _now()
+        with self._lock:
+            for job_id in job_ids:
+                if job_id in self._jobs:
+                    self._jobs[job_id]["updated_at"] = now
+
+    def fail_unfinished(self, error: str, job_ids=None, updated_before: str = None) -> list:
+        """Mark queued/running jobs failed (all, those in job_ids, or those not updated since updated_before)"""
+        now = _now()
+        failed = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] not in UNFINISHED_STATUSES:
+                    continue
+                if job_ids is not None and job["id"] not in job_ids:
+                    continue
+                if updated_before is not None and job["updated_at"] >= updated_before:
+                    continue
+                job.update(status="failed", error=error, updated_at=now)
+                failed.append(json.loads(json.dumps(job)))
+        return failed
+
+
+class SQLiteJobStore:
+    """Keeps job records in a SQLite file so every worker on the host sees them."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation; commits on success
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, job_type: str, user_id: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, job_type, user_id, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, job_type, user_id, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def update_progress(self, job_id: str, progress: dict):
+        # Read-modify-write; progress for a job only comes from the worker running it
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            merged = _merge(json.loads(row[0]), progress)
+            conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(merged), _now(), job_id)
+            )
+
+    def touch(self, job_ids):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE id IN ({', '.join('?' * len(job_ids))})",
+                (_now(), *job_ids)
+            )
+
+    def fail_unfinished(self, error: str, job_ids=None, updated_before: str = None) -> list:
+        """Mark queued/running jobs failed (all, those in job_ids, or those not updated since updated_before)"""
+        conditions = [f"status IN ({', '.join('?' * len(UNFINISHED_STATUSES))})"]
+        params = [*UNFINISHED_STATUSES]
+        if job_ids is not None:
+            job_ids = list(job_ids)
+            if not job_ids:
+                return []
+            conditions.append(f"id IN ({', '.join('?' * len(job_ids))})")
+            params.extend(job_ids)
+        if updated_before is not None:
+            conditions.append("updated_at < ?")
+            params.append(updated_before)
+        # UPDATE ... RETURNING is atomic, so two workers sweeping at once never both claim a job
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE {' AND '.join(conditions)} RETURNING *",
+                (error, _now(), *params)
+            ).fetchall()
+        failed = []
+        for row in rows:
+            job = dict(row)
+            job["progress"] = json.loads(job["progress"])
+            job["result"] = json.loads(job["result"]) if job["result"] else None
+            failed.append(job)
+        return failed
+
+
+class JobQueue:
+    """
+    Runs long jobs (e.g. weekly plan generation) on a worker pool and records
+    their status and progress in a job store.
+
+    Jobs live in this process's memory, so a restart loses them. start()
+    keeps the store consistent anyway: it fails jobs orphaned by a dead
+    worker (no heartbeat for JOB_STALE_SECONDS) and heartbeats this
+    worker's own jobs. shutdown() fails and cancels the jobs it abandons.
+    Either way the job type's on_abandoned callbacks run, to clean up
+    whatever the job left half-done.
+
+    Cancellation is cooperative: a running job stops at its next
+    check_cancelled() call (e.g. between days or agent turns).
+    """
+
+    def __init__(self, store, max_workers: int = 2, heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS,
+                 stale_seconds: float = JOB_STALE_SECONDS):
+        self.store = store
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._active = set()
+        self._abandoned = set()
+        self._cancel_events = {}  # job id -> Event, for queued and running jobs
+        self._lock = threading.Lock()
+        self._on_abandoned = {}
+        self._stopped = threading.Event()
+        self._heartbeat = None
+
+    def on_abandoned(self, job_type: str, callback):
+        """Call callback(job) for each job of this type marked failed because its worker went away"""
+        self._on_abandoned.setdefault(job_type, []).append(callback)
+
+    def submit(self, job_type: str, owner_id: str, fn, **kwargs) -> str:
+        """
+        Queue fn(report_progress=..., **kwargs) and return the new job id.
+        owner_id is the user allowed to read the job's status.
+
+        fn reports progress by calling report_progress(**fields); nested dicts
+        are merged into the job's progress. Its return value becomes the job result.
+        """
+        job_id = self.store.create(job_type, owner_id)
+        with self._lock:
+            self._active.add(job_id)
+            self._cancel_events[job_id] = threading.Event()
+        # The job runs with the submitting request's context (correlation id, debug logging)
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, fn, kwargs)
+        logger.info(f"📨 Queued {job_type} job {job_id} for user {owner_id}")
+        return job_id
+
+    def _run(self, job_id: str, fn, kwargs: dict):
+        with self._lock:
+            _cancel_event.set(self._cancel_events[job_id])
+        self.store.update(job_id, status="running")
+        try:
+            result = fn(
+                report_progress=lambda **progress: self.store.update_progress(job_id, progress),
+                **kwargs
+            )
+            if self._is_abandoned(job_id):
+                logger.warning(f"⚠️ Job {job_id} completed after it was marked failed at shutdown; result dropped")
+                return
+            self.store.update(job_id, status="completed", result=result)
+            logger.info(f"✅ Job {job_id} completed")
+        except JobCancelled:
+            logger.info(f"🛑 Job {job_id} stopped: it was cancelled at shutdown")
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} failed: {str(e)}", exc_info=True)
+            if self._is_abandoned(job_id):
+                return
+            detail = getattr(e, "detail", None) or str(e)
+            self.store.update(job_id, status="failed", error=str(detail))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+                self._cancel_events.pop(job_id, None)
+
+    def _is_abandoned(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._abandoned
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def start(self):
+        """Fail jobs orphaned by dead workers, then heartbeat this worker's jobs and keep sweeping"""
+        self.recover_stale()
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            try:
+                with self._lock:
+                    active = list(self._active)
+                self.store.touch(active)
+                self.recover_stale()
+            except Exception as e:
+                logger.error(f"❌ Job heartbeat failed: {str(e)}", exc_info=True)
+
+    def recover_stale(self) -> list:
+        """Mark failed the queued/running jobs nobody has touched for stale_seconds"""
+        failed = self.store.fail_unfinished(
+            "The worker running this job stopped before it finished",
+            updated_before=_ago(self.stale_seconds)
+        )
+        if failed:
+            logger.warning(f"⚠️ Marked {len(failed)} orphaned job(s) failed: {', '.join(job['id'] for job in failed)}")
+        self._abandon(failed)
+        return failed
+
+    def _abandon(self, jobs: list):
+        for job in jobs:
+            for callback in self._on_abandoned.get(job["job_type"], []):
+                try:
+                    callback(job)
+                except Exception as e:
+                    logger.error(f"❌ Cleanup of abandoned job {job['id']} failed: {str(e)}", exc_info=True)
+
+    def shutdown(self):
+        """
+        Cancel every job of this worker and mark it failed (a restart can't
+        resume it), then return without waiting. Queued jobs never start;
+        running ones stop at their next check_cancelled(), so process exit,
+        which joins the worker threads, waits at most for the step each job
+        is in (one model turn, or one solver day).
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            interrupted = set(self._active)
+            self._abandoned.update(interrupted)
+            for event in self._cancel_events.values():
+                event.set()
+        failed = self.store.fail_unfinished("The server shut down before this job finished", job_ids=interrupted)
+        if failed:
+            logger.warning(f"⚠️ Shutdown cancelled {len(failed)} job(s): {', '.join(job['id'] for job in failed)}")
+        self._abandon(failed)
+
+
+def _create_store():
+    if JOB_QUEUE_BACKEND == "memory":
+        return InMemoryJobStore()
+    if JOB_QUEUE_BACKEND == "sqlite":
+        return SQLiteJobStore(JOB_QUEUE_SQLITE_PATH)
+    raise ValueError(f"Unknown JOB_QUEUE_BACKEND '{JOB_QUEUE_BACKEND}'. Use 'sqlite' or 'memory'.")
+
+
+job_queue = JobQueue(_create_store(), max_workers=JOB_QUEUE_WORKERS)
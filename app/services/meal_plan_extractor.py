@@ -0,0 +1,92 @@
+import re
+import json
+
+# The only characters that change the scanner's state; everything else is skipped in bulk
+_STRUCTURAL = re.compile(r'[{}"\\]')
+
+
+class MealPlanExtractor:
+    """
+    Finds the first complete JSON object with a top-level "meal_plan" key in
+    free-form agent text, in one linear pass.
+
+    Text can be fed whole or chunk by chunk as a stream arrives: feed() tracks
+    brace depth outside of JSON strings (escapes included) and returns the
+    parsed object as soon as its closing brace has been fed, so the caller can
+    stop reading the rest of the response. Objects without "meal_plan" (or
+    that aren't valid JSON) are skipped and scanning goes on after them.
+    """
+
+    def __init__(self):
+        self.result = None
+        self._parts = []  # text of the object being scanned
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False  # the previous character was a backslash inside a string
+        self.skipped = 0  # complete objects that weren't a meal plan
+
+    def feed(self, chunk: str):
+        """Scan the next piece of text; returns the meal plan object once complete, else None"""
+        if self.result is not None or not chunk:
+            return self.result
+
+        start = 0 if self._depth else None  # where the current object begins in this chunk
+        skip_at = 0 if self._escaped else -1
+        self._escaped = False
+
+        for match in _STRUCTURAL.finditer(chunk):
+            i = match.start()
+            if i == skip_at:
+                continue
+            char = match.group()
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._parts = []
+                    start = i
+                continue
+
+            if self._in_string:
+                if char == "\\":
+                    skip_at = i + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    text = "".join(self._parts)
+                    self._parts = []
+                    start = None
+                    plan = self._parse(text)
+                    if plan is not None:
+                        self.result = plan
+                        return plan
+
+        if self._depth:
+            self._parts.append(chunk[start:])
+            self._escaped = skip_at == len(chunk)
+        return None
+
+    def _parse(self, text: str):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and "meal_plan" in data:
+            return data
+        self.skipped += 1
+        return None
+
+
+def extract_meal_plan(text: str):
+    """First {"meal_plan": ...} object in text, or None"""
+    return MealPlanExtractor().feed(text)
+
@@ -0,0 +1,181 @@
+import os
+import time
+from urllib.parse import urlsplit
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set to "false" to turn off GET /metrics (the metrics are still recorded)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Under gunicorn, point this at an empty directory shared by the workers so
+# /metrics reports counters and histograms for all of them, not just the one answering
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LLM_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+AGENT_ITERATIONS = Histogram(
+    "nutriwise_agent_iterations", "Model turns per agent session",
+    ["prompt"], buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 40),
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "nutriwise_llm_request_seconds", "Latency of one Gemini model turn",
+    ["prompt", "mode"], buckets=LLM_LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "nutriwise_llm_tokens", "Tokens reported in Gemini usage metadata",
+    ["prompt", "kind"],
+)
+TOOL_CALL_SECONDS = Histogram(
+    "nutriwise_tool_call_seconds", "Latency of one agent tool call (cache hits included)",
+    ["tool"], buckets=LATENCY_BUCKETS,
+)
+TOOL_ERRORS = Counter(
+    "nutriwise_tool_errors", "Agent tool calls that raised or returned success: false",
+    ["tool"],
+)
+SUPABASE_REQUEST_SECONDS = Histogram(
+    "nutriwise_supabase_request_seconds", "Supabase HTTP latency until the response headers arrive",
+    ["table", "method", "status"], buckets=LATENCY_BUCKETS,
+)
+PLAN_STAGE_SECONDS = Histogram(
+    "nutriwise_plan_stage_seconds", "Time spent in each stage of plan generation",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    "nutriwise_log_records_dropped", "Log records dropped because the log queue was full",
+)
+
+# usage_metadata field -> kind label
+USAGE_FIELDS = {
+    "prompt_token_count": "input",
+    "candidates_token_count": "output",
+    "cached_content_token_count": "cached",
+    "thoughts_token_count": "thoughts",
+}
+
+
+def record_llm_turn(prompt: str, mode: str, started: float, usage_metadata=None):
+    """Latency (since time.perf_counter() value `started`) and token usage of one model turn"""
+    LLM_REQUEST_SECONDS.labels(prompt, mode).observe(time.perf_counter() - started)
+    if usage_metadata is None:
+        return
+    for field, kind in USAGE_FIELDS.items():
+        count = getattr(usage_metadata, field, None)
+        if count:
+            LLM_TOKENS.labels(prompt, kind).inc(count)
+
+
+def _table(url) -> str:
+    """Table (or rpc/<function>, or the auth API) a Supabase request is for"""
+    path = urlsplit(str(url)).path
+    if "/rest/v1/" in path:
+        name = path.split("/rest/v1/", 1)[1].strip("/")
+        return name if name.startswith("rpc/") else name.split("/", 1)[0]
+    if "/auth/v1/" in path:
+        return "auth"
+    return "other"
+
+
+def _on_request(request):
+    request.extensions["metrics_started"] = time.perf_counter()
+
+
+def _on_response(response):
+    started = response.request.extensions.get("metrics_started")
+    if started is None:
+        return
+    SUPABASE_REQUEST_SECONDS.labels(
+        _table(response.request.url), response.request.method, str(response.status_code)
+    ).observe(time.perf_counter() - started)
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def supabase_event_hooks(is_async: bool = False) -> dict:
+    """httpx event_hooks that time Supabase requests per table"""
+    if is_async:
+        return {"request": [_on_request_async], "response": [_on_response_async]}
+    return {"request": [_on_request], "response": [_on_response]}
+
+
+def instrument_httpx_client(http_client, is_async: bool = False):
+    """Add the Supabase timing hooks to an existing httpx client"""
+    hooks = supabase_event_hooks(is_async)
+    http_client.event_hooks = {
+        name: list(http_client.event_hooks.get(name, [])) + hooks[name] for name in hooks
+    }
+
+
+class CacheCollector:
+    """
+    Size and age of the in-process caches, read at scrape time (values are
+    for the worker answering the scrape).
+    """
+
+    def describe(self):
+        # Registering would otherwise call collect(), importing the caches while they are being imported
+        return []
+
+    def collect(self):
+        # Imported here: these modules create clients and caches on import, and some import this one
+        from app.services.recipe_cache import recipe_cache
+        from app.services.weekly_plan_cache import weekly_plan_cache
+        from app.tools.tool_cache import tool_cache
+        from app.core.security import token_verifier
+
+        recipes = recipe_cache.stats()
+        yield GaugeMetricFamily(
+            "nutriwise_recipe_cache_rows", "Recipes in the cached catalog snapshot", value=recipes["rows"]
+        )
+        if recipes["age_seconds"] is not None:
+            yield GaugeMetricFamily(
+                "nutriwise_recipe_cache_age_seconds", "Time since the recipe snapshot was last confirmed current",
+                value=recipes["age_seconds"],
+            )
+
+        stats = tool_cache.stats()
+        hits = CounterMetricFamily("nutriwise_tool_cache_hits", "Tool calls answered from the cache", labels=["tool"])
+        misses = CounterMetricFamily("nutriwise_tool_cache_misses", "Tool calls that ran", labels=["tool"])
+        entries = GaugeMetricFamily("nutriwise_tool_cache_entries", "Results kept per tool", labels=["tool"])
+        for name, tool_stats in stats.items():
+            hits.add_metric([name], tool_stats["hits"])
+            misses.add_metric([name], tool_stats["misses"])
+            entries.add_metric([name], tool_stats["entries"])
+        yield hits
+        yield misses
+        yield entries
+
+        yield GaugeMetricFamily(
+            "nutriwise_weekly_plan_cache_entries", "Weekly plan responses cached",
+            value=len(weekly_plan_cache),
+        )
+        yield GaugeMetricFamily(
+            "nutriwise_auth_token_cache_entries", "Verified access tokens cached",
+            value=len(token_verifier),
+        )
+
+
+_cache_collector = CacheCollector()
+REGISTRY.register(_cache_collector)
+
+
+def render():
+    """(body, content type) for GET /metrics"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_cache_collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,140 @@
+import os
+import time
+import hashlib
+import asyncio
+import threading
+from google.genai import types
+from dotenv import load_dotenv
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Set to "false" to always send the system prompt and tools inline
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+# Lifetime of a cached prefix on the Gemini side
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+# Extend the TTL once a cached prefix is this close to expiring
+PROMPT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("PROMPT_CACHE_REFRESH_MARGIN_SECONDS", "300"))
+# After a failed create (e.g. caching unsupported for the model), send inline for this long
+PROMPT_CACHE_RETRY_SECONDS = 600
+
+
+class CachedPrefix:
+    """Handle to one cached system prompt + tools prefix"""
+
+    def __init__(self, name: str, expires_at: float):
+        self.name = name  # cachedContents/... resource name
+        self.expires_at = expires_at  # wall clock, conservative (taken before the request)
+
+
+class PromptCacheManager:
+    """
+    Registers the static part of an agent request (system instruction and
+    tool declarations) once as Gemini cached content and hands out the cache
+    name, so each iteration only sends the conversation.
+
+    Entries are keyed by model and a hash of the prefix, so they are shared
+    across iterations, sessions and weekly-plan days, and a changed prompt
+    gets a new cache. The TTL is extended shortly before it runs out. If a
+    cache can't be created, callers get the inline config instead.
+    """
+
+    def __init__(self, enabled: bool = PROMPT_CACHE_ENABLED, ttl_seconds: int = PROMPT_CACHE_TTL_SECONDS,
+                 refresh_margin_seconds: int = PROMPT_CACHE_REFRESH_MARGIN_SECONDS):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._entries = {}  # key -> CachedPrefix
+        self._failed_until = {}  # key -> wall clock
+        # Sessions run on different event loops and threads, so creation is
+        # serialized with a thread lock on a worker thread (sync client)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model: str, system_instruction: str, tools: list) -> str:
+        digest = hashlib.sha256(system_instruction.encode("utf-8"))
+        for tool in tools or []:
+            digest.update(tool.model_dump_json(exclude_none=True).encode("utf-8"))
+        return f"{model}:{digest.hexdigest()[:16]}"
+
+    def _usable(self, entry) -> bool:
+        return entry is not None and time.time() < entry.expires_at - self.refresh_margin_seconds
+
+    async def content_config(self, client, model: str, system_instruction: str, tools: list,
+                             label: str = "prompt") -> types.GenerateContentConfig:
+        """
+        GenerateContentConfig for a request with this prefix: references the
+        cached content when available, otherwise carries the prefix inline.
+        """
+        name = await self.get(client, model, system_instruction, tools, label=label)
+        if name is None:
+            return types.GenerateContentConfig(tools=tools, system_instruction=system_instruction)
+        return types.GenerateContentConfig(cached_content=name)
+
+    async def get(self, client, model: str, system_instruction: str, tools: list, label: str = "prompt"):
+        """Cached content name for the prefix, or None if it should be sent inline"""
+        if not self.enabled:
+            return None
+        key = self._key(model, system_instruction, tools)
+        entry = self._entries.get(key)
+        if self._usable(entry):
+            return entry.name
+        if time.time() < self._failed_until.get(key, 0):
+            return None
+        return await asyncio.to_thread(self._ensure, client, key, model, system_instruction, tools, label)
+
+    def _ensure(self, client, key: str, model: str, system_instruction: str, tools: list, label: str):
+        with self._lock:
+            # Another session may have created or refreshed it while we waited
+            entry = self._entries.get(key)
+            if self._usable(entry):
+                return entry.name
+            if time.time() < self._failed_until.get(key, 0):
+                return None
+
+            requested_at = time.time()
+            if entry is not None and requested_at < entry.expires_at:
+                try:
+                    client.caches.update(
+                        name=entry.name,
+                        config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s")
+                    )
+                    entry.expires_at = requested_at + self.ttl_seconds
+                    logger.info(f"♻️ Extended {label} cache {entry.name}")
+                    return entry.name
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not extend {label} cache {entry.name}, creating a new one: {str(e)}")
+
+            try:
+                cached = client.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"nutriwise-{label}",
+                        system_instruction=system_instruction,
+                        tools=tools,
+                        ttl=f"{self.ttl_seconds}s",
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Could not cache the {label} prefix, sending it inline: {str(e)}")
+                self._entries.pop(key, None)
+                self._failed_until[key] = time.time() + PROMPT_CACHE_RETRY_SECONDS
+                return None
+
+            self._entries[key] = CachedPrefix(cached.name, requested_at + self.ttl_seconds)
+            logger.info(f"🗄️ Cached {label} prefix as {cached.name} (ttl {self.ttl_seconds}s)")
+            return cached.name
+
+    def invalidate(self, cached_content: str):
+        """Forget a cache the API no longer accepts (e.g. deleted or expired early)"""
+        # Called from the event loop, so it must not wait on _lock, which _ensure
+        # holds across a network call. Dropping an entry is a single dict
+        # operation, and a racing _ensure only ever stores a different name.
+        for key, entry in list(self._entries.items()):
+            if entry.name == cached_content:
+                self._entries.pop(key, None)
+
+
+prompt_cache = PromptCacheManager()
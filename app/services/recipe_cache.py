@@ -0,0 +1,244 @@
+import os
+import time
+import threading
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from app.services.supabase_client import supabase
+from app.services.recipe_catalog_store import RecipeCatalogStore
+from app.tools.recipe_search import RecipeSearchIndex
+from app.tools.recipe_projection import RecipeProjection
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# How long a catalog version is served before checking the recipes table for changes
+RECIPE_CACHE_TTL_SECONDS = float(os.getenv("RECIPE_CACHE_TTL_SECONDS", "300"))
+# Deltas cannot see deleted recipes, so the whole table is reloaded this often
+RECIPE_CACHE_FULL_RELOAD_SECONDS = float(os.getenv("RECIPE_CACHE_FULL_RELOAD_SECONDS", "3600"))
+
+
+class RecipeSnapshot:
+    """
+    One immutable version of the recipe catalog. Readers take a snapshot and
+    use it for the whole call, so a refresh never changes data under them.
+
+    columns maps each column name to its values by row position: NumPy
+    arrays for numeric columns, lazily decoded sequences for text (see
+    RecipeCatalogStore.open). Read single columns on the request path; df
+    decodes the whole catalog into a new DataFrame on every access.
+    """
+
+    def __init__(self, columns: dict, version, key: str = None, indexes: dict = None):
+        self.columns = columns
+        self.version = version  # max(updated_at) of the rows, or None if unknown
+        self.key = key  # published catalog version this snapshot maps
+        self.loaded_at = time.monotonic()  # last time it was confirmed current
+        self._indexes = dict(indexes or {})
+        self._index_lock = threading.Lock()
+        self._projection = None
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The whole catalog as a DataFrame, decoded for the caller (not kept)"""
+        return pd.DataFrame({
+            name: values if isinstance(values, np.ndarray) else values.tolist()
+            for name, values in self.columns.items()
+        }, copy=False)
+
+    def search_index(self, column_name: str = "name") -> RecipeSearchIndex:
+        """Search index over one column of this snapshot (stored with the catalog, or built on first use)"""
+        index = self._indexes.get(column_name)
+        if index is None:
+            with self._index_lock:
+                index = self._indexes.get(column_name)
+                if index is None:
+                    index = RecipeSearchIndex(self.columns[column_name])
+                    self._indexes[column_name] = index
+        return index
+
+    def projection(self) -> RecipeProjection:
+        """Result fields of this snapshot, used to serialize search results"""
+        if self._projection is None:
+            self._projection = RecipeProjection(self.columns)
+        return self._projection
+
+
+class RecipeCache:
+    """
+    Process-wide view of the recipe catalog.
+
+    The catalog itself lives in the shared RecipeCatalogStore, so one worker
+    loads it from Supabase and every worker on the host memory-maps the same
+    files. get() always returns the current snapshot immediately; once it is
+    older than the TTL a background thread syncs with the store:
+
+    - if another worker confirmed the published version within the TTL, it
+      is mapped as is;
+    - otherwise, under the store lock, the recipes updated_at watermark is
+      compared with the published version and, if it moved, only the rows
+      changed since then are fetched, merged and published as a new version.
+    """
+
+    def __init__(self, store: RecipeCatalogStore = None, ttl_seconds: float = RECIPE_CACHE_TTL_SECONDS,
+                 full_reload_seconds: float = RECIPE_CACHE_FULL_RELOAD_SECONDS):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self._snapshot = None
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot else None
+
+    def get(self) -> RecipeSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._snapshot = self._sync()
+            return self._snapshot
+
+        if time.monotonic() - snapshot.loaded_at > self.ttl_seconds:
+            self._refresh_in_background()
+        return snapshot
+
+    def stats(self) -> dict:
+        """Size of the current snapshot and seconds since it was confirmed current (without loading it)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"rows": 0, "age_seconds": None}
+        return {"rows": len(snapshot), "age_seconds": time.monotonic() - snapshot.loaded_at}
+
+    def warm_up(self):
+        """Load the catalog and build the name index ahead of the first request"""
+        self.get().search_index("name")
+
+    def refresh(self):
+        """Bring the snapshot up to date with the recipes table (blocking)"""
+        snapshot = self._sync()
+        # Make sure the name index exists before swapping in, so readers never wait for it
+        snapshot.search_index("name")
+        self._snapshot = snapshot
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # A refresh is already running
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Recipe cache refresh failed, serving the previous snapshot: {str(e)}")
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=run, name="recipe-cache-refresh", daemon=True).start()
+
+    def _is_fresh(self, published) -> bool:
+        return published is not None and time.time() - published.checked_at < self.ttl_seconds
+
+    def _sync(self) -> RecipeSnapshot:
+        """Make sure the shared catalog is current and return a snapshot of it"""
+        published = self.store.current()
+        if self._is_fresh(published):
+            return self._open(published)
+
+        with self.store.lock():
+            # Another worker may have refreshed it while we waited for the lock
+            published = self.store.current()
+            if self._is_fresh(published):
+                return self._open(published)
+
+            now = time.time()
+            if published is None or now - published.full_loaded_at > self.full_reload_seconds:
+                published = self._publish_full_load()
+            else:
+                try:
+                    watermark = self._fetch_watermark()
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not read recipes watermark, doing a full reload: {str(e)}")
+                    watermark = None
+
+                if watermark is not None and watermark == published.version:
+                    # Unchanged: keep serving the same version for another TTL
+                    published = self.store.touch(published)
+                elif watermark is None or published.version is None:
+                    published = self._publish_full_load()
+                else:
+                    published = self._publish_delta(published, watermark)
+
+        return self._open(published)
+
+    def _open(self, published) -> RecipeSnapshot:
+        current = self._snapshot
+        if current is not None and current.key == published.key:
+            current.loaded_at = time.monotonic()
+            return current
+        columns, indexes = self.store.open(published)
+        return RecipeSnapshot(columns, published.version, key=published.key, indexes=indexes)
+
+    def _fetch_watermark(self):
+        response = supabase.table('recipes')\
+            .select('updated_at')\
+            .order('updated_at', desc=True, nullsfirst=False)\
+            .limit(1)\
+            .execute()
+        return response.data[0]['updated_at'] if response.data else None
+
+    def _publish_full_load(self):
+        logger.info("📥 Loading recipes from Supabase...")
+        try:
+            # Read the watermark first: rows changed during the load are picked up by the next delta
+            watermark = self._fetch_watermark()
+        except Exception as e:
+            logger.warning(f"⚠️ Recipes watermark unavailable, deltas disabled: {str(e)}")
+            watermark = None
+        loaded_at = time.time()
+        response = supabase.table('recipes').select('*').execute()
+        df = pd.DataFrame(response.data)
+        logger.info(f"✅ Loaded {len(df)} recipes into the shared catalog (version {watermark})")
+        return self.store.publish(df, watermark, full_loaded_at=loaded_at)
+
+    def _publish_delta(self, published, watermark):
+        response = supabase.table('recipes')\
+            .select('*')\
+            .gt('updated_at', published.version)\
+            .execute()
+        changed = pd.DataFrame(response.data)
+        logger.info(f"🔄 Recipe cache delta: {len(changed)} changed recipe(s) since {published.version}")
+        base = self._open(published).df
+        if not changed.empty and set(changed.columns) != set(base.columns):
+            # The recipes table gained or lost columns: rebuild rather than patch rows of another shape
+            logger.info("📐 Recipe columns changed since the last load, doing a full reload")
+            return self._publish_full_load()
+        df = base if changed.empty else _merge_changed_rows(base, changed)
+        return self.store.publish(df, watermark, full_loaded_at=published.full_loaded_at)
+
+
+def _merge_changed_rows(df: pd.DataFrame, changed: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replace rows with the same id in place and append new ones, keeping catalog
+    order. changed must have df's columns (see _publish_delta).
+    """
+    existing = df.set_index('id')
+    incoming = changed.set_index('id')[existing.columns]
+    is_update = incoming.index.isin(existing.index)
+
+    merged = existing.copy()
+    updated = incoming[is_update]
+    if not updated.empty:
+        merged.loc[updated.index, updated.columns] = updated
+    merged = pd.concat([merged, incoming[~is_update]])
+    return merged.reset_index()
+
+
+recipe_cache = RecipeCache(RecipeCatalogStore())
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from app.tools.recipe_search import RecipeSearchIndex
+
+load_dotenv()
+
+# Shared by every worker on the host; each published version is a subdirectory
+RECIPE_CATALOG_DIR = os.getenv(
+    "RECIPE_CATALOG_DIR",
+    os.path.join(tempfile.gettempdir(), "nutriwise_recipe_catalog")
+)
+# Columns whose search index is built once and stored with the catalog
+INDEXED_COLUMNS = ["name"]
+# Published versions kept on disk (older ones may still be mapped by slow workers)
+VERSIONS_TO_KEEP = 3
+
+
+class MappedText:
+    """
+    Read-only string column stored as one UTF-8 blob plus an offsets array.
+    Both are memory-mapped, so all workers share the same pages; strings
+    are only decoded when accessed.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, nulls: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int):
+        if self.nulls[idx]:
+            return None
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self) -> list:
+        """Every value decoded, in one pass over the blob (the list is the caller's, nothing is kept)"""
+        data = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        nulls = self.nulls.tolist()
+        return [
+            None if null else data[start:end].decode("utf-8")
+            for start, end, null in zip(offsets, offsets[1:], nulls)
+        ]
+
+
+class MappedJSON(MappedText):
+    """MappedText of JSON documents (lists, dicts, mixed values), parsed when accessed"""
+
+    def __getitem__(self, idx: int):
+        value = super().__getitem__(idx)
+        return None if value is None else json.loads(value)
+
+    def tolist(self) -> list:
+        return [None if value is None else json.loads(value) for value in super().tolist()]
+
+
+def _write_text(directory: str, stem: str, values):
+    encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{stem}.bytes"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{stem}.offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{stem}.nulls.npy"), np.array([value is None for value in values], dtype=bool))
+
+
+def _read_text(directory: str, stem: str, cls=MappedText) -> MappedText:
+    blob_path = os.path.join(directory, f"{stem}.bytes")
+    # np.memmap can't map an empty file
+    blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) \
+        else np.zeros(0, dtype=np.uint8)
+    return cls(
+        blob,
+        np.load(os.path.join(directory, f"{stem}.offsets.npy"), mmap_mode="r"),
+        np.load(os.path.join(directory, f"{stem}.nulls.npy"), mmap_mode="r"),
+    )
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _column_kind(series: pd.Series) -> str:
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return "numeric"
+    if all(isinstance(value, str) or _is_missing(value) for value in series):
+        return "text"
+    return "json"  # lists, dicts, mixed values
+
+
+class PublishedCatalog:
+    """Pointer to one published catalog version, as recorded in the CURRENT file"""
+
+    def __init__(self, key: str, version, full_loaded_at: float, checked_at: float):
+        self.key = key
+        self.version = version  # recipes updated_at watermark
+        self.full_loaded_at = full_loaded_at  # wall clock of the last full table load
+        self.checked_at = checked_at  # wall clock of the last watermark check
+
+
+class RecipeCatalogStore:
+    """
+    Recipe catalog materialized once per host in a columnar on-disk layout:
+
+        <dir>/CURRENT                 JSON pointer to the live version
+        <dir>/<key>/meta.json         column names and kinds
+        <dir>/<key>/col_<n>.npy       numeric columns (memory-mapped)
+        <dir>/<key>/col_<n>.bytes     text/JSON columns (+ .offsets.npy, .nulls.npy)
+        <dir>/<key>/index_<column>.*  search index arrays for INDEXED_COLUMNS
+
+    Workers memory-map a version read-only, so the pages are shared instead
+    of every process holding its own copy. Text stays in the mapping too:
+    values are decoded only for the rows a caller reads. Writers hold an exclusive file
+    lock so only one worker talks to Supabase for a given refresh.
+    """
+
+    def __init__(self, directory: str = RECIPE_CATALOG_DIR):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive, cross-process lock for loading and publishing"""
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current(self):
+        """The live PublishedCatalog, or None if nothing has been published yet"""
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                pointer = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return PublishedCatalog(**pointer)
+
+    def _write_pointer(self, published: PublishedCatalog):
+        temp_path = os.path.join(self.directory, f".CURRENT.{os.getpid()}")
+        with open(temp_path, "w") as f:
+            json.dump(vars(published), f)
+        os.replace(temp_path, os.path.join(self.directory, "CURRENT"))
+
+    def touch(self, published: PublishedCatalog) -> PublishedCatalog:
+        """Record that the live version was just confirmed current"""
+        published.checked_at = time.time()
+        self._write_pointer(published)
+        return published
+
+    def publish(self, df: pd.DataFrame, version, full_loaded_at: float) -> PublishedCatalog:
+        """Write a new catalog version (with its search indexes) and make it live"""
+        key = f"v{time.time_ns()}-{os.getpid()}"
+        temp_dir = os.path.join(self.directory, f".tmp-{key}")
+        os.makedirs(temp_dir)
+
+        columns = []
+        for position, column in enumerate(df.columns):
+            stem = f"col_{position}"
+            kind = _column_kind(df[column])
+            if kind == "numeric":
+                np.save(os.path.join(temp_dir, f"{stem}.npy"), df[column].to_numpy())
+            elif kind == "text":
+                _write_text(temp_dir, stem, [None if _is_missing(v) else v for v in df[column]])
+            else:
+                _write_text(temp_dir, stem, [None if _is_missing(v) else json.dumps(v) for v in df[column]])
+            columns.append({"name": column, "kind": kind, "stem": stem})
+
+        indexed = [column for column in INDEXED_COLUMNS if column in df.columns]
+        for column in indexed:
+            arrays = RecipeSearchIndex(df[column].tolist()).to_arrays()
+            stem = f"index_{column}"
+            _write_text(temp_dir, f"{stem}.processed", arrays["processed"])
+            _write_text(temp_dir, f"{stem}.vocabulary", arrays["vocabulary"])
+            for name in ("offsets", "ids", "lengths", "histograms"):
+                np.save(os.path.join(temp_dir, f"{stem}.{name}.npy"), arrays[name])
+
+        with open(os.path.join(temp_dir, "meta.json"), "w") as f:
+            json.dump({"rows": len(df), "columns": columns, "indexes": indexed}, f)
+
+        os.rename(temp_dir, os.path.join(self.directory, key))
+        now = time.time()
+        published = PublishedCatalog(key, version, full_loaded_at, checked_at=now)
+        self._write_pointer(published)
+        self._prune(keep=key)
+        return published
+
+    def open(self, published: PublishedCatalog):
+        """
+        Map a published version: returns ({column: values}, {column: RecipeSearchIndex}).
+        Numeric columns are read-only NumPy memory maps, text and JSON
+        columns MappedText / MappedJSON; all are indexed by row position.
+        """
+        directory = os.path.join(self.directory, published.key)
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+
+        columns = {}
+        for column in meta["columns"]:
+            stem = column["stem"]
+            if column["kind"] == "numeric":
+                columns[column["name"]] = np.load(os.path.join(directory, f"{stem}.npy"), mmap_mode="r")
+            elif column["kind"] == "text":
+                columns[column["name"]] = _read_text(directory, stem)
+            else:
+                columns[column["name"]] = _read_text(directory, stem, cls=MappedJSON)
+
+        indexes = {}
+        for column in meta["indexes"]:
+            stem = f"index_{column}"
+            indexes[column] = RecipeSearchIndex.from_arrays(
+                processed=_read_text(directory, f"{stem}.processed"),
+                vocabulary=_read_text(directory, f"{stem}.vocabulary"),
+                offsets=np.load(os.path.join(directory, f"{stem}.offsets.npy"), mmap_mode="r"),
+                ids=np.load(os.path.join(directory, f"{stem}.ids.npy"), mmap_mode="r"),
+                lengths=np.load(os.path.join(directory, f"{stem}.lengths.npy"), mmap_mode="r"),
+                histograms=np.load(os.path.join(directory, f"{stem}.histograms.npy"), mmap_mode="r"),
+            )
+        return columns, indexes
+
+    def _prune(self, keep: str):
+        versions = sorted(
+            (entry for entry in os.listdir(self.directory) if entry.startswith("v")),
+            key=lambda entry: os.path.getmtime(os.path.join(self.directory, entry)),
+            reverse=True
+        )
+        for entry in versions[VERSIONS_TO_KEEP:]:
+            if entry != keep:
+                # Workers that still map these files keep their pages until they unmap
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
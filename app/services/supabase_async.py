@@ -0,0 +1,177 @@
+import os
+import asyncio
+import threading
+import contextvars
+import httpx
+from postgrest import AsyncPostgrestClient, APIError
+from supabase_auth import AsyncGoTrueClient
+from dotenv import load_dotenv
+from app.services.metrics import supabase_event_hooks
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
+# Connections kept open to Supabase, per event loop; further calls wait for a free one
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "100"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))
+# Deadline for one database call, retries included
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+# Extra attempts after a transient failure (connection errors, HTTP 502/503/504)
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", "2"))
+SUPABASE_RETRY_BACKOFF_SECONDS = 0.2
+RETRYABLE_STATUS_CODES = {502, 503, 504, 520}
+
+# APIError carries the PostgREST/SQLSTATE code from the error body, not the
+# HTTP status, so execute() collects the status of each attempt's response here
+_response_status: contextvars.ContextVar = contextvars.ContextVar("supabase_response_status", default=None)
+
+
+async def _record_status(response: httpx.Response):
+    attempt = _response_status.get()
+    if attempt is not None:
+        attempt["status"] = response.status_code
+
+
+def _is_transient(error: Exception, method: str, status: int = None) -> bool:
+    """Whether a failed call (whose response, if any, had HTTP status `status`) can be sent again"""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        # The request never reached the server, so even writes are safe to resend
+        return True
+    if method not in ("GET", "HEAD"):
+        return False
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, APIError) and status in RETRYABLE_STATUS_CODES
+
+
+class AsyncSupabase:
+    """
+    Async access to the Supabase database and auth API for the request path.
+
+    Each event loop gets one pooled httpx.AsyncClient, shared by a PostgREST
+    client (service key) and the auth clients, so concurrent requests on a
+    worker share keep-alive connections instead of holding a thread each.
+    Every use of `auth` gets a new auth client: a sign-in keeps the session
+    in its client, which must not outlive the request that signed in.
+
+    Build queries with table() and run them with execute(), which applies the
+    per-call timeout and retries transient failures (reads only, unless the
+    request never left this host).
+    """
+
+    def __init__(self, url: str = SUPABASE_URL, key: str = SUPABASE_SERVICE_KEY,
+                 pool_size: int = SUPABASE_POOL_SIZE, keepalive_seconds: float = SUPABASE_KEEPALIVE_SECONDS,
+                 timeout_seconds: float = SUPABASE_TIMEOUT_SECONDS, retries: int = SUPABASE_RETRIES,
+                 transport: httpx.AsyncBaseTransport = None):
+        if not url or not key:
+            raise EnvironmentError("Supabase URL and Key must be set in .env file")
+        self.url = url.rstrip("/")
+        self.key = key
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        # None sends requests over the network; set before first use to serve them
+        # in-process instead (e.g. an httpx.MockTransport in the offline benchmarks)
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._clients = {}  # event loop -> (AsyncPostgrestClient, httpx.AsyncClient)
+
+    def _headers(self) -> dict:
+        return {"apiKey": self.key, "Authorization": f"Bearer {self.key}"}
+
+    @staticmethod
+    def _event_hooks() -> dict:
+        # Per-table latency in /metrics, plus the response status for retry decisions
+        hooks = supabase_event_hooks(is_async=True)
+        return {**hooks, "response": [*hooks["response"], _record_status]}
+
+    def _for_loop(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                for stale in [known for known in self._clients if known.is_closed()]:
+                    del self._clients[stale]
+                http = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                        keepalive_expiry=self.keepalive_seconds,
+                    ),
+                    timeout=httpx.Timeout(self.timeout_seconds),
+                    follow_redirects=True,
+                    event_hooks=self._event_hooks(),
+                    transport=self.transport,
+                )
+                entry = (
+                    AsyncPostgrestClient(f"{self.url}/rest/v1", headers=self._headers(), http_client=http),
+                    http,
+                )
+                self._clients[loop] = entry
+        return entry
+
+    def table(self, name: str):
+        """Query builder for a table; pass the finished query to execute()"""
+        return self._for_loop()[0].table(name)
+
+    @property
+    def auth(self) -> AsyncGoTrueClient:
+        """
+        A new auth API client (sign up, sign in) on the running loop's pool.
+        Use it for one call: it keeps the session of the user it signed in.
+        """
+        return AsyncGoTrueClient(
+            url=f"{self.url}/auth/v1",
+            headers=self._headers(),
+            http_client=self._for_loop()[1],
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+
+    async def execute(self, query, timeout: float = None, retries: int = None):
+        """
+        Run a query built with table(). Gives up after `timeout` seconds
+        (SUPABASE_TIMEOUT_SECONDS by default, covering all attempts) and
+        retries transient failures up to `retries` times.
+        """
+        timeout = self.timeout_seconds if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        method = query.request.http_method
+        # Retries are handled here, within the deadline, not by postgrest's own backoff
+        query.retry(False)
+
+        async def attempt_all():
+            for attempt in range(retries + 1):
+                response = {}
+                _response_status.set(response)
+                try:
+                    return await query.execute()
+                except Exception as e:
+                    if attempt == retries or not _is_transient(e, method, response.get("status")):
+                        raise
+                    delay = SUPABASE_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    logger.warning(f"🔁 Supabase {method} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+        try:
+            return await asyncio.wait_for(attempt_all(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Supabase {method} {query.request.path} timed out after {timeout}s")
+
+    async def aclose(self):
+        """Close the connection pools; called on application shutdown"""
+        current = asyncio.get_running_loop()
+        with self._lock:
+            clients = dict(self._clients)
+            self._clients.clear()
+        for loop, (_, http) in clients.items():
+            if loop is current:
+                await http.aclose()
+
+
+async_supabase = AsyncSupabase()
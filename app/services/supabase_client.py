@@ -1,6 +1,7 @@
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from app.services.metrics import instrument_httpx_client
 
 load_dotenv()
 
@@ -10,4 +11,6 @@ key: str = os.environ.get("SUPABASE_SERVICE_KEY")
 if not url or not key:
     raise EnvironmentError("Supabase URL and Key must be set in .env file")
 
-supabase: Client = create_client(url, key)
\ No newline at end of file
+supabase: Client = create_client(url, key)
+# Per-table latency in /metrics (the client is recreated, without them, only if a user signs in on it)
+instrument_httpx_client(supabase.postgrest.session)
@@ -0,0 +1,121 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from app.core.log import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# How long a cached weekly plan is served without any invalidation (0 disables the cache).
+# Changes made through the app invalidate it right away; this bounds staleness for anything else.
+WEEKLY_PLAN_CACHE_TTL_SECONDS = float(os.getenv("WEEKLY_PLAN_CACHE_TTL_SECONDS", "300"))
+WEEKLY_PLAN_CACHE_MAX_ENTRIES = int(os.getenv("WEEKLY_PLAN_CACHE_MAX_ENTRIES", "2048"))
+# Version counters shared by every worker on the host, so a write in one worker
+# (e.g. the job generating the plan) invalidates the copies cached by the others
+WEEKLY_PLAN_CACHE_SQLITE_PATH = os.getenv(
+    "WEEKLY_PLAN_CACHE_SQLITE_PATH",
+    os.path.join(tempfile.gettempdir(), "nutriwise_plan_versions.sqlite3")
+)
+
+
+class WeeklyPlanCache:
+    """
+    Response cache for GET /plans/weekly/{weekly_plan_id}.
+
+    Entries are kept per process and tagged with the plan's version counter.
+    Code that changes a weekly plan, its days or their meals calls
+    invalidate(), which bumps the counter, so every worker's copy stops
+    matching on its next read.
+    """
+
+    def __init__(self, path: str = WEEKLY_PLAN_CACHE_SQLITE_PATH, ttl_seconds: float = WEEKLY_PLAN_CACHE_TTL_SECONDS,
+                 max_entries: int = WEEKLY_PLAN_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # weekly_plan_id -> (version, stored_at, user_id, response)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS plan_versions (
+                    weekly_plan_id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _version(self, weekly_plan_id: int) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version FROM plan_versions WHERE weekly_plan_id = ?", (weekly_plan_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, weekly_plan_id: int, user_id: str):
+        """Cached response for the plan if it is current and belongs to user_id, else None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(weekly_plan_id)
+        if entry is None:
+            return None
+        version, stored_at, owner_id, response = entry
+        if owner_id != user_id or time.monotonic() - stored_at > self.ttl_seconds:
+            return None
+        if self._version(weekly_plan_id) != version:
+            return None
+        with self._lock:
+            self._entries.move_to_end(weekly_plan_id, last=True)
+        return response
+
+    def version(self, weekly_plan_id: int):
+        """Read before loading a plan; pass to put() so a write during the load isn't cached over"""
+        return self._version(weekly_plan_id) if self.enabled else None
+
+    def put(self, weekly_plan_id: int, user_id: str, version, response: dict):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[weekly_plan_id] = (version, time.monotonic(), user_id, response)
+            self._entries.move_to_end(weekly_plan_id, last=True)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, weekly_plan_id: int):
+        """Call after changing a weekly plan, its daily plans or their meals"""
+        try:
+            with self._connect() as conn:
+                conn.execute("""
+                    INSERT INTO plan_versions (weekly_plan_id, version) VALUES (?, 1)
+                    ON CONFLICT(weekly_plan_id) DO UPDATE SET version = version + 1
+                """, (weekly_plan_id,))
+        except Exception as e:
+            # A missed bump leaves other workers stale until the TTL; never fail the write for it
+            logger.warning(f"⚠️ Could not invalidate cached weekly plan {weekly_plan_id}: {str(e)}")
+        with self._lock:
+            self._entries.pop(weekly_plan_id, None)
+
+
+weekly_plan_cache = WeeklyPlanCache()
@@ -2,38 +2,72 @@ import operator
 from google.genai import types
 
 import operator
+import threading
+from functools import lru_cache
 from py_expression_eval import Parser
 
+# Parsed expressions kept for reuse (the model repeats the same target and serving calculations)
+COMPILED_EXPRESSION_CACHE_SIZE = 1024
+
+# One parser for the process. Parsing keeps its position on the parser, so it
+# is serialized; evaluating a parsed expression is read-only and needs no lock.
+_parser = Parser()
+_parse_lock = threading.Lock()
+
+
+def _normalize(expression: str) -> str:
+    """Cache key for an expression: surrounding and repeated whitespace don't change its meaning"""
+    return " ".join(str(expression).split())
+
+
+@lru_cache(maxsize=COMPILED_EXPRESSION_CACHE_SIZE)
+def _compile(normalized_expression: str):
+    with _parse_lock:
+        return _parser.parse(normalized_expression)
+
+
+def _evaluate(expression: str) -> dict:
+    try:
+        result = _compile(_normalize(expression)).evaluate({}) # empty dict for variables
+        return {"success": True, "result": result}
+    except ZeroDivisionError:
+        return {"success": False, "error": "Division by zero occurred in the expression."}
+    except Exception as e:
+        # Catches parsing errors, unknown functions, etc.
+        return {"success": False, "error": f"Invalid expression or calculation error: {str(e)}"}
+
 
 # The new, more powerful function
-def calculate(expression: str):
+def calculate(expression: str = None, expressions: list = None):
     """
-    Safely evaluates a mathematical string expression.
+    Safely evaluates a mathematical string expression, or several at once.
 
     This tool is highly efficient for multi-step calculations. It supports
     basic arithmetic (+, -, *, /), parentheses for order of operations,
-    and common math functions.
+    and common math functions. Pass `expressions` to get every result in one
+    call, e.g. all meal calorie targets or every meal's serving size.
 
     Args:
         expression (str): The mathematical expression to evaluate.
                           Example: "(5 + 3) * 2 - 10 / 2"
+        expressions (list): Optional list of expressions evaluated together.
+                            Example: ["2000 * 0.20", "2000 * 0.325", "480 / 320"]
 
     Returns:
         dict: A dictionary containing the result or an error message.
               - On success: {"success": True, "result": <value>}
               - On failure: {"success": False, "error": "error_message"}
+              - With expressions: {"success": <all succeeded>, "results": [
+                    {"expression": "2000 * 0.20", "success": True, "result": 400.0}, ...]}
     """
-    try:
-        # Create a parser object
-        parser = Parser()
-        # Evaluate the expression
-        result = parser.parse(expression).evaluate({}) # empty dict for variables
-        return {"success": True, "result": result}
-    except ZeroDivisionError:
-        return {"success": False, "error": "Division by zero occurred in the expression."}
-    except Exception as e:
-        # Catches parsing errors, unknown functions, etc.
-        return {"success": False, "error": f"Invalid expression or calculation error: {str(e)}"}
+    if isinstance(expression, list):
+        expressions = expression
+    if expressions:
+        results = [{"expression": item, **_evaluate(item)} for item in expressions]
+        return {"success": all(result["success"] for result in results), "results": results}
+    if expression is None:
+        return {"success": False, "error": "Provide an expression or a list of expressions."}
+    return _evaluate(expression)
     
     
 schema_calculate = types.FunctionDeclaration(
@@ -45,8 +79,13 @@ schema_calculate = types.FunctionDeclaration(
             "expression": types.Schema(
                 type=types.Type.STRING,
                 description="The mathematical expression to evaluate. For example: '(10 + 5) * 2' or '100 / 4 - 10'."
+            ),
+            "expressions": types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description="Several expressions evaluated in one call, e.g. ['2000 * 0.20', '2000 * 0.325']. Returns one result per expression."
             )
         },
-        required=["expression"],
+        # Either expression or expressions must be given
     ),
 )
\ No newline at end of file
@@ -1,9 +1,17 @@
 import json
+import time
+import asyncio
 from google.genai import types
 
 # 1. Import the actual, callable Python functions
 from app.tools.database_tools import search_recipes, save_meal_plan, get_current_meal_plan,fuzzy_search_rows,get_previous_recipes_in_week
 from app.tools.calculator import calculate
+from app.tools.meal_solver import solve_meal_plan
+from app.tools.tool_cache import tool_cache, succeeded
+from app.services.metrics import TOOL_CALL_SECONDS, TOOL_ERRORS
+from app.core.log import get_logger, preview
+
+logger = get_logger(__name__)
 
 # 2. Create the simple Python dictionary for execution mapping.
 AVAILABLE_FUNCTIONS = {
@@ -11,9 +19,15 @@ AVAILABLE_FUNCTIONS = {
     "get_current_meal_plan": get_current_meal_plan,
     "calculate": calculate,
     "fuzzy_search_rows": fuzzy_search_rows,
-    "get_previous_recipes_in_week": get_previous_recipes_in_week
+    "get_previous_recipes_in_week": get_previous_recipes_in_week,
+    "solve_meal_plan": solve_meal_plan
 }
 
+# Export every tool's series from the start, so error rates exist before the first error
+for _name in AVAILABLE_FUNCTIONS:
+    TOOL_CALL_SECONDS.labels(_name)
+    TOOL_ERRORS.labels(_name)
+
 # 3. Define the dispatcher function that uses the dictionary.
 def call_function(function_call: types.FunctionCall, verbose: bool = False) -> types.Content:
     function_name = function_call.name
@@ -25,12 +39,22 @@ def call_function(function_call: types.FunctionCall, verbose: bool = False) -> t
     function_args = dict(function_call.args)
 
     if verbose:
-        print(f"--- Calling Tool: {function_name} with args: {function_args} ---")
+        logger.debug("--- Calling Tool: %s with args: %s ---", function_name, preview(function_args))
         
-    function_response_content = function_to_call(**function_args)
+    # Repeated calls to pure tools and catalog reads are answered from the cache (see app.tools.tool_cache)
+    started = time.perf_counter()
+    try:
+        function_response_content = tool_cache.call(function_name, function_to_call, function_args)
+    except Exception:
+        TOOL_ERRORS.labels(function_name).inc()
+        raise
+    finally:
+        TOOL_CALL_SECONDS.labels(function_name).observe(time.perf_counter() - started)
+    if not succeeded(function_response_content):
+        TOOL_ERRORS.labels(function_name).inc()
     
     if verbose:
-        print(f"--- Tool Response: {function_response_content} ---")
+        logger.debug("--- Tool Response: %s ---", preview(function_response_content))
 
     # Wrap the response for the genai library
     return types.Content(
@@ -44,3 +68,21 @@ def call_function(function_call: types.FunctionCall, verbose: bool = False) -> t
             )
         ],
     )
+
+
+async def call_function_async(function_call: types.FunctionCall, verbose: bool = False) -> types.Content:
+    """
+    Async variant of call_function. The tools themselves are blocking (Supabase,
+    pandas), so they run on a worker thread to keep the event loop free.
+    """
+    return await asyncio.to_thread(call_function, function_call, verbose)
+
+
+async def call_functions_concurrently(function_calls: list, verbose: bool = False) -> list:
+    """
+    Runs every function call from a single model turn concurrently.
+    Responses are returned in the same order as the calls were issued.
+    """
+    return await asyncio.gather(
+        *(call_function_async(function_call, verbose=verbose) for function_call in function_calls)
+    )
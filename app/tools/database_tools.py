@@ -1,23 +1,34 @@
 import json
+from contextvars import ContextVar
 from app.services.supabase_client import supabase
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
 import pandas as pd
+from app.services.recipe_cache import recipe_cache
+from app.tools.recipe_search import RecipeSearchIndex
 
-# Cache the recipes DataFrame to avoid repeated DB queries
-_recipes_cache = None
+# (slot, partitions) for the weekly-plan day currently being generated.
+# When days are generated concurrently, each day only draws recipes whose id
+# falls into its own slot, so days stay varied without waiting on each other.
+recipe_partition: ContextVar = ContextVar("recipe_partition", default=None)
+
+# Plan saved during the current agent session. The endpoint sets a fresh dict
+# before running the agent and reads it afterwards; save_meal_plan fills it.
+# Tools run on worker threads with a copy of the context, which still refers
+# to the same dict.
+saved_meal_plan: ContextVar = ContextVar("saved_meal_plan", default=None)
 
 def load_recipes_from_supabase():
-    """Load all recipes into a pandas DataFrame (cached after first load)"""
-    global _recipes_cache
-    if _recipes_cache is None:
-        print("📥 Loading recipes from Supabase (first time)...")
-        response = supabase.table('recipes').select('*').execute()
-        _recipes_cache = pd.DataFrame(response.data)
-        print(f"✅ Loaded {len(_recipes_cache)} recipes into cache")
-    return _recipes_cache
+    """
+    Return the cached recipes as a DataFrame (see app.services.recipe_cache for
+    loading and refresh). It is decoded for each call; searches read columns instead.
+    """
+    return recipe_cache.get().df
 
-def fuzzy_search_rows(query: str, column_name: str = "name", threshold: int = 85):
+def get_search_index(column_name: str = "name") -> RecipeSearchIndex:
+    """Return the search index for a recipe column of the current catalog snapshot"""
+    return recipe_cache.get().search_index(column_name)
+
+def fuzzy_search_rows(query: str = "", column_name: str = "name", threshold: int = 85, queries: list = None,
+                      result_format: str = None):
     """Performs a fuzzy search on recipe names and returns first 15 matching rows with nutritional information per serving, 
     including calories, protein, fat, carbohydrates, and sodium.
     
@@ -25,23 +36,42 @@ def fuzzy_search_rows(query: str, column_name: str = "name", threshold: int = 85
         query: The search term to match against recipe names (e.g., "chicken curry", "salmon bowl")
         column_name: The column to search in (default: "name")
         threshold: Minimum similarity score from 0 to 100 (default: 85)
+        queries: Optional list of search terms (e.g., ["omelette", "chicken", "salmon"]), all scored
+                 in one batched pass. Returns one result set per query.
+        result_format: "records" or "table" (default: RECIPE_RESULT_FORMAT, see app.tools.recipe_projection)
     
     Returns:
-        JSON string with matching recipes
+        JSON string with matching recipes (id, name, calories, protein, fat, carbohydrates, sodium)
     """
     try:
-        df = load_recipes_from_supabase()
-        matches = process.extract(query, df[column_name], scorer=fuzz.token_set_ratio, limit=len(df))
-        matched_indices = [idx for (name, score, idx) in matches if score >= threshold]
-        
-        matched_df = df.iloc[matched_indices].reset_index(drop=True)
-        
-        matched_df = matched_df.head(15)
-        return json.dumps({
-            "success": True,
-            "count": len(matched_df),
-            "results": matched_df.to_dict(orient='records')  # DataFrame -> dict -> JSON
-        })
+        if isinstance(query, list):
+            queries = query
+
+        # One snapshot for the whole call, so a background refresh can't mix versions
+        snapshot = recipe_cache.get()
+        index = snapshot.search_index(column_name)
+        projection = snapshot.projection()
+        # The day partition filters matches, so it needs every match rather than the top 15
+        limit = len(snapshot) if recipe_partition.get() is not None else 15
+
+        # The result JSON is assembled from pre-encoded fragments rather than json.dumps of dicts
+        if queries:
+            queries = [str(q) for q in queries]
+            per_query = index.search_many(queries, threshold=threshold, limit=limit)
+            fragments = []
+            total = 0
+            for q, matched_indices in zip(queries, per_query):
+                rows = _matched_rows(snapshot, matched_indices)
+                total += len(rows)
+                fragments.append(
+                    f'{{"query": {json.dumps(q)}, "count": {len(rows)}, '
+                    f'"results": {projection.encode(rows, result_format)}}}'
+                )
+            return f'{{"success": true, "count": {total}, "results_by_query": [{", ".join(fragments)}]}}'
+
+        matched_indices = index.search(query, threshold=threshold, limit=limit)
+        rows = _matched_rows(snapshot, matched_indices)
+        return f'{{"success": true, "count": {len(rows)}, "results": {projection.encode(rows, result_format)}}}'
     
     except Exception as e:
         return json.dumps({
@@ -50,6 +80,20 @@ def fuzzy_search_rows(query: str, column_name: str = "name", threshold: int = 85
             "results": []
         })
 
+def _matched_rows(snapshot, matched_indices):
+    """Row positions of the first 15 matches, after applying the current day's partition"""
+    return _apply_recipe_partition(snapshot, matched_indices)[:15]
+
+def _apply_recipe_partition(snapshot, matched_indices):
+    """Keep only matches in the current day's partition (falls back to all matches if none remain)"""
+    partition = recipe_partition.get()
+    if partition is None or 'id' not in snapshot.columns:
+        return matched_indices
+    slot, partitions = partition
+    ids = snapshot.columns['id']
+    in_slot = [idx for idx in matched_indices if int(ids[idx]) % partitions == slot]
+    return in_slot or matched_indices
+
 def search_recipes(query: str, threshold: float = 0.80) -> str:
     """
     Searches recipes using PostgreSQL fuzzy matching.
@@ -88,63 +132,70 @@ def save_meal_plan(user_id: str, plan_data: dict, user_targets: dict) -> str:
     Returns:
         JSON string with success status and plan ID, or error details
     """
+    return json.dumps(store_meal_plan(user_id, plan_data, user_targets))
+
+def store_meal_plan(user_id: str, plan_data: dict, user_targets: dict) -> dict:
+    """
+    save_meal_plan without the JSON encoding, for callers in this process.
+    Also records the saved plan in the saved_meal_plan channel, if one is set.
+    """
     try:
         # Validate user_id
         if not user_id or not isinstance(user_id, str):
-            return json.dumps({
+            return {
                 "success": False,
                 "error": "Invalid user_id. Must be a non-empty string."
-            })
+            }
         
         # Handle plan_data - convert from string if needed
         if isinstance(plan_data, str):
             try:
                 plan_data = json.loads(plan_data)
             except json.JSONDecodeError:
-                return json.dumps({
+                return {
                     "success": False,
                     "error": "plan_data is a string but not valid JSON"
-                })
+                }
         
         # Handle user_targets - convert from string if needed
         if isinstance(user_targets, str):
             try:
                 user_targets = json.loads(user_targets)
             except json.JSONDecodeError:
-                return json.dumps({
+                return {
                     "success": False,
                     "error": "user_targets is a string but not valid JSON"
-                })
+                }
         
         # Validate plan_data structure
         if not isinstance(plan_data, dict):
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"plan_data must be a dict, got {type(plan_data).__name__}"
-            })
+            }
         
         # Validate user_targets structure
         if not isinstance(user_targets, dict):
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"user_targets must be a dict, got {type(user_targets).__name__}"
-            })
+            }
         
         required_target_keys = ['calories', 'protein', 'fat', 'carbs']
         missing_keys = [key for key in required_target_keys if key not in user_targets]
         if missing_keys:
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"user_targets missing required keys: {missing_keys}"
-            })
+            }
         
         # Ensure all target values are numbers
         for key in required_target_keys:
             if not isinstance(user_targets[key], (int, float)):
-                return json.dumps({
+                return {
                     "success": False,
                     "error": f"user_targets['{key}'] must be a number, got {type(user_targets[key]).__name__}"
-                })
+                }
         
         # Insert into database
         response = supabase.table('meal_plans').insert({
@@ -155,25 +206,35 @@ def save_meal_plan(user_id: str, plan_data: dict, user_targets: dict) -> str:
         
         # Check if the insert was successful
         if response.data and len(response.data) > 0:
-            plan_id = response.data[0].get('id')
-            return json.dumps({
+            row = response.data[0]
+            plan_id = row.get('id')
+            channel = saved_meal_plan.get()
+            if channel is not None:
+                # Same shape as get_current_meal_plan's "plan"
+                channel["plan"] = {
+                    "id": plan_id,
+                    "plan_data": plan_data,
+                    "user_targets": user_targets,
+                    "created_at": row.get('created_at')
+                }
+            return {
                 "success": True,
                 "message": "Meal plan saved successfully",
                 "plan_id": plan_id
-            })
+            }
         else:
             error_msg = getattr(response, 'error', 'Unknown error')
-            return json.dumps({
+            return {
                 "success": False,
                 "error": f"Database insert failed: {error_msg}"
-            })
+            }
 
     except Exception as e:
-        return json.dumps({
+        return {
             "success": False,
             "error": f"Exception while saving plan: {str(e)}",
             "error_type": type(e).__name__
-        })
+        }
 
 
 def get_current_meal_plan(user_id: str) -> str:
@@ -234,15 +295,16 @@ def get_previous_recipes_in_week(weekly_plan_id: int) -> str:
         JSON string with list of recipe names already used
     """
     try:
-        # Query all meals from daily plans in this weekly plan
+        # Query all meals from daily plans in this weekly plan (in_ takes the ids, not the rows)
+        daily_plan_ids = [
+            row['id'] for row in supabase.table('daily_plans')
+                .select('id')
+                .eq('weekly_plan_id', weekly_plan_id)
+                .execute().data
+        ]
         response = supabase.table('meals')\
             .select('recipe_id, recipes(name)')\
-            .in_('daily_plan_id', 
-                supabase.table('daily_plans')
-                    .select('id')
-                    .eq('weekly_plan_id', weekly_plan_id)
-                    .execute().data
-            )\
+            .in_('daily_plan_id', daily_plan_ids)\
             .execute()
         
         # Extract unique recipe names
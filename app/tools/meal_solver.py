@@ -0,0 +1,410 @@
+import re
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from app.services.recipe_cache import recipe_cache
+from app.tools.database_tools import recipe_partition
+
+# Share of the daily calories per meal (the 20 / 32.5 / 32.5 / 15 split the prompts use)
+DEFAULT_DISTRIBUTION = {
+    "Breakfast": 0.20,
+    "Lunch": 0.325,
+    "Dinner": 0.325,
+    "Snack 1": 0.15,
+}
+# Recipe searches that seed the candidates for each meal
+SLOT_QUERIES = {
+    "Breakfast": ["omelette", "pancakes", "oatmeal", "eggs", "yogurt", "smoothie", "toast"],
+    "Lunch": ["chicken", "salad", "bowl", "wrap", "turkey", "rice", "sandwich"],
+    "Dinner": ["salmon", "beef", "chicken", "pasta", "curry", "fish", "stir fry"],
+    "Snack": ["protein", "smoothie", "yogurt", "bar", "nuts", "hummus", "shake"],
+}
+NUTRIENTS = ["calories", "protein", "fat", "carbohydrates"]
+TARGET_KEYS = ["calories", "protein", "fat", "carbs"]
+# Relative weight of each nutrient's error (calories matter most)
+NUTRIENT_WEIGHTS = np.array([2.0, 1.0, 1.0, 1.0])
+# Weight of keeping each meal near its share of the calories
+DISTRIBUTION_WEIGHT = 1.0
+MIN_SERVINGS = 0.5
+MAX_SERVINGS = 3.0
+SERVING_STEP = 0.25
+SEARCH_THRESHOLD = 70
+CANDIDATES_PER_QUERY = 40
+# Best single-meal fits kept per slot for the combination search
+SHORTLIST_SIZE = 12
+MAX_DESCENT_ROUNDS = 6
+
+# Words that rule a recipe out for a diet, matched as whole words (plus plural
+# "s"/"es") against the name, and ingredients if present: "egg" rules out
+# "eggs" but not "eggplant", "ham" not "graham"
+_MEAT = ["chicken", "beef", "pork", "lamb", "turkey", "bacon", "ham", "hamburger", "sausage", "steak",
+         "duck", "veal", "venison", "pepperoni", "salami", "chorizo", "prosciutto", "meatball", "gelatin"]
+_SEAFOOD = ["salmon", "tuna", "fish", "catfish", "swordfish", "shellfish", "shrimp", "prawn", "anchovy",
+            "anchovies", "cod", "crab", "crabmeat", "lobster", "scallop", "mussel", "clam", "oyster", "sardine"]
+_ANIMAL_PRODUCTS = ["egg", "omelette", "omelet", "mayonnaise", "mayo", "cheese", "cheeseburger", "cheesecake",
+                    "yogurt", "yoghurt", "milk", "buttermilk", "milkshake", "butter", "ghee", "cream", "honey"]
+DIET_EXCLUSIONS = {
+    "vegetarian": _MEAT + _SEAFOOD,
+    "vegan": _MEAT + _SEAFOOD + _ANIMAL_PRODUCTS,
+    "pescatarian": _MEAT,
+}
+# Phrases that contain an excluded word but are fine for every diet above;
+# they are blanked out before matching
+DIET_SAFE_PHRASES = ["peanut butter", "almond butter", "cashew butter", "nut butter", "cocoa butter",
+                     "apple butter", "vegan butter", "coconut milk", "almond milk", "oat milk", "soy milk",
+                     "rice milk", "cashew milk", "coconut cream", "cream of tartar", "coconut yogurt",
+                     "soy yogurt", "vegan cheese", "vegan mayo", "egg-free", "dairy-free"]
+# Diets the solver honours without excluding anything. Any other diet (keto,
+# halal, gluten-free...) is beyond a word list: plan_meals refuses it and the
+# endpoints hand those plans to the agent.
+UNRESTRICTED_DIETS = {"", "balanced", "none", "no preference", "standard"}
+
+# Per-snapshot results kept (nutrient matrix, slot search matches, diet/avoid masks)
+SNAPSHOT_MEMO_MAX_ENTRIES = 64
+
+_snapshot_memo = (None, OrderedDict())  # (snapshot, key -> value) for the last catalog snapshot used
+_memo_lock = threading.Lock()
+
+
+def _memoized(snapshot, key, build):
+    """build() once per catalog snapshot and key; a new snapshot starts an empty memo"""
+    global _snapshot_memo
+    with _memo_lock:
+        cached_snapshot, memo = _snapshot_memo
+        if cached_snapshot is not snapshot:
+            memo = OrderedDict()
+            _snapshot_memo = (snapshot, memo)
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+    # Built outside the lock; two threads may both build the same value, which is harmless
+    value = build()
+    with _memo_lock:
+        if _snapshot_memo[0] is snapshot:
+            memo[key] = value
+            while len(memo) > SNAPSHOT_MEMO_MAX_ENTRIES:
+                memo.popitem(last=False)
+    return value
+
+
+def _nutrient_matrix(snapshot) -> np.ndarray:
+    """calories/protein/fat/carbohydrates per serving as one float matrix, built once per snapshot"""
+    def build():
+        columns = snapshot.columns
+        return np.column_stack([
+            np.asarray(columns[column], dtype=float) if column in columns else np.full(len(snapshot), np.nan)
+            for column in NUTRIENTS
+        ])
+    return _memoized(snapshot, "nutrients", build)
+
+
+def _slot_queries(slot: str) -> list:
+    return SLOT_QUERIES.get(slot) or SLOT_QUERIES["Snack"]
+
+
+def _diet_key(diet: str) -> str:
+    return (diet or "").strip().lower()
+
+
+def supports_diet(diet: str) -> bool:
+    """Whether plan_meals can honour this diet preference"""
+    key = _diet_key(diet)
+    return key in UNRESTRICTED_DIETS or key in DIET_EXCLUSIONS
+
+
+@lru_cache(maxsize=None)
+def _diet_pattern(diet_key: str):
+    """(safe phrases, excluded words) regexes for a diet, or None if it excludes nothing"""
+    words = DIET_EXCLUSIONS.get(diet_key)
+    if not words:
+        return None
+    safe = "|".join(re.escape(phrase) for phrase in sorted(DIET_SAFE_PHRASES, key=len, reverse=True))
+    banned = "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    return rf"\b(?:{safe})\b", rf"\b(?:{banned})(?:e?s)?\b"
+
+
+def _text_column(snapshot, column: str) -> pd.Series:
+    """One catalog column decoded for this call (the snapshot keeps text in the shared mapping)"""
+    return pd.Series(snapshot.columns[column].tolist(), dtype=object)
+
+
+def _normalized_foods(foods_to_avoid: list) -> tuple:
+    return tuple(sorted({str(food).strip().lower() for food in foods_to_avoid or [] if str(food).strip()}))
+
+
+def _diet_mask(snapshot, diet: str, foods_to_avoid: list) -> np.ndarray:
+    """
+    Recipes that fit the diet and contain none of the foods to avoid. The
+    regexes scan the whole catalog, so the mask is memoized per snapshot,
+    diet and set of foods.
+    """
+    diet_key = _diet_key(diet)
+    foods = _normalized_foods(foods_to_avoid)
+
+    def build():
+        mask = np.ones(len(snapshot), dtype=bool)
+        pattern = _diet_pattern(diet_key)
+        if pattern is None and not foods:
+            return mask
+        text = _text_column(snapshot, "name").fillna("").astype(str).str.lower()
+        if "ingredients" in snapshot.columns:
+            text = text + " " + _text_column(snapshot, "ingredients").astype(str).str.lower()
+        if pattern is not None:
+            safe, banned = pattern
+            mask &= ~text.str.replace(safe, " ", regex=True).str.contains(banned, regex=True).to_numpy()
+        # Foods to avoid are often allergies, so they still match anywhere ("nut" rules out "walnut")
+        for food in foods:
+            mask &= ~text.str.contains(food, regex=False).to_numpy()
+        return mask
+
+    return _memoized(snapshot, ("diet", diet_key, foods), build)
+
+
+def _slot_matches(snapshot, slot: str) -> np.ndarray:
+    """Row positions the slot's recipe searches match (the queries are fixed, so once per snapshot)"""
+    def build():
+        matches = snapshot.search_index("name").search_many(
+            _slot_queries(slot), threshold=SEARCH_THRESHOLD, limit=CANDIDATES_PER_QUERY
+        )
+        return np.unique(np.array([idx for found in matches for idx in found], dtype=np.int64))
+    return _memoized(snapshot, ("slot", tuple(_slot_queries(slot))), build)
+
+
+def _without_names(snapshot, pool: np.ndarray, exclude_names: set) -> np.ndarray:
+    """Drop recipes named in exclude_names (lowercase); only the pool's names are decoded"""
+    if not exclude_names or not len(pool):
+        return pool
+    names = snapshot.columns["name"]
+    keep = [str(names[idx] or "").lower() not in exclude_names for idx in pool.tolist()]
+    return pool[np.array(keep, dtype=bool)]
+
+
+def _candidate_pools(snapshot, slots: list, diet_mask: np.ndarray, nutrients: np.ndarray,
+                     exclude_names: list = None, exclude_ids: list = None) -> dict:
+    """Row positions worth considering for each slot: search matches that pass the filters"""
+    valid = diet_mask & np.isfinite(nutrients).all(axis=1) & (nutrients[:, 0] > 0)
+    if exclude_ids and "id" in snapshot.columns:
+        valid &= ~np.isin(snapshot.columns["id"], exclude_ids)
+    excluded_names = {str(name).lower() for name in exclude_names or []}
+    partition = recipe_partition.get()
+    in_partition = None
+    if partition is not None and "id" in snapshot.columns:
+        slot_number, partitions = partition
+        in_partition = np.asarray(snapshot.columns["id"]) % partitions == slot_number
+
+    pools = {}
+    for slot in slots:
+        pool = _slot_matches(snapshot, slot)
+        pool = _without_names(snapshot, pool[valid[pool]], excluded_names) if len(pool) else pool
+        if not len(pool):
+            # Nothing named like this meal: fall back to any recipe that passes the filters
+            pool = _without_names(snapshot, np.flatnonzero(valid), excluded_names)
+        if in_partition is not None and in_partition[pool].any():
+            pool = pool[in_partition[pool]]
+        pools[slot] = pool
+    return pools
+
+
+def _fit_servings(per_serving: np.ndarray, slot_target: np.ndarray, weights: np.ndarray):
+    """
+    Best servings for every candidate of one slot at once (weighted least squares
+    in one variable), clipped to the allowed range. Returns (servings, error).
+    """
+    numerator = (per_serving * weights * slot_target).sum(axis=1)
+    denominator = (per_serving * per_serving * weights).sum(axis=1)
+    servings = np.divide(numerator, denominator, out=np.ones(len(per_serving)), where=denominator > 0)
+    servings = np.clip(servings, MIN_SERVINGS, MAX_SERVINGS)
+    error = (weights * (servings[:, None] * per_serving - slot_target) ** 2).sum(axis=1)
+    return servings, error
+
+
+def _round_servings(servings: np.ndarray) -> np.ndarray:
+    rounded = np.round(servings / SERVING_STEP) * SERVING_STEP
+    return np.clip(rounded, MIN_SERVINGS, MAX_SERVINGS)
+
+
+def _solve_combination(per_serving: np.ndarray, shares: np.ndarray, weights: np.ndarray):
+    """
+    Servings for one recipe per slot that fit the daily targets while keeping each
+    meal near its share of the calories. per_serving is (slots, nutrients), scaled
+    so the daily target is 1 for every nutrient. Returns (servings, error).
+    """
+    sqrt_weights = np.sqrt(weights)
+    # Daily totals: sum_s x_s * per_serving[s] ~= 1 for each nutrient
+    totals_rows = (per_serving * sqrt_weights).T
+    totals_target = sqrt_weights
+    # Distribution: x_s * calories[s] ~= share_s
+    distribution_rows = np.diag(per_serving[:, 0]) * np.sqrt(DISTRIBUTION_WEIGHT)
+    distribution_target = shares * np.sqrt(DISTRIBUTION_WEIGHT)
+
+    system = np.vstack([totals_rows, distribution_rows])
+    target = np.concatenate([totals_target, distribution_target])
+    servings = np.linalg.lstsq(system, target, rcond=None)[0]
+    servings = _round_servings(np.clip(servings, MIN_SERVINGS, MAX_SERVINGS))
+    error = float(((system @ servings - target) ** 2).sum())
+    return servings, error
+
+
+def plan_meals(daily_targets: dict, diet: str = "balanced", foods_to_avoid: list = None,
+               exclude_recipe_names: list = None, exclude_recipe_ids: list = None,
+               distribution: dict = None) -> dict:
+    """
+    Pick one recipe and a serving size per meal so the day matches the
+    targets as closely as possible, without the LLM.
+
+    1. Candidate recipes per meal come from the recipe search index, filtered
+       by diet, foods to avoid and recipes to exclude.
+    2. Every candidate gets its best serving size for its meal's share of the
+       targets in one vectorized least-squares pass; the best fits per meal
+       are shortlisted.
+    3. Coordinate descent over the shortlist: one meal at a time is swapped for
+       the alternative that lowers the error of the whole day, re-solving all
+       servings jointly, until no swap helps.
+
+    Args:
+        daily_targets: Dict with calories, protein, fat, carbs
+        diet: Diet preference: "vegetarian", "vegan", "pescatarian", or "balanced" (no restriction).
+              Other diets raise ValueError (see supports_diet)
+        foods_to_avoid: Words that exclude a recipe when found in its name or ingredients
+        exclude_recipe_names: Recipes not to use (e.g. already used earlier in the week)
+        exclude_recipe_ids: Recipe ids not to use
+        distribution: Share of calories per meal, defaults to DEFAULT_DISTRIBUTION
+
+    Returns:
+        Dict with "meal_plan" in the same format the agent produces, plus "fit"
+    """
+    if not supports_diet(diet):
+        raise ValueError(
+            f"The meal solver can't honour the '{diet}' diet "
+            f"(supported: {', '.join(sorted(DIET_EXCLUSIONS))}, or no restriction)"
+        )
+    distribution = distribution or DEFAULT_DISTRIBUTION
+    slots = list(distribution)
+    shares = np.array([float(distribution[slot]) for slot in slots])
+    shares = shares / shares.sum()
+    target = np.array([float(daily_targets[key]) for key in TARGET_KEYS])
+    # A zero or missing target (e.g. carbs on some diets) isn't scored
+    weights = np.where(target > 0, NUTRIENT_WEIGHTS, 0.0)
+    scale = np.where(target > 0, target, 1.0)
+
+    snapshot = recipe_cache.get()
+    nutrients = _nutrient_matrix(snapshot)
+    pools = _candidate_pools(snapshot, slots, _diet_mask(snapshot, diet, foods_to_avoid), nutrients,
+                             exclude_recipe_names, exclude_recipe_ids)
+
+    scaled = nutrients / scale
+    shortlists = {}
+    for slot, share in zip(slots, shares):
+        pool = pools[slot]
+        if not len(pool):
+            raise ValueError(f"No recipes available for {slot} with the given filters")
+        _, error = _fit_servings(scaled[pool], share * (target > 0), weights)
+        shortlists[slot] = pool[np.argsort(error, kind="stable")[:SHORTLIST_SIZE]].tolist()
+
+    # Start from the best single-meal fit of each slot, without repeating a recipe
+    chosen = []
+    for slot in slots:
+        options = [idx for idx in shortlists[slot] if idx not in chosen] or shortlists[slot]
+        chosen.append(options[0])
+    servings, best_error = _solve_combination(scaled[chosen], shares, weights)
+
+    for _ in range(MAX_DESCENT_ROUNDS):
+        improved = False
+        for position, slot in enumerate(slots):
+            for idx in shortlists[slot]:
+                if idx in chosen:
+                    continue
+                trial = chosen[:position] + [idx] + chosen[position + 1:]
+                trial_servings, error = _solve_combination(scaled[trial], shares, weights)
+                if error < best_error - 1e-9:
+                    chosen, servings, best_error = trial, trial_servings, error
+                    improved = True
+        if not improved:
+            break
+
+    return _build_meal_plan(snapshot.columns, nutrients, slots, shares, chosen, servings, target)
+
+
+def _build_meal_plan(columns, nutrients, slots, shares, chosen, servings, target) -> dict:
+    meal_plan = {
+        "distribution": {
+            "breakfast_percent": _percent(shares, slots, "Breakfast"),
+            "lunch_percent": _percent(shares, slots, "Lunch"),
+            "dinner_percent": _percent(shares, slots, "Dinner"),
+            "snacks_percent": str(round(sum(
+                share for slot, share in zip(slots, shares) if slot.startswith("Snack")
+            ) * 100, 1)).removesuffix(".0"),
+        }
+    }
+    totals = np.zeros(len(NUTRIENTS))
+    for slot, share, idx, amount in zip(slots, shares, chosen, servings):
+        per_serving = nutrients[idx]
+        total = per_serving * amount
+        totals += total
+        recipe_id = columns["id"][idx] if "id" in columns else None
+        meal_plan[slot] = {
+            "target_calories": round(float(target[0] * share)),
+            "recipe_id": int(recipe_id) if recipe_id is not None else None,
+            "recipe_name": str(columns["name"][idx]),
+            "servings": float(amount),
+            "nutritional_info_per_serving": {
+                name: round(float(value), 1) for name, value in zip(NUTRIENTS, per_serving)
+            },
+            "total_nutrition": {
+                name: round(float(value), 1) for name, value in zip(NUTRIENTS, total)
+            },
+        }
+    meal_plan["Daily Totals"] = {
+        f"total_{name}": round(float(value), 1) for name, value in zip(NUTRIENTS, totals)
+    }
+
+    fit = {
+        name: round(float((total - goal) / goal * 100), 1) if goal > 0 else None
+        for name, total, goal in zip(NUTRIENTS, totals, target)
+    }
+    return {"meal_plan": meal_plan, "fit": {"percent_off_target": fit}}
+
+
+def _percent(shares, slots, slot: str) -> str:
+    if slot not in slots:
+        return "0"
+    return str(round(float(shares[slots.index(slot)]) * 100, 1)).removesuffix(".0")
+
+
+def solve_meal_plan(calories: float, protein: float, fat: float, carbs: float, diet: str = "balanced",
+                    foods_to_avoid: list = None, exclude_recipe_names: list = None) -> str:
+    """
+    Builds a complete one-day meal plan (Breakfast, Lunch, Dinner, Snack 1) in a single step:
+    picks recipes and decimal serving sizes that best match the daily calorie and macro targets,
+    using the 20% / 32.5% / 32.5% / 15% calorie split.
+
+    Args:
+        calories: Daily calorie target
+        protein: Daily protein target in grams
+        fat: Daily fat target in grams
+        carbs: Daily carbohydrate target in grams
+        diet: Diet preference: "balanced", "vegetarian", "vegan" or "pescatarian" (other diets
+              are not supported; pick recipes with fuzzy_search_rows instead)
+        foods_to_avoid: Foods that must not appear in the recipes
+        exclude_recipe_names: Recipe names not to use (e.g. already used this week)
+
+    Returns:
+        JSON string with the meal_plan (recipe_id, recipe_name, servings and nutrition per meal,
+        Daily Totals) and the percent each daily total is off target
+    """
+    try:
+        result = plan_meals(
+            {"calories": calories, "protein": protein, "fat": fat, "carbs": carbs},
+            diet=diet,
+            foods_to_avoid=foods_to_avoid,
+            exclude_recipe_names=exclude_recipe_names,
+        )
+        return json.dumps({"success": True, **result})
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "error": str(e)
+        })
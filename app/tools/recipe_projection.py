@@ -0,0 +1,84 @@
+import os
+import json
+import math
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fields the prompts use from a recipe search result; everything else is left out
+RECIPE_RESULT_FIELDS = ["id", "name", "calories", "protein", "fat", "carbohydrates", "sodium"]
+# "records": [{"id": 1, "name": ...}, ...]
+# "table":   {"columns": ["id", "name", ...], "rows": [[1, ...], ...]} (field names sent once)
+RECIPE_RESULT_FORMAT = os.getenv("RECIPE_RESULT_FORMAT", "records")
+RESULT_FORMATS = ("records", "table")
+
+
+def _encode_values(values) -> list:
+    """JSON text for each value of a column slice (NaN, infinities and None become null)"""
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind in "iu":
+            return [str(value) for value in values.tolist()]
+        if values.dtype.kind == "b":
+            return ["true" if value else "false" for value in values.tolist()]
+        if values.dtype.kind == "f":
+            return [repr(value) if math.isfinite(value) else "null" for value in values.tolist()]
+        values = values.tolist()
+    return [
+        "null" if value is None or (isinstance(value, float) and not math.isfinite(value))
+        else json.dumps(value, default=str)
+        for value in values
+    ]
+
+
+class RecipeProjection:
+    """
+    The RECIPE_RESULT_FIELDS columns of one catalog snapshot, kept as arrays
+    (numeric ones stay views of the shared memory map).
+
+    Result JSON is assembled column by column from these arrays for the
+    matched rows only, so no DataFrame slice or per-row dict is built.
+    """
+
+    def __init__(self, columns: dict, fields: list = RECIPE_RESULT_FIELDS):
+        # columns: name -> values by row position (RecipeSnapshot.columns); text
+        # columns stay lazy sequences, so only the projected rows are decoded
+        self.fields = [field for field in fields if field in columns]
+        self._columns = [columns[field] for field in self.fields]
+        self._keys = [json.dumps(field) + ": " for field in self.fields]
+        self._header = json.dumps(self.fields)
+
+    def __len__(self):
+        return len(self._columns[0]) if self._columns else 0
+
+    def _encoded_rows(self, indices: list):
+        if isinstance(indices, np.ndarray):
+            indices = indices.tolist()
+        encoded = []
+        for column in self._columns:
+            if isinstance(column, np.ndarray):
+                encoded.append(_encode_values(column[indices]))
+            else:
+                encoded.append(_encode_values([column[idx] for idx in indices]))
+        return zip(*encoded)
+
+    def records(self, indices: list) -> str:
+        """JSON array with one object per row"""
+        rows = (
+            "{" + ", ".join(key + value for key, value in zip(self._keys, row)) + "}"
+            for row in self._encoded_rows(indices)
+        )
+        return "[" + ", ".join(rows) + "]"
+
+    def table(self, indices: list) -> str:
+        """JSON object with the field names once and one array per row"""
+        rows = ("[" + ", ".join(row) + "]" for row in self._encoded_rows(indices))
+        return '{"columns": ' + self._header + ', "rows": [' + ", ".join(rows) + "]}"
+
+    def encode(self, indices: list, result_format: str = None) -> str:
+        result_format = result_format or RECIPE_RESULT_FORMAT
+        if result_format == "records":
+            return self.records(indices)
+        if result_format == "table":
+            return self.table(indices)
+        raise ValueError(f"Unknown recipe result format '{result_format}'. Use one of {RESULT_FORMATS}.")
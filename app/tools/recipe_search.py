@@ -0,0 +1,252 @@
+import heapq
+import bisect
+import numpy as np
+from fuzzywuzzy import fuzz, utils
+from rapidfuzz import fuzz as rapid_fuzz
+from rapidfuzz import process as rapid_process
+
+# Character buckets for the histogram bound: a-z, 0-9, '_', ' ', everything else
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_ "
+_BUCKETS = len(_ALPHABET) + 1
+_CHAR_LOOKUP = np.full(256, len(_ALPHABET), dtype=np.intp)
+for _bucket, _char in enumerate(_ALPHABET):
+    _CHAR_LOOKUP[ord(_char)] = _bucket
+
+
+def _process(value):
+    """Same normalisation process.extract applies before token_set_ratio; None for a missing value"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return utils.full_process(str(value), force_ascii=True)
+
+
+def _char_histogram(text: str) -> np.ndarray:
+    codes = np.frombuffer(text.encode("ascii", "replace"), dtype=np.uint8)
+    return np.bincount(_CHAR_LOOKUP[codes], minlength=_BUCKETS)
+
+
+class _CSRPostings:
+    """
+    token -> record indices, read straight from to_arrays() output: the
+    sorted vocabulary is binary-searched on each lookup, so a memory-mapped
+    index needs no per-process dict of every token.
+    """
+
+    def __init__(self, vocabulary, offsets: np.ndarray, ids: np.ndarray):
+        self.vocabulary = vocabulary  # sorted sequence of str (e.g. MappedText)
+        self.offsets = offsets
+        self.ids = ids
+
+    def get(self, token: str, default=None):
+        position = bisect.bisect_left(self.vocabulary, token)
+        if position == len(self.vocabulary) or self.vocabulary[position] != token:
+            return default
+        return self.ids[self.offsets[position]:self.offsets[position + 1]]
+
+    def __getitem__(self, token: str):
+        postings = self.get(token)
+        if postings is None:
+            raise KeyError(token)
+        return postings
+
+    def __iter__(self):
+        return iter(self.vocabulary)
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+
+class RecipeSearchIndex:
+    """
+    Search index over one text column of the recipe catalog, built once and
+    reused for every fuzzy_search_rows call.
+
+    Returns the same rows, in the same order, as
+
+        process.extract(query, column, scorer=fuzz.token_set_ratio, limit=len(column))
+
+    filtered to score >= threshold, but only scores records that can reach
+    the threshold:
+
+    - records sharing a token with the query come from token postings;
+    - records sharing no token score ratio(sorted query tokens, sorted record
+      tokens), which is bounded by the overlap of their character histograms,
+      so only records whose bound reaches the threshold are scored.
+
+    Candidates are scored in catalog order into a top-k heap, which stops
+    as soon as it holds k perfect scores.
+
+    Missing values are kept as None and score 0, like the None check on
+    fuzzywuzzy's scorers, so they never match an empty query.
+    """
+
+    def __init__(self, values):
+        processed = [_process(value) for value in values]
+
+        postings = {}
+        for idx, text in enumerate(processed):
+            for token in set((text or "").split()):
+                postings.setdefault(token, []).append(idx)
+
+        sorted_token_strings = [" ".join(sorted(set((text or "").split()))) for text in processed]
+        lengths = np.array([len(text) for text in sorted_token_strings], dtype=np.int32)
+        histograms = np.zeros((len(processed), _BUCKETS), dtype=np.uint16)
+        for idx, text in enumerate(sorted_token_strings):
+            if text:
+                histograms[idx] = _char_histogram(text)
+
+        self._setup(
+            processed,
+            {token: np.array(ids, dtype=np.int32) for token, ids in postings.items()},
+            lengths,
+            histograms
+        )
+
+    def _setup(self, processed, postings, lengths: np.ndarray, histograms: np.ndarray):
+        self.processed = processed  # list of str, or any sequence that decodes on access
+        self.postings = postings  # token -> sorted int32 array of record indices (dict or _CSRPostings)
+        self.lengths = lengths
+        self.histograms = histograms
+
+    @classmethod
+    def from_arrays(cls, processed, vocabulary, offsets: np.ndarray, ids: np.ndarray,
+                    lengths: np.ndarray, histograms: np.ndarray) -> "RecipeSearchIndex":
+        """
+        Rebuild an index from to_arrays() output. The arrays may be read-only
+        memory maps, and processed / vocabulary any sequences of str that
+        decode on access; nothing is copied into the process.
+        """
+        index = cls.__new__(cls)
+        index._setup(processed, _CSRPostings(vocabulary, offsets, ids), lengths, histograms)
+        return index
+
+    def to_arrays(self) -> dict:
+        """Flat arrays for persisting the index; postings are stored CSR-style"""
+        vocabulary = sorted(self.postings)
+        sizes = [len(self.postings[token]) for token in vocabulary]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        ids = np.concatenate([self.postings[token] for token in vocabulary]) if vocabulary \
+            else np.zeros(0, dtype=np.int32)
+        return {
+            "processed": list(self.processed),
+            "vocabulary": vocabulary,
+            "offsets": offsets,
+            "ids": ids.astype(np.int32),
+            "lengths": self.lengths,
+            "histograms": self.histograms,
+        }
+
+    def __len__(self):
+        return len(self.processed)
+
+    def _all_processed(self) -> list:
+        # A mapped index is decoded for this call only, so workers don't each keep a copy
+        return self.processed if isinstance(self.processed, list) else self.processed.tolist()
+
+    def _empty_query_scores(self) -> np.ndarray:
+        """
+        Scores for a query that processes to "": fuzzywuzzy gives 100 to
+        records that also process to "" and 0 to the rest (missing ones too).
+        """
+        return np.array([100 if text == "" else 0 for text in self._all_processed()], dtype=np.int16)
+
+    @staticmethod
+    def _ranked(scores: np.ndarray, threshold: int, limit: int) -> list:
+        # Stable sort keeps equal scores in catalog order, as process.extract does
+        order = np.argsort(-scores, kind="stable")
+        order = order[scores[order] >= threshold]
+        return order[:limit].tolist()
+
+    def _candidates(self, query_tokens: frozenset, threshold: int):
+        """Return (sorted candidate indices, set of indices known to score 100)"""
+        shared = set()
+        for token in query_tokens:
+            postings = self.postings.get(token)
+            if postings is not None:
+                shared.update(postings.tolist())
+
+        # Query tokens all in the record, or record tokens all in the query
+        perfect = set()
+        for idx in shared:
+            record_tokens = frozenset(self.processed[idx].split())
+            if query_tokens <= record_tokens or record_tokens <= query_tokens:
+                perfect.add(idx)
+
+        # Upper bound on ratio() for records sharing no token:
+        # LCS <= sum over characters of min(count in query, count in record)
+        query_text = " ".join(sorted(query_tokens))
+        common = np.minimum(self.histograms, _char_histogram(query_text)).sum(axis=1)
+        totals = self.lengths + len(query_text)
+        bound = np.divide(200.0 * common, totals, out=np.zeros(len(totals)), where=totals > 0)
+        # fuzzywuzzy rounds scores, so anything within 0.5 of the threshold may still pass
+        reachable = np.flatnonzero(bound >= threshold - 0.5)
+
+        candidates = shared.union(reachable.tolist())
+        return sorted(candidates), perfect
+
+    def search(self, query: str, threshold: int = 85, limit: int = 15) -> list:
+        """Indices of the best `limit` records scoring >= threshold, best first (ties in catalog order)"""
+        if limit <= 0:
+            return []
+        processed_query = _process(query) or ""
+        query_tokens = frozenset(processed_query.split())
+
+        if not query_tokens:
+            return self._ranked(self._empty_query_scores(), threshold, limit)
+        if threshold <= 0:
+            # Every record qualifies, so score them all
+            candidates, perfect = range(len(self)), set()
+        else:
+            candidates, perfect = self._candidates(query_tokens, threshold)
+
+        heap = []  # min-heap of (score, -idx): the worst kept result is on top
+        for idx in candidates:
+            if idx in perfect:
+                score = 100
+            else:
+                text = self.processed[idx]
+                score = 0 if text is None else fuzz.token_set_ratio(processed_query, text, full_process=False)
+            if score < threshold:
+                continue
+
+            entry = (score, -idx)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+            # Later candidates have larger indices, so they cannot displace a full heap of 100s
+            if len(heap) == limit and heap[0][0] == 100:
+                break
+
+        return [-neg_idx for score, neg_idx in sorted(heap, reverse=True)]
+
+    def score_matrix(self, queries: list) -> np.ndarray:
+        """
+        Score every query against every record in one batched pass.
+
+        Returns a (len(queries), len(self)) matrix of token_set_ratio scores,
+        rounded to integers like fuzzywuzzy. rapidfuzz computes it in C with
+        the GIL released, spread over all cores. Queries that process to ""
+        get the same scores as in search().
+        """
+        processed_queries = [_process(query) or "" for query in queries]
+        # Missing records become "", which rapidfuzz scores 0 against any non-empty query
+        choices = [text or "" for text in self._all_processed()]
+        scores = np.rint(rapid_process.cdist(
+            processed_queries,
+            choices,
+            scorer=rapid_fuzz.token_set_ratio,
+            workers=-1,
+        )).astype(np.int16)
+        empty = [row for row, text in enumerate(processed_queries) if not text.split()]
+        if empty:
+            scores[empty] = self._empty_query_scores()
+        return scores
+
+    def search_many(self, queries: list, threshold: int = 85, limit: int = 15) -> list:
+        """Batched search(): one list of result indices per query, from a single score matrix"""
+        if limit <= 0:
+            return [[] for _ in queries]
+        return [self._ranked(row, threshold, limit) for row in self.score_matrix(queries)]
@@ -0,0 +1,138 @@
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from app.services.recipe_cache import recipe_cache
+from app.tools.database_tools import recipe_partition
+
+load_dotenv()
+
+# Set to "false" to run every tool call
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+# How long a catalog read (recipe search, meal solver) is reused
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+# Results kept per tool
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+
+
+def _catalog_context():
+    """What a catalog read depends on besides its arguments: the catalog version and the day partition"""
+    snapshot = recipe_cache.get()
+    return (snapshot.key, str(snapshot.version), recipe_partition.get())
+
+
+def succeeded(result) -> bool:
+    """Whether a tool result reports success. Failed calls are never cached, so a transient error isn't replayed"""
+    if isinstance(result, dict):
+        return result.get("success") is not False
+    if isinstance(result, str):
+        return not result.lstrip().startswith('{"success": false')
+    return True
+
+
+class CachePolicy:
+    """
+    How results of one tool are reused.
+
+    ttl_seconds=None keeps entries until they are evicted (pure functions);
+    context, if given, is called on every lookup and becomes part of the key,
+    so results computed against older inputs (e.g. catalog version) stop matching.
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = TOOL_CACHE_MAX_ENTRIES, context=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.context = context
+
+
+class ToolResultCache:
+    """
+    Memoizes tool calls made by the agent, per process and across sessions.
+
+    Only tools with a policy are cached; writes (save_meal_plan) and reads of
+    user data that writes change (get_current_meal_plan,
+    get_previous_recipes_in_week) have none and always run. Keys are the tool
+    name, its arguments and the policy's context. Hit and miss counters per
+    tool are available from stats().
+    """
+
+    def __init__(self, policies: dict, enabled: bool = TOOL_CACHE_ENABLED):
+        self.policies = policies
+        self.enabled = enabled
+        self._entries = {name: OrderedDict() for name in policies}  # tool -> key -> (stored_at, result)
+        self._hits = {name: 0 for name in policies}
+        self._misses = {name: 0 for name in policies}
+        self._lock = threading.Lock()
+
+    def _key(self, policy: CachePolicy, function_args: dict):
+        """Cache key, or None if the call can't be keyed (it then simply runs)"""
+        try:
+            args = json.dumps(function_args, sort_keys=True, default=str)
+            return (args, policy.context() if policy.context else None)
+        except Exception:
+            return None
+
+    def call(self, function_name: str, function, function_args: dict):
+        """Result of function(**function_args), from the cache when allowed"""
+        policy = self.policies.get(function_name)
+        if not self.enabled or policy is None:
+            return function(**function_args)
+        key = self._key(policy, function_args)
+        if key is None:
+            return function(**function_args)
+
+        with self._lock:
+            entries = self._entries[function_name]
+            entry = entries.get(key)
+            if entry is not None and policy.ttl_seconds is not None \
+                    and time.monotonic() - entry[0] > policy.ttl_seconds:
+                del entries[key]
+                entry = None
+            if entry is not None:
+                entries.move_to_end(key, last=True)
+                self._hits[function_name] += 1
+            else:
+                self._misses[function_name] += 1
+        if entry is not None:
+            # Strings are immutable; anything else is copied so callers can't change the cached value
+            return entry[1] if isinstance(entry[1], str) else copy.deepcopy(entry[1])
+
+        result = function(**function_args)
+        if succeeded(result):
+            stored = result if isinstance(result, str) else copy.deepcopy(result)
+            with self._lock:
+                entries = self._entries[function_name]
+                entries[key] = (time.monotonic(), stored)
+                entries.move_to_end(key, last=True)
+                while len(entries) > policy.max_entries:
+                    entries.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        """Hits, misses and size per cached tool"""
+        with self._lock:
+            return {
+                name: {
+                    "hits": self._hits[name],
+                    "misses": self._misses[name],
+                    "entries": len(self._entries[name]),
+                }
+                for name in self.policies
+            }
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+
+
+tool_cache = ToolResultCache({
+    # Pure: the same expression always gives the same result
+    "calculate": CachePolicy(),
+    # Catalog reads: reused while the catalog version and day partition are unchanged
+    "fuzzy_search_rows": CachePolicy(ttl_seconds=TOOL_CACHE_TTL_SECONDS, context=_catalog_context),
+    "solve_meal_plan": CachePolicy(ttl_seconds=TOOL_CACHE_TTL_SECONDS, context=_catalog_context),
+})
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Dish names per category; they contain the words the prompts and the meal solver search for
+DISHES = {
+    "breakfast": ["Omelette", "Pancakes", "Oatmeal", "Scrambled Eggs", "Yogurt Parfait", "Berry Smoothie",
+                  "Avocado Toast", "Breakfast Burrito", "Chia Pudding", "French Toast"],
+    "lunch": ["Chicken Salad", "Quinoa Bowl", "Turkey Wrap", "Chicken Rice Bowl", "Tuna Sandwich",
+              "Lentil Salad", "Falafel Wrap", "Poke Bowl", "Caesar Salad", "Veggie Sandwich"],
+    "dinner": ["Baked Salmon", "Beef Stir Fry", "Chicken Curry", "Pasta Primavera", "Fish Tacos",
+               "Tofu Stir Fry", "Beef Chili", "Shrimp Pasta", "Lamb Kofta", "Stuffed Peppers"],
+    "snack": ["Protein Bar", "Yogurt Cup", "Mixed Nuts", "Hummus Plate", "Protein Shake", "Fruit Smoothie",
+              "Trail Mix", "Rice Cakes", "Energy Balls", "Cottage Cheese Bowl"],
+}
+STYLES = ["Classic", "Spicy", "Herbed", "Lemon", "Garlic", "Smoky", "Mediterranean", "Thai", "Mexican", "Honey"]
+SIDES = ["", " with Spinach", " with Avocado", " with Quinoa", " with Berries", " with Feta",
+         " with Sweet Potato", " with Kale", " with Chickpeas", " with Mushrooms"]
+# Calories per serving drawn for each category
+CALORIE_RANGES = {
+    "breakfast": (250, 450),
+    "lunch": (400, 700),
+    "dinner": (450, 750),
+    "snack": (120, 300),
+}
+
+
+def synthetic_recipes(count: int = 2000, seed: int = 7) -> list:
+    """
+    Rows for the recipes table: id, name, category, per-serving calories,
+    protein, fat, carbohydrates and sodium, ingredients, instructions and
+    updated_at. The same count and seed always give the same rows.
+    """
+    rng = random.Random(seed)
+    categories = list(DISHES)
+    updated_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for number in range(count):
+        category = categories[number % len(categories)]
+        dish = DISHES[category][(number // len(categories)) % len(DISHES[category])]
+        style = STYLES[(number // 40) % len(STYLES)]
+        side = SIDES[(number // 400) % len(SIDES)]
+        name = f"{style} {dish}{side}"
+        if number >= 4000:
+            name = f"{name} ({number // 4000 + 1})"
+
+        calories = round(rng.uniform(*CALORIE_RANGES[category]))
+        protein_share = rng.uniform(0.15, 0.35)
+        fat_share = rng.uniform(0.20, 0.35)
+        rows.append({
+            "id": number + 1,
+            "name": name,
+            "category": category,
+            "calories": calories,
+            "protein": round(calories * protein_share / 4, 1),
+            "fat": round(calories * fat_share / 9, 1),
+            "carbohydrates": round(calories * (1 - protein_share - fat_share) / 4, 1),
+            "sodium": round(rng.uniform(80, 900)),
+            "ingredients": ", ".join(word.lower() for word in f"{style} {dish}{side}".replace(" with ", " ").split()),
+            "instructions": f"Prepare the {dish.lower()}, season it {style.lower()} style and serve{side.lower()}.",
+            "updated_at": (updated_at + timedelta(seconds=number)).isoformat(),
+        })
+    return rows
+
+
+def recipes_by_category(recipes: list) -> dict:
+    """category -> its recipes"""
+    grouped = {category: [] for category in DISHES}
+    for recipe in recipes:
+        grouped[recipe["category"]].append(recipe)
+    return grouped
@@ -0,0 +1,245 @@
+import re
+import json
+import zlib
+import random
+import asyncio
+import threading
+from types import SimpleNamespace
+from google.genai import types
+from benchmarks.latency import Latency
+from benchmarks.catalog import recipes_by_category
+
+# meal_plan key -> (recipe category, share of the daily calories)
+MEAL_SLOTS = {
+    "Breakfast": ("breakfast", 0.20),
+    "Lunch": ("lunch", 0.325),
+    "Dinner": ("dinner", 0.325),
+    "Snack 1": ("snack", 0.15),
+}
+# Extra search turns look for these (see AgentScript.search_turns)
+FOLLOW_UP_QUERIES = [
+    ["oatmeal", "chicken salad", "salmon", "protein bar"],
+    ["omelette", "quinoa bowl", "beef stir fry", "hummus"],
+    ["smoothie", "turkey wrap", "chicken curry", "yogurt"],
+]
+# Synthetic token counts reported in usage_metadata
+PROMPT_TOKENS_BASE = 1500
+PROMPT_TOKENS_PER_MESSAGE = 400
+
+
+class AgentScript:
+    """
+    The function calls the fake model makes, one step per model turn:
+
+        preview (/plans/generate_meal_plan):  calculate, fuzzy_search_rows x search_turns, save_meal_plan, answer
+        weekly day:  get_previous_recipes_in_week, calculate, fuzzy_search_rows x search_turns, answer
+                     (no get_previous_recipes_in_week when the prompt says the days run concurrently)
+
+    The step is the number of model turns already in the conversation, so
+    the fake keeps no per-session state and sessions can run concurrently.
+    weekly_answer="json" ends a weekly day with the meal_plan JSON in the
+    text; "prose" ends it without, so the agent asks for the JSON-mode
+    structured turn.
+    """
+
+    def __init__(self, search_turns: int = 1, weekly_answer: str = "json"):
+        if weekly_answer not in ("json", "prose"):
+            raise ValueError(f"weekly_answer must be 'json' or 'prose', got {weekly_answer!r}")
+        self.search_turns = max(1, search_turns)
+        self.weekly_answer = weekly_answer
+        self.preview = ["calculate", *["search"] * self.search_turns, "save", "answer"]
+        self.weekly = ["previous", "calculate", *["search"] * self.search_turns, "answer"]
+
+    def step(self, session, model_turns: int) -> str:
+        steps = self.weekly if session.weekly else self.preview
+        if session.weekly and not session.checks_previous:
+            steps = steps[1:]
+        return steps[min(model_turns, len(steps) - 1)]
+
+
+class _Session:
+    """What the fake needs from an agent prompt: targets, user or weekly plan id, and a seed"""
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.seed = zlib.crc32(prompt.encode("utf-8"))
+        weekly = re.search(r"weekly_plan_id: (\d+)", prompt)
+        self.weekly = weekly is not None
+        self.weekly_plan_id = int(weekly.group(1)) if weekly else None
+        self.checks_previous = "Call get_previous_recipes_in_week(" in prompt
+        user = re.search(r"My user ID is: ([\w-]+)", prompt)
+        self.user_id = user.group(1) if user else None
+        self.targets = {
+            key: float(match.group(1)) if match else default
+            for key, label, default in [("calories", "Calories", 2000), ("protein", "Protein", 150),
+                                        ("fat", "Fat", 65), ("carbs", "Carbs", 200)]
+            for match in [re.search(rf"{label}: ([\d.]+)", prompt)]
+        }
+
+
+class FakeGeminiClient:
+    """
+    Deterministic stand-in for genai.Client (the async models API the agent
+    uses): scripted function calls, synthetic recipes and usage metadata,
+    and a simulated latency per model turn. Streaming returns the same turn
+    in chunks. Nothing goes over the network.
+
+    Meals are drawn from `recipes` (the synthetic catalog the fake database
+    serves), seeded by the prompt, so a session always gets the same plan.
+    """
+
+    def __init__(self, recipes: list, script: AgentScript = None, latency: Latency = None, stream_chunks: int = 4):
+        self.script = script or AgentScript()
+        self.latency = latency or Latency()
+        self.stream_chunks = max(1, stream_chunks)
+        self.turns = 0
+        self._recipes = recipes_by_category(recipes)
+        self._lock = threading.Lock()
+        self.aio = SimpleNamespace(models=_FakeModels(self))
+
+    # --- Turns ---
+
+    def _turn(self, contents: list, config) -> tuple:
+        """(response, latency key) for a model turn"""
+        with self._lock:
+            self.turns += 1
+        session = _Session(contents[0].parts[0].text)
+        model_turns = sum(1 for content in contents if content.role == "model")
+        key = f"{session.seed}:{model_turns}"
+
+        if config is not None and config.response_mime_type == "application/json":
+            # The structured final turn
+            return self._response([types.Part(text=json.dumps(self._meal_plan(session)))], contents, 600), key
+
+        step = self.script.step(session, model_turns)
+        if step == "answer":
+            return self._response([types.Part(text=self._answer(session))], contents, 700), key
+        return self._response([types.Part(function_call=self._function_call(session, step, model_turns))],
+                              contents, 80), key
+
+    def _function_call(self, session: _Session, step: str, model_turns: int) -> types.FunctionCall:
+        calories = session.targets["calories"]
+        if step == "previous":
+            return types.FunctionCall(name="get_previous_recipes_in_week",
+                                      args={"weekly_plan_id": session.weekly_plan_id})
+        if step == "calculate":
+            return types.FunctionCall(name="calculate", args={
+                "expressions": [f"{calories} * {share}" for _, share in MEAL_SLOTS.values()]
+            })
+        if step == "search":
+            search_number = model_turns - (2 if session.weekly and session.checks_previous else 1)
+            if search_number == 0:
+                queries = [meal["recipe_name"] for meal in self._meals(session).values()]
+            else:
+                queries = FOLLOW_UP_QUERIES[(search_number - 1) % len(FOLLOW_UP_QUERIES)]
+            return types.FunctionCall(name="fuzzy_search_rows", args={"queries": queries})
+        return types.FunctionCall(name="save_meal_plan", args={
+            "user_id": session.user_id,
+            "plan_data": self._meal_plan(session),
+            "user_targets": session.targets,
+        })
+
+    def _answer(self, session: _Session) -> str:
+        if not session.weekly:
+            return "Your meal plan has been saved. Enjoy your meals!"
+        if self.script.weekly_answer == "prose":
+            return "The plan for this day is ready: breakfast, lunch, dinner and a snack, all within your targets."
+        return f"Here is the plan for the day:\n```json\n{json.dumps(self._meal_plan(session), indent=2)}\n```"
+
+    # --- Plans ---
+
+    def _meals(self, session: _Session) -> dict:
+        rng = random.Random(session.seed)
+        meals = {}
+        for slot, (category, share) in MEAL_SLOTS.items():
+            recipe = rng.choice(self._recipes[category])
+            target = round(session.targets["calories"] * share)
+            servings = min(3.0, max(0.5, round(target / recipe["calories"] * 4) / 4))
+            per_serving = {nutrient: recipe[nutrient] for nutrient in ("calories", "protein", "fat", "carbohydrates")}
+            meals[slot] = {
+                "target_calories": target,
+                "recipe_name": recipe["name"],
+                "recipe_id": recipe["id"],
+                "servings": servings,
+                "nutritional_info_per_serving": per_serving,
+                "total_nutrition": {nutrient: round(value * servings, 1) for nutrient, value in per_serving.items()},
+            }
+        return meals
+
+    def _meal_plan(self, session: _Session) -> dict:
+        meals = self._meals(session)
+        totals = {
+            f"total_{nutrient}": round(sum(meal["total_nutrition"][nutrient] for meal in meals.values()), 1)
+            for nutrient in ("calories", "protein", "fat", "carbohydrates")
+        }
+        return {"meal_plan": {
+            "distribution": {"breakfast_percent": "20%", "lunch_percent": "32.5%",
+                             "dinner_percent": "32.5%", "snacks_percent": "15%"},
+            **meals,
+            "Daily Totals": totals,
+        }}
+
+    # --- Responses ---
+
+    @staticmethod
+    def _response(parts: list, contents: list, output_tokens: int, finish_reason=types.FinishReason.STOP,
+                  usage: bool = True) -> types.GenerateContentResponse:
+        prompt_tokens = PROMPT_TOKENS_BASE + PROMPT_TOKENS_PER_MESSAGE * len(contents)
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(
+                content=types.Content(role="model", parts=parts),
+                finish_reason=finish_reason,
+                index=0,
+            )],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ) if usage else None,
+        )
+
+    def _chunks(self, response: types.GenerateContentResponse, contents: list) -> list:
+        """The turn split into stream chunks; text is split, function calls come whole"""
+        part = response.candidates[0].content.parts[0]
+        if not part.text:
+            return [response]
+        size = -(-len(part.text) // self.stream_chunks)
+        pieces = [part.text[start:start + size] for start in range(0, len(part.text), size)]
+        chunks = [
+            self._response([types.Part(text=piece)], contents, 0, finish_reason=None, usage=False)
+            for piece in pieces[:-1]
+        ]
+        last = self._response([types.Part(text=pieces[-1])], contents, 0)
+        last.usage_metadata = response.usage_metadata
+        return chunks + [last]
+
+
+class _FakeModels:
+    """client.aio.models"""
+
+    def __init__(self, client: FakeGeminiClient):
+        self._client = client
+
+    async def generate_content(self, *, model: str, contents: list, config=None):
+        response, key = self._client._turn(contents, config)
+        delay = self._client.latency.seconds_for(key)
+        if delay:
+            await asyncio.sleep(delay)
+        return response
+
+    async def generate_content_stream(self, *, model: str, contents: list, config=None):
+        response, key = self._client._turn(contents, config)
+        chunks = self._client._chunks(response, contents)
+        delay = self._client.latency.seconds_for(key)
+
+        async def stream():
+            # Most of the turn passes before the first chunk, the rest between chunks
+            for number, chunk in enumerate(chunks):
+                if len(chunks) == 1:
+                    wait = delay
+                else:
+                    wait = delay * 0.6 if number == 0 else delay * 0.4 / (len(chunks) - 1)
+                if wait:
+                    await asyncio.sleep(wait)
+                yield chunk
+        return stream()
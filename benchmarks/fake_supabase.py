@@ -0,0 +1,380 @@
+import re
+import json
+import time
+import asyncio
+import threading
+from datetime import datetime, timezone
+import httpx
+from benchmarks.latency import Latency
+
+OBJECT_MEDIA_TYPE = "application/vnd.pgrst.object+json"
+# bigint columns: like PostgREST, filtering them by anything but an integer is a 400
+BIGINT_COLUMNS = {
+    "recipes": {"id"},
+    "meal_plans": {"id"},
+    "weekly_plans": {"id"},
+    "daily_plans": {"id", "weekly_plan_id", "day_of_week"},
+    "meals": {"id", "daily_plan_id", "recipe_id", "meal_order"},
+}
+# Column defaults filled in on insert (created_at is added to every table but recipes)
+DEFAULTS = {
+    "daily_plans": {"total_calories": 0, "total_protein": 0, "total_carbs": 0, "total_fat": 0},
+}
+# meals column -> daily_plans total it adds to, so the totals the read endpoints return are filled in
+DAILY_TOTALS = {
+    "actual_calories": "total_calories",
+    "actual_protein": "total_protein",
+    "actual_carbs": "total_carbs",
+    "actual_fat": "total_fat",
+}
+FILTER_OPERATORS = {"eq", "neq", "gt", "gte", "lt", "lte", "in", "is"}
+_IN_VALUE = re.compile(r'"((?:[^"\\]|\\.)*)"|([^,]+)')
+_INTEGER = re.compile(r"-?\d+")
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str, details: str = None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": code, "details": details, "hint": None, "message": message}
+
+
+def _singular(table: str) -> str:
+    return table[:-1] if table.endswith("s") else table
+
+
+def _parse_select(text: str) -> list:
+    """
+    'a,b,embed!inner(x,nested(*))' -> [("column", "a"), ("column", "b"),
+    ("embed", "embed", True, [...])]
+    """
+    text = "".join(text.split())
+
+    def parse_list(position):
+        items = []
+        while position < len(text) and text[position] != ")":
+            end = position
+            while end < len(text) and text[end] not in ",()":
+                end += 1
+            name = text[position:end]
+            if end < len(text) and text[end] == "(":
+                subfields, end = parse_list(end + 1)
+                end += 1  # the closing parenthesis
+                table, _, hint = name.partition("!")
+                items.append(("embed", table, hint == "inner", subfields))
+            else:
+                items.append(("column", name))
+            position = end + 1 if end < len(text) and text[end] == "," else end
+        return items, position
+
+    fields, position = parse_list(0)
+    if position != len(text):
+        raise PostgrestError(400, "PGRST100", f"failed to parse select parameter ({text})")
+    return fields or [("column", "*")]
+
+
+def _parse_order(text: str) -> list:
+    """'created_at.desc.nullslast,id' -> [(column, desc, nulls_first)]"""
+    terms = []
+    for term in text.split(","):
+        column, *modifiers = term.split(".")
+        desc = "desc" in modifiers
+        nulls_first = "nullsfirst" in modifiers or (desc and "nullslast" not in modifiers)
+        terms.append((column, desc, nulls_first))
+    return terms
+
+
+def _sort(rows: list, order: list) -> list:
+    for column, desc, nulls_first in reversed(order):
+        nulls = [row for row in rows if row.get(column) is None]
+        values = sorted((row for row in rows if row.get(column) is not None),
+                        key=lambda row: row[column], reverse=desc)
+        rows = nulls + values if nulls_first else values + nulls
+    return rows
+
+
+class FakePostgrest:
+    """
+    In-memory stand-in for the Supabase REST API (PostgREST), served to the
+    app's httpx clients through httpx.MockTransport, so no request leaves
+    the process.
+
+    Covers what the app sends: select with column lists and embedded
+    resources (to-one when the row has a <resource>_id column, to-many when
+    the embedded table points back; !inner drops rows without a match),
+    eq/neq/gt/gte/lt/lte/in/is filters, order (embedded resources too),
+    limit and offset, single objects (406 unless exactly one row), insert
+    and update. Tables are created on first insert. Each request waits
+    `latency` (time.sleep on the sync transport, asyncio.sleep on the async
+    one) before it is answered.
+    """
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.requests = 0
+        self._tables = {}  # name -> {id: row}
+        self._indexes = {}  # (table, column) -> {str(value): [row, ...]}
+        self._next_id = {}
+        self._lock = threading.Lock()
+
+    # --- Data ---
+
+    def insert(self, table: str, rows: list) -> list:
+        """Insert rows directly (seeding); ids are assigned where missing"""
+        with self._lock:
+            return [dict(row) for row in self._insert(table, rows)]
+
+    def rows(self, table: str, **equals) -> list:
+        """Copies of the rows of a table whose columns equal the given values"""
+        with self._lock:
+            return [
+                dict(row) for row in self._tables.get(table, {}).values()
+                if all(row.get(column) == value for column, value in equals.items())
+            ]
+
+    def _insert(self, table: str, rows: list) -> list:
+        stored_rows = self._tables.setdefault(table, {})
+        now = datetime.now(timezone.utc).isoformat()
+        inserted = []
+        for row in rows:
+            row = {**DEFAULTS.get(table, {}), **row}
+            if table != "recipes":
+                row.setdefault("created_at", now)
+            if row.get("id") is None:
+                row["id"] = self._next_id.get(table, 1)
+            if isinstance(row["id"], int):
+                self._next_id[table] = max(self._next_id.get(table, 1), row["id"] + 1)
+            stored_rows[row["id"]] = row
+            for (indexed_table, column), index in self._indexes.items():
+                if indexed_table == table and row.get(column) is not None:
+                    index.setdefault(str(row[column]), []).append(row)
+            inserted.append(row)
+
+        if table == "meals":
+            days = self._tables.get("daily_plans", {})
+            for row in inserted:
+                day = days.get(row.get("daily_plan_id"))
+                if day is not None:
+                    for meal_column, day_column in DAILY_TOTALS.items():
+                        day[day_column] = (day.get(day_column) or 0) + (row.get(meal_column) or 0)
+        return inserted
+
+    def _index(self, table: str, column: str) -> dict:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = {}
+            for row in self._tables.get(table, {}).values():
+                if row.get(column) is not None:
+                    index.setdefault(str(row[column]), []).append(row)
+            self._indexes[(table, column)] = index
+        return index
+
+    def _forget_indexes(self, table: str):
+        for key in [key for key in self._indexes if key[0] == table]:
+            del self._indexes[key]
+
+    # --- Filters ---
+
+    def _literal(self, table: str, column: str, value: str):
+        if column in BIGINT_COLUMNS.get(table, ()):
+            if not _INTEGER.fullmatch(value):
+                raise PostgrestError(400, "22P02", f'invalid input syntax for type bigint: "{value}"')
+            return int(value)
+        return value
+
+    @staticmethod
+    def _compare(row_value, literal) -> int:
+        if isinstance(row_value, bool):
+            literal = str(literal).lower() == "true"
+        elif isinstance(row_value, (int, float)):
+            try:
+                literal = float(literal)
+            except ValueError:
+                raise PostgrestError(400, "22P02", f'invalid input syntax for type numeric: "{literal}"')
+        else:
+            row_value, literal = str(row_value), str(literal)
+        return (row_value > literal) - (row_value < literal)
+
+    def _parse_filters(self, table: str, params: list) -> list:
+        filters = []
+        for column, expression in params:
+            operator, _, value = expression.partition(".")
+            negate = operator == "not"
+            if negate:
+                operator, _, value = value.partition(".")
+            if operator not in FILTER_OPERATORS or "." in column:
+                raise PostgrestError(400, "PGRST100", f'"{column}={expression}" is not supported by the fake')
+            if operator == "in":
+                items = [quoted if quoted else bare
+                         for quoted, bare in _IN_VALUE.findall(value.strip("()"))]
+                literal = [self._literal(table, column, item) for item in items]
+            elif operator == "is":
+                literal = {"null": None, "true": True, "false": False}[value.lower()]
+            else:
+                literal = self._literal(table, column, value)
+            filters.append((column, operator, literal, negate))
+        return filters
+
+    def _matches(self, row: dict, filters: list) -> bool:
+        for column, operator, literal, negate in filters:
+            value = row.get(column)
+            if operator == "is":
+                matched = value is literal if literal is None else value == literal
+            elif value is None:
+                matched = False  # comparisons with NULL are never true
+            elif operator == "in":
+                matched = any(self._compare(value, item) == 0 for item in literal)
+            else:
+                order = self._compare(value, literal)
+                matched = {"eq": order == 0, "neq": order != 0, "gt": order > 0,
+                           "gte": order >= 0, "lt": order < 0, "lte": order <= 0}[operator]
+            if matched == negate:
+                return False
+        return True
+
+    def _find(self, table: str, filters: list) -> list:
+        """Rows matching the filters; an eq filter on a key column is answered from an index"""
+        for column, operator, literal, negate in filters:
+            if operator == "eq" and not negate and (column == "id" or column.endswith("_id")):
+                candidates = self._index(table, column).get(str(literal), [])
+                break
+        else:
+            candidates = list(self._tables.get(table, {}).values())
+        return [row for row in candidates if self._matches(row, filters)]
+
+    # --- Embedding ---
+
+    def _project(self, table: str, row: dict, fields: list, orders: dict, path: str):
+        """Selected columns and embedded resources of a row, or None if an !inner embed has no match"""
+        projected = {}
+        for field in fields:
+            if field[0] == "column":
+                if field[1] == "*":
+                    projected.update(row)
+                elif field[1] in row:
+                    projected[field[1]] = row[field[1]]
+                else:
+                    raise PostgrestError(400, "42703", f"column {table}.{field[1]} does not exist")
+                continue
+
+            _, embedded, inner, subfields = field
+            embedded_path = f"{path}.{embedded}" if path else embedded
+            foreign_key = f"{_singular(embedded)}_id"
+            if foreign_key in row:
+                # To-one: this row points at the embedded one
+                target = self._tables.get(embedded, {}).get(row[foreign_key])
+                value = None if target is None else \
+                    self._project(embedded, target, subfields, orders, embedded_path)
+                if value is None and inner:
+                    return None
+            else:
+                # To-many: the embedded rows point back at this one
+                children = self._index(embedded, f"{_singular(table)}_id").get(str(row["id"]), [])
+                children = _sort(children, orders[embedded_path]) if embedded_path in orders else list(children)
+                value = [
+                    child for child in (
+                        self._project(embedded, child, subfields, orders, embedded_path) for child in children
+                    ) if child is not None
+                ]
+                if not value and inner:
+                    return None
+            projected[embedded] = value
+        return projected
+
+    # --- Requests ---
+
+    def _select(self, table: str, params: list, headers) -> tuple:
+        fields = _parse_select(next((value for key, value in params if key == "select"), "*"))
+        orders, filters, limit, offset = {}, [], None, 0
+        for key, value in params:
+            if key == "order":
+                orders[""] = _parse_order(value)
+            elif key.endswith(".order"):
+                orders[key[:-len(".order")]] = _parse_order(value)
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            elif key != "select":
+                filters.append((key, value))
+
+        rows = self._find(table, self._parse_filters(table, filters))
+        if "" in orders:
+            rows = _sort(rows, orders[""])
+        projected = [
+            result for result in (self._project(table, row, fields, orders, "") for row in rows)
+            if result is not None
+        ]
+        projected = projected[offset:None if limit is None else offset + limit]
+        return 200, self._shape(projected, headers)
+
+    def _shape(self, rows: list, headers):
+        if headers.get("accept") == OBJECT_MEDIA_TYPE:
+            if len(rows) != 1:
+                raise PostgrestError(
+                    406, "PGRST116", "JSON object requested, multiple (or no) rows returned",
+                    f"The result contains {len(rows)} rows",
+                )
+            return rows[0]
+        return rows
+
+    def _write(self, method: str, table: str, params: list, headers, body) -> tuple:
+        if method == "POST":
+            rows = self._insert(table, body if isinstance(body, list) else [body])
+            status = 201
+        else:
+            filters = self._parse_filters(table, [(key, value) for key, value in params
+                                                  if key not in ("select", "columns")])
+            rows = self._find(table, filters)
+            for row in rows:
+                row.update(body)
+            self._forget_indexes(table)
+            status = 200
+        if "return=minimal" in headers.get("prefer", ""):
+            return 204 if method == "PATCH" else status, None
+        return status, self._shape([dict(row) for row in rows], headers)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer one request (without the simulated latency)"""
+        path = request.url.path
+        try:
+            if "/rest/v1/" not in path:
+                raise PostgrestError(404, "PGRST000", f"{path} is not served by the fake")
+            table = path.split("/rest/v1/", 1)[1].strip("/")
+            if table.startswith("rpc/"):
+                raise PostgrestError(404, "PGRST202", f"Could not find the function {table[4:]}")
+            params = list(request.url.params.multi_items())
+            with self._lock:
+                self.requests += 1
+                if request.method in ("GET", "HEAD"):
+                    status, body = self._select(table, params, request.headers)
+                elif request.method in ("POST", "PATCH"):
+                    status, body = self._write(request.method, table, params, request.headers,
+                                               json.loads(request.content or b"null"))
+                else:
+                    raise PostgrestError(405, "PGRST000", f"{request.method} is not supported by the fake")
+                content = b"" if body is None else json.dumps(body, default=str).encode("utf-8")
+        except PostgrestError as e:
+            status, content = e.status, json.dumps(e.body).encode("utf-8")
+        return httpx.Response(status, content=content, headers={"content-type": "application/json"})
+
+    def _latency_key(self, request: httpx.Request) -> str:
+        return f"{request.method} {request.url.path}?{request.url.query.decode('utf-8', 'replace')}"
+
+    def transport(self) -> httpx.MockTransport:
+        """Transport for a sync httpx.Client"""
+        def handler(request):
+            delay = self.latency.seconds_for(self._latency_key(request))
+            if delay:
+                time.sleep(delay)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
+
+    def async_transport(self) -> httpx.MockTransport:
+        """Transport for an httpx.AsyncClient"""
+        async def handler(request):
+            delay = self.latency.seconds_for(self._latency_key(request))
+            if delay:
+                await asyncio.sleep(delay)
+            return self.handle(request)
+        return httpx.MockTransport(handler)
@@ -0,0 +1,19 @@
+import zlib
+
+
+class Latency:
+    """
+    Simulated service time of a fake: `seconds` per call, spread by up to
+    ±jitter (a fraction of it). The spread comes from a hash of the call's
+    key, so the same call waits the same time on every run.
+    """
+
+    def __init__(self, seconds: float = 0.0, jitter: float = 0.0):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def seconds_for(self, key: str) -> float:
+        if self.seconds <= 0:
+            return 0.0
+        spread = zlib.crc32(key.encode("utf-8")) / 0xFFFFFFFF * 2 - 1
+        return max(0.0, self.seconds * (1 + self.jitter * spread))
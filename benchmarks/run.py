@@ -0,0 +1,466 @@
+"""
+Offline load benchmark for the NutriWise API.
+
+Runs the FastAPI app in this process (through its ASGI interface, no server
+or sockets) against local, deterministic fakes: Gemini is replaced by a
+scripted model (benchmarks.fake_gemini) and Supabase by an in-memory
+PostgREST (benchmarks.fake_supabase) serving a synthetic recipe catalog,
+each with a configurable latency. Needs no network access or credentials.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --users 16 --requests 200 --llm-latency 0.8 --json results.json
+
+Each scenario is driven by --users virtual users, each sending its next
+request as soon as the previous one has finished, and reports throughput,
+p50/p95/p99 latency, CPU time (the whole process: app, fakes and driver)
+and peak RSS (highest so far in the process).
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import tempfile
+import httpx
+import jwt
+from benchmarks.latency import Latency
+from benchmarks.catalog import synthetic_recipes
+from benchmarks.fake_supabase import FakePostgrest
+from benchmarks.fake_gemini import FakeGeminiClient, AgentScript
+
+# Nothing listens here: a request that gets past the fakes fails at once instead of leaving the machine
+OFFLINE_URL = "http://127.0.0.1:9"
+JWT_SECRET = "nutriwise-benchmark-secret"
+SCENARIOS = ["generate", "generate_fast", "stream", "weekly", "weekly_fast", "reads"]
+DEFAULT_SCENARIOS = "generate,weekly,reads"
+# Questionnaire goal -> profiles.goal
+GOALS = {"lose": "Fat Loss", "build": "Build Muscle", "maintain": "General Health / Maintenance"}
+READ_ENDPOINTS = [
+    ("GET /plans/current", lambda ids, n: "/plans/current"),
+    ("GET /plans/weekly/current", lambda ids, n: "/plans/weekly/current"),
+    ("GET /plans/weekly/{id}", lambda ids, n: f"/plans/weekly/{ids['weekly_plan_id']}"),
+    ("GET /plans/daily/{id}/meals", lambda ids, n: f"/plans/daily/{ids['daily_plan_ids'][n % len(ids['daily_plan_ids'])]}/meals"),
+    ("GET /plans/meals/{id}", lambda ids, n: f"/plans/meals/{ids['meal_ids'][n % len(ids['meal_ids'])]}"),
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS,
+                        help=f"comma-separated, run in this order; any of {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=8, help="virtual users (concurrent requests)")
+    parser.add_argument("--requests", type=int, default=80, help="requests per generate/stream scenario")
+    parser.add_argument("--weekly-plans", type=int, default=8, help="weekly plan jobs per weekly scenario")
+    parser.add_argument("--read-requests", type=int, default=400, help="requests per read endpoint")
+    parser.add_argument("--warmup", type=int, default=4,
+                        help="untimed requests before each generate/stream/read measurement")
+    parser.add_argument("--recipes", type=int, default=2000, help="size of the synthetic recipe catalog")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per model turn")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="seconds per Supabase request")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency spread, as a fraction of it (±)")
+    parser.add_argument("--search-turns", type=int, default=1, help="recipe search turns per agent session")
+    parser.add_argument("--weekly-answer", choices=["json", "prose"], default="json",
+                        help="prose makes every weekly day use the JSON-mode structured turn")
+    parser.add_argument("--weekly-concurrency", type=int, help="WEEKLY_PLAN_CONCURRENCY (app default if unset)")
+    parser.add_argument("--job-workers", type=int, help="JOB_QUEUE_WORKERS (app default if unset)")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="seconds between job status polls")
+    parser.add_argument("--job-timeout", type=float, default=600, help="seconds before a weekly job counts as failed")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--log-level", default="WARNING", help="LOG_LEVEL for the app")
+    parser.add_argument("--json", metavar="PATH", help="also write the settings and results as JSON")
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    return args
+
+
+def configure_environment(args, workdir: str):
+    """
+    Settings the app reads on import. Service URLs and credentials are
+    forced (over any .env) so nothing can reach a real service; state goes
+    to a scratch directory.
+    """
+    os.environ.update({
+        "SUPABASE_URL": OFFLINE_URL,
+        "SUPABASE_SERVICE_KEY": "benchmark-service-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "AUTH_LOCAL_VERIFY": "true",
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_BASE_URL": OFFLINE_URL,
+        # The fake model has no cached-content API
+        "PROMPT_CACHE_ENABLED": "false",
+        "RECIPE_CATALOG_DIR": os.path.join(workdir, "recipe_catalog"),
+        "JOB_QUEUE_SQLITE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "WEEKLY_PLAN_CACHE_SQLITE_PATH": os.path.join(workdir, "plan_versions.sqlite3"),
+        "LOG_LEVEL": args.log_level,
+    })
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    if args.weekly_concurrency:
+        os.environ["WEEKLY_PLAN_CONCURRENCY"] = str(args.weekly_concurrency)
+    if args.job_workers:
+        os.environ["JOB_QUEUE_WORKERS"] = str(args.job_workers)
+
+
+def make_users(count: int, seed: int) -> list:
+    """Virtual users: an access token carrying the onboarding questionnaire, and the matching profiles row"""
+    rng = random.Random(seed)
+    users = []
+    for number in range(count):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        weight = round(rng.uniform(55, 110), 1)
+        goal = rng.choice(list(GOALS))
+        questionnaire = {
+            "gender": rng.choice(["male", "female"]),
+            "height": round(rng.uniform(155, 195)),
+            "age": rng.randint(20, 65),
+            "weight": weight,
+            "workoutFrequency": rng.randint(0, 6),
+            "overallGoal": goal,
+            "specificDiet": "balanced",
+            "foodsToAvoid": [],
+            "weightGoal": round(weight - 5, 1) if goal == "lose" else weight,
+            "weeklyWeightLoss": 0.5,
+        }
+        now = int(time.time())
+        token = jwt.encode({
+            "sub": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": f"user{number}@benchmark.local",
+            "iat": now,
+            "exp": now + 24 * 3600,
+            "user_metadata": {"questionnaire": questionnaire},
+        }, JWT_SECRET, algorithm="HS256")
+        users.append({
+            "id": user_id,
+            "headers": {"Authorization": f"Bearer {token}"},
+            "profile": {
+                "id": user_id,
+                "gender": questionnaire["gender"],
+                "height": questionnaire["height"],
+                "age": questionnaire["age"],
+                "weight": weight,
+                "workouts_per_week": questionnaire["workoutFrequency"],
+                "goal": GOALS[goal],
+                "weight_goal": questionnaire["weightGoal"],
+                "planned_weekly_weight_loss": questionnaire["weeklyWeightLoss"],
+            },
+        })
+    return users
+
+
+def install_fakes(database: FakePostgrest, model: FakeGeminiClient):
+    """Point the app's Supabase clients (sync and async) at the fake database and its Gemini clients at the fake model"""
+    from app.services.supabase_client import supabase
+    from app.services.supabase_async import async_supabase
+    from app.services.gemini_client import gemini_clients
+
+    session = supabase.postgrest.session
+    supabase.postgrest.session = httpx.Client(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        event_hooks=session.event_hooks,  # keeps the /metrics timing hooks
+        transport=database.transport(),
+    )
+    session.close()
+    async_supabase.transport = database.async_transport()
+    gemini_clients.get = lambda: model
+
+
+def seed_read_data(database: FakePostgrest, users: list, recipes: list, seed: int) -> dict:
+    """
+    Ids for the read endpoints, per user. Users without a saved meal plan or
+    an active weekly plan (e.g. when the generate scenarios didn't run) get
+    one inserted directly: 7 days of 4 meals.
+    """
+    rng = random.Random(seed)
+    ids = {}
+    for user in users:
+        if not database.rows("meal_plans", user_id=user["id"]):
+            database.insert("meal_plans", [{
+                "user_id": user["id"],
+                "plan_data": {"meal_plan": {}},
+                "user_targets": {"calories": 2000, "protein": 150, "fat": 65, "carbs": 200},
+            }])
+        weekly_plans = database.rows("weekly_plans", user_id=user["id"], status="active")
+        if weekly_plans:
+            weekly_plan = max(weekly_plans, key=lambda row: row["created_at"])
+        else:
+            weekly_plan = database.insert("weekly_plans", [{
+                "user_id": user["id"],
+                "week_start_date": "2025-01-06",
+                "status": "active",
+                "weekly_target_calories": 14000,
+                "weekly_target_protein": 1050,
+                "weekly_target_carbs": 1400,
+                "weekly_target_fat": 455,
+            }])[0]
+            for day in range(7):
+                daily_plan = database.insert("daily_plans", [{
+                    "weekly_plan_id": weekly_plan["id"],
+                    "date": f"2025-01-{6 + day:02d}",
+                    "day_of_week": day + 1,
+                    "daily_target_calories": 2000,
+                    "daily_target_protein": 150,
+                    "daily_target_carbs": 200,
+                    "daily_target_fat": 65,
+                }])[0]
+                database.insert("meals", [
+                    {
+                        "daily_plan_id": daily_plan["id"],
+                        "meal_type": meal_type,
+                        "meal_order": 1,
+                        "recipe_id": recipe["id"],
+                        "servings": 1.0,
+                        "actual_calories": recipe["calories"],
+                        "actual_protein": recipe["protein"],
+                        "actual_carbs": recipe["carbohydrates"],
+                        "actual_fat": recipe["fat"],
+                    }
+                    for meal_type, recipe in zip(["breakfast", "lunch", "dinner", "snack"], rng.sample(recipes, 4))
+                ])
+
+        daily_plan_ids = [row["id"] for row in database.rows("daily_plans", weekly_plan_id=weekly_plan["id"])]
+        meal_ids = [row["id"] for daily_plan_id in daily_plan_ids
+                    for row in database.rows("meals", daily_plan_id=daily_plan_id)]
+        ids[user["id"]] = {"weekly_plan_id": weekly_plan["id"], "daily_plan_ids": daily_plan_ids, "meal_ids": meal_ids}
+    return ids
+
+
+# --- Requests (each returns None on success, else what went wrong) ---
+
+def _failure(response: httpx.Response) -> str:
+    return f"HTTP {response.status_code}: {response.text[:300]}"
+
+
+async def generate_meal_plan(client: httpx.AsyncClient, user: dict, fast: bool = False):
+    response = await client.post("/plans/generate_meal_plan", params={"fast": "true"} if fast else None,
+                                 headers=user["headers"])
+    if response.status_code != 200:
+        return _failure(response)
+    if response.json().get("meal_plan") is None:
+        return "no meal plan was saved"
+    return None
+
+
+async def stream_meal_plan(client: httpx.AsyncClient, user: dict):
+    response = await client.post("/plans/generate_meal_plan/stream", headers=user["headers"])
+    if response.status_code != 200:
+        return _failure(response)
+    if "event: error" in response.text:
+        return response.text[response.text.index("event: error"):][:300]
+    if "event: final_plan" not in response.text:
+        return "the stream ended without a final_plan event"
+    return None
+
+
+async def generate_weekly_plan(client: httpx.AsyncClient, user: dict, args, fast: bool = False):
+    """Submit a weekly plan job and poll its status until it has finished"""
+    response = await client.post("/plans/generate_weekly_plan", params={"fast": "true"} if fast else None,
+                                 headers=user["headers"])
+    if response.status_code != 202:
+        return _failure(response)
+    status_url = response.json()["status_url"]
+    deadline = time.perf_counter() + args.job_timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        response = await client.get(status_url, headers=user["headers"])
+        if response.status_code != 200:
+            return _failure(response)
+        job = response.json()
+        if job["status"] == "completed":
+            return None
+        if job["status"] == "failed":
+            return f"job failed: {job['error']}"
+    return f"job not finished after {args.job_timeout:g}s"
+
+
+async def read(client: httpx.AsyncClient, user: dict, path: str):
+    response = await client.get(path, headers=user["headers"])
+    return None if response.status_code == 200 else _failure(response)
+
+
+# --- Measurement ---
+
+def peak_rss_mb():
+    """Highest resident set size of this process so far, in MB (None where the platform can't tell)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(ordered: list, percent: float):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+async def closed_loop(calls: list, concurrency: int) -> list:
+    """Run the calls with `concurrency` virtual users; (seconds, error) per call"""
+    outcomes = []
+    pending = iter(calls)
+
+    async def virtual_user():
+        # The iterator is shared, so each user takes the next call as soon as its previous one finished
+        for call in pending:
+            started = time.perf_counter()
+            try:
+                error = await call()
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            outcomes.append((time.perf_counter() - started, error))
+
+    await asyncio.gather(*(virtual_user() for _ in range(max(1, min(concurrency, len(calls))))))
+    return outcomes
+
+
+async def measure(name: str, calls: list, args, database: FakePostgrest, model: FakeGeminiClient,
+                  warmup: list = ()) -> dict:
+    if warmup:
+        await closed_loop(list(warmup), args.users)
+
+    db_requests, llm_turns = database.requests, model.turns
+    cpu_started, started = time.process_time(), time.perf_counter()
+    outcomes = await closed_loop(calls, args.users)
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    errors = [error for _, error in outcomes if error]
+    count = len(outcomes)
+    result = {
+        "scenario": name,
+        "requests": count,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "seconds": wall,
+        "throughput_per_second": count / wall if wall else None,
+        "latency_ms": {
+            label: None if value is None else value * 1000
+            for label, value in [("p50", percentile(latencies, 50)), ("p95", percentile(latencies, 95)),
+                                 ("p99", percentile(latencies, 99)), ("max", latencies[-1] if latencies else None)]
+        },
+        "cpu_seconds": cpu,
+        "cpu_ms_per_request": cpu / count * 1000 if count else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "db_requests_per_request": (database.requests - db_requests) / count if count else None,
+        "llm_turns_per_request": (model.turns - llm_turns) / count if count else None,
+    }
+    print(f"  {name}: {count} in {wall:.1f}s, {len(errors)} error(s)", file=sys.stderr)
+    return result
+
+
+async def run_scenario(scenario: str, client: httpx.AsyncClient, users: list, recipes: list, args,
+                       database: FakePostgrest, model: FakeGeminiClient) -> list:
+    def cycle(count: int, request):
+        return [lambda user=users[n % len(users)], n=n: request(user, n) for n in range(count)]
+
+    if scenario in ("generate", "generate_fast"):
+        fast = scenario == "generate_fast"
+        request = lambda user, n: generate_meal_plan(client, user, fast=fast)
+        return [await measure(f"POST /plans/generate_meal_plan{'?fast=true' if fast else ''}",
+                              cycle(args.requests, request), args, database, model,
+                              warmup=cycle(args.warmup, request))]
+
+    if scenario == "stream":
+        request = lambda user, n: stream_meal_plan(client, user)
+        return [await measure("POST /plans/generate_meal_plan/stream", cycle(args.requests, request), args,
+                              database, model, warmup=cycle(args.warmup, request))]
+
+    if scenario in ("weekly", "weekly_fast"):
+        fast = scenario == "weekly_fast"
+        request = lambda user, n: generate_weekly_plan(client, user, args, fast=fast)
+        return [await measure(f"weekly plan job{' (fast)' if fast else ''}",
+                              cycle(args.weekly_plans, request), args, database, model)]
+
+    ids = seed_read_data(database, users, recipes, args.seed)
+    results = []
+    for name, path in READ_ENDPOINTS:
+        request = lambda user, n, path=path: read(client, user, path(ids[user["id"]], n))
+        results.append(await measure(name, cycle(args.read_requests, request), args, database, model,
+                                     warmup=cycle(args.warmup, request)))
+    return results
+
+
+async def run(args) -> list:
+    recipes = synthetic_recipes(args.recipes, args.seed)
+    database = FakePostgrest(Latency(args.db_latency, args.jitter))
+    database.insert("recipes", recipes)
+    users = make_users(args.users, args.seed)
+    database.insert("profiles", [user["profile"] for user in users])
+    model = FakeGeminiClient(recipes, AgentScript(args.search_turns, args.weekly_answer),
+                             Latency(args.llm_latency, args.jitter))
+
+    # Imported only now: the app reads its settings (configure_environment) on import
+    from app.main import app
+    install_fakes(database, model)
+
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://nutriwise.benchmark", timeout=None) as client:
+            for scenario in args.scenarios:
+                print(f"Running {scenario}...", file=sys.stderr)
+                results.extend(await run_scenario(scenario, client, users, recipes, args, database, model))
+    return results
+
+
+def _number(value, digits: int = 1) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def print_report(results: list, args):
+    print(
+        f"\n{args.users} virtual users, {args.recipes} recipes, model turn {args.llm_latency * 1000:g} ms, "
+        f"database call {args.db_latency * 1000:g} ms (±{args.jitter * 100:g}%)"
+    )
+    header = f"{'scenario':<40} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} " \
+             f"{'cpu ms/req':>10} {'peak MB':>8} {'db/req':>7} {'llm/req':>7}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        latency = result["latency_ms"]
+        print(
+            f"{result['scenario']:<40} {result['requests']:>6} {result['errors']:>5} "
+            f"{_number(result['throughput_per_second'], 2):>8} {_number(latency['p50']):>9} "
+            f"{_number(latency['p95']):>9} {_number(latency['p99']):>9} "
+            f"{_number(result['cpu_ms_per_request'], 2):>10} {_number(result['peak_rss_mb']):>8} "
+            f"{_number(result['db_requests_per_request']):>7} {_number(result['llm_turns_per_request']):>7}"
+        )
+    print("weekly plan job: one request = submit + poll GET /plans/jobs/{id} until done (polls not counted)")
+    for result in results:
+        if result["first_error"]:
+            print(f"\nFirst error in {result['scenario']}: {result['first_error']}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="nutriwise-benchmark-", ignore_cleanup_errors=True) as workdir:
+        configure_environment(args, workdir)
+        results = asyncio.run(run(args))
+    print_report(results, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    return 1 if any(result["errors"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())